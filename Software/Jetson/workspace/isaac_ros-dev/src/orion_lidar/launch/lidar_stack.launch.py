@@ -0,0 +1,54 @@
+"""
+Lidar stack with launch arguments, headless by default.
+
+    ros2 launch orion_lidar lidar_stack.launch.py                      # no RViz, one process
+    ros2 launch orion_lidar lidar_stack.launch.py rviz:=true odometry:=rf2o
+    ros2 launch orion_lidar lidar_stack.launch.py fusion:=true single_process:=false
+
+The node layout comes from orion_lidar.launch_config (tested in test/test_launch_config.py).
+"""
+
+import os
+
+from ament_index_python.packages import get_package_share_directory
+from launch import LaunchDescription
+from launch.actions import DeclareLaunchArgument, OpaqueFunction
+from launch.substitutions import LaunchConfiguration
+from launch_ros.actions import Node
+
+from orion_lidar.launch_config import stack_nodes
+
+ARGUMENTS = [
+    ('serial_port', '/dev/ttyUSB0', 'A1M8 serial port'),
+    ('odometry', 'icp', 'Laser odometry: icp (orion_lidar) or rf2o'),
+    ('fusion', 'false', 'Fuse leg odometry from /joint_commands into /odom'),
+    ('local_map', 'true', 'Build the local occupancy grid on /local_map'),
+    ('slam', 'true', 'Run SLAM Toolbox'),
+    ('rviz', 'false', 'Start RViz (off for the headless Jetson profile)'),
+    ('rviz_config', '', 'RViz config, default rviz/mapping.rviz of this package'),
+    ('single_process', 'true', 'Run the Orion Python nodes in one process (lidar_stack)'),
+]
+
+
+def as_bool(value):
+    return value.lower() in ('true', '1', 'yes')
+
+
+def launch_setup(context):
+    v = {name: LaunchConfiguration(name).perform(context) for name, _, _ in ARGUMENTS}
+    rviz_config = v['rviz_config']
+    if as_bool(v['rviz']) and not rviz_config:
+        rviz_config = os.path.join(
+            get_package_share_directory('orion_lidar'), 'rviz', 'mapping.rviz')
+    specs = stack_nodes(serial_port=v['serial_port'], odometry=v['odometry'],
+                        fusion=as_bool(v['fusion']), local_map=as_bool(v['local_map']),
+                        slam=as_bool(v['slam']), rviz=as_bool(v['rviz']),
+                        single_process=as_bool(v['single_process']), rviz_config=rviz_config)
+    return [Node(**spec) for spec in specs]
+
+
+def generate_launch_description():
+    return LaunchDescription(
+        [DeclareLaunchArgument(name, default_value=default, description=description)
+         for name, default, description in ARGUMENTS]
+        + [OpaqueFunction(function=launch_setup)])
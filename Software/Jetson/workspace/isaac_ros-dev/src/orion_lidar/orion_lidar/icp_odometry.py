@@ -0,0 +1,310 @@
+"""
+Point-to-line ICP laser odometry, a tunable replacement for rf2o_laser_odometry.
+
+Each scan is matched against the current keyframe scan. The keyframe keeps its
+correspondence index (scipy cKDTree, or a grid hash when scipy is missing) and
+its line normals, so they are built once per keyframe and reused by every ICP
+iteration and every scan matched against it. A new keyframe is taken after
+KEYFRAME_DIST / KEYFRAME_ANGLE of motion, which drifts less than scan-to-scan.
+
+The initial guess is the last velocity times the scan interval, or a motion
+increment from elsewhere (leg odometry) when one is passed to update().
+
+    python3 -m orion_lidar.icp_odometry --benchmark     # simulated walk, ms/scan and drift
+    python3 -m orion_lidar.icp_odometry --log LOG       # same on a recorded scan log
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+from orion_lidar import se2
+from orion_lidar.scan_filter import ScanFilter, to_points
+from orion_lidar.scan_log import record_sim, ScanLog
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Grid hash index only
+    cKDTree = None
+
+DEFAULTS = {
+    'index': 'kdtree',  # 'kdtree' or 'grid'
+    'max_iterations': 20,
+    'max_correspondence': 0.25,  # m
+    'huber': 0.03,  # m, residuals above this are down-weighted
+    'tolerance': 1e-4,  # Stop when the update is below this (m and rad)
+    'min_inlier_ratio': 0.3,
+    'keyframe_dist': 0.15,  # m
+    'keyframe_angle': math.radians(8.0),
+    'normal_max_gap': 0.15,  # m, neighbour beams further apart than this give no normal
+    'grid_cell': 0.15,  # m, grid index cell size
+    'grid_per_cell': 8,  # Points kept per grid cell
+}
+
+
+class KdTreeIndex:
+    """Nearest neighbour index over the reference points with scipy's cKDTree."""
+
+    def __init__(self, points):
+        self.n = len(points)
+        self.tree = cKDTree(points)
+
+    def query(self, points, max_dist):
+        dist, idx = self.tree.query(points, k=1, distance_upper_bound=max_dist)
+        valid = idx < self.n
+        return np.where(valid, idx, 0), valid
+
+
+class GridIndex:
+    """
+    Grid hash nearest neighbour index, NumPy only.
+
+    Points are bucketed into square cells (at most per_cell points each, in a padded
+    table), a query looks at the 3 x 3 cells around each point. Exact for neighbours
+    closer than one cell, so max_dist should not exceed the cell size.
+    """
+
+    OFFSET = 1 << 20
+    NEIGHBOURS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+
+    def __init__(self, points, cell=0.15, per_cell=8):
+        self.points = points
+        self.cell = cell
+        keys = self._keys(np.floor(points / cell).astype(np.int64))
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        self.keys, start, counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+        rank = np.arange(len(keys)) - np.repeat(start, counts)
+        keep = rank < per_cell
+        cell_id = np.repeat(np.arange(len(self.keys)), counts)
+        self.table = np.full((len(self.keys), per_cell), -1, np.int64)
+        self.table[cell_id[keep], rank[keep]] = order[keep]
+
+    def _keys(self, ij):
+        return ((ij[..., 0] + self.OFFSET) << 32) | (ij[..., 1] + self.OFFSET)
+
+    def query(self, points, max_dist):
+        ij = np.floor(points / self.cell).astype(np.int64)
+        keys = self._keys(ij[:, None, :] + self.NEIGHBOURS[None, :, :])  # (N, 9)
+        pos = np.searchsorted(self.keys, keys)
+        pos = np.minimum(pos, len(self.keys) - 1)
+        found = self.keys[pos] == keys
+        cand = np.where(found[..., None], self.table[pos], -1).reshape(len(points), -1)
+        d = self.points[np.maximum(cand, 0)] - points[:, None, :]
+        d2 = np.where(cand >= 0, (d * d).sum(axis=2), np.inf)
+        best = d2.argmin(axis=1)
+        rows = np.arange(len(points))
+        valid = d2[rows, best] <= max_dist * max_dist
+        return np.where(valid, cand[rows, best], 0), valid
+
+
+def make_index(points, kind='kdtree', cell=0.15, per_cell=8):
+    if kind == 'kdtree' and cKDTree is not None:
+        return KdTreeIndex(points)
+    return GridIndex(points, cell, per_cell)
+
+
+def line_normals(points, max_gap=0.15):
+    """
+    Return unit normals from the neighbouring beams of points in scan order.
+
+    Central difference where both neighbours are within max_gap, one-sided where only
+    one is, and a valid mask that is False for isolated points.
+    """
+    n = len(points)
+    tangent = np.zeros_like(points)
+    if n < 3:
+        return tangent, np.zeros(n, bool)
+    fwd = np.zeros_like(points)
+    bwd = np.zeros_like(points)
+    fwd[:-1] = points[1:] - points[:-1]
+    bwd[1:] = fwd[:-1]
+    ok_f = np.zeros(n, bool)
+    ok_b = np.zeros(n, bool)
+    ok_f[:-1] = np.hypot(fwd[:-1, 0], fwd[:-1, 1]) < max_gap
+    ok_b[1:] = ok_f[:-1]
+    tangent = np.where(ok_f[:, None], fwd, 0.0) + np.where(ok_b[:, None], bwd, 0.0)
+    norm = np.hypot(tangent[:, 0], tangent[:, 1])
+    valid = (ok_f | ok_b) & (norm > 1e-9)
+    scale = np.where(valid, norm, 1.0)[:, None]
+    normals = np.stack([-tangent[:, 1], tangent[:, 0]], axis=1) / scale
+    return normals, valid
+
+
+class Keyframe:
+
+    def __init__(self, points, pose, params):
+        normals, valid = line_normals(points, params['normal_max_gap'])
+        self.points = np.ascontiguousarray(points[valid])
+        self.normals = normals[valid]
+        self.pose = pose
+        self.index = make_index(self.points, params['index'], params['grid_cell'],
+                                params['grid_per_cell'])
+
+
+def icp(src, keyframe, init, params):
+    """
+    Align src points (base frame) to the keyframe, starting from init (pose relative to it).
+
+    Returns the relative pose and a dict with iterations, inlier ratio and rms residual.
+    """
+    pose = init
+    max_dist = params['max_correspondence']
+    k = params['huber']
+    info = {'iterations': 0, 'inliers': 0.0, 'rms': float('nan')}
+    for it in range(params['max_iterations']):
+        p = se2.transform(pose, src)
+        idx, valid = keyframe.index.query(p, max_dist)
+        if valid.sum() < 6:
+            break
+        p = p[valid]
+        q = keyframe.points[idx[valid]]
+        nrm = keyframe.normals[idx[valid]]
+        r = ((p - q) * nrm).sum(axis=1)
+        # Increment applied on the left, about the keyframe origin
+        jac = np.stack([nrm[:, 0], nrm[:, 1], nrm[:, 1] * p[:, 0] - nrm[:, 0] * p[:, 1]], axis=1)
+        ar = np.abs(r)
+        w = np.where(ar <= k, 1.0, k / np.maximum(ar, 1e-12))
+        jw = jac * w[:, None]
+        h = jw.T @ jac + 1e-6 * np.eye(3)
+        delta = -np.linalg.solve(h, jw.T @ r)
+        pose = se2.compose(tuple(delta), pose)
+        info = {'iterations': it + 1, 'inliers': float(valid.mean()),
+                'rms': float(np.sqrt(np.mean(r * r)))}
+        tol = params['tolerance']
+        if abs(delta[0]) + abs(delta[1]) < tol and abs(delta[2]) < tol:
+            break
+    return pose, info
+
+
+class IcpOdometry:
+    """odom -> base_link from consecutive scans."""
+
+    def __init__(self, laser_pose=(0.1, 0.0, 0.0), **params):
+        p = dict(DEFAULTS)
+        unknown = set(params) - set(p)
+        if unknown:
+            raise ValueError('unknown ICP parameters: %s' % ', '.join(sorted(unknown)))
+        p.update(params)
+        self.params = p
+        self.laser_pose = laser_pose
+        self.pose = (0.0, 0.0, 0.0)
+        self.velocity = (0.0, 0.0, 0.0)  # Body frame, per second
+        self.keyframe = None
+        self.stamp = None
+        self.last_info = {}
+        self.failures = 0
+        self.keyframes = 0
+        self.timings = []
+
+    def update(self, points_laser, stamp, guess=None):
+        """
+        Add one scan (valid points in the laser frame) taken at stamp (seconds).
+
+        guess is the motion since the previous scan in the body frame (x, y, theta), for
+        example from leg odometry; without it the last velocity is extrapolated.
+        Returns the new odom -> base_link pose.
+        """
+        start = time.perf_counter()
+        pts = se2.transform(self.laser_pose, np.asarray(points_laser, np.float64))
+        if self.keyframe is None:
+            self.keyframe = Keyframe(pts, self.pose, self.params)
+            self.keyframes += 1
+            self.stamp = stamp
+            return self.pose
+
+        dt = max(stamp - self.stamp, 1e-6)
+        if guess is None:
+            guess = tuple(v * dt for v in self.velocity)
+        predicted = se2.compose(self.pose, guess)
+        init = se2.between(self.keyframe.pose, predicted)
+        rel, info = icp(pts, self.keyframe, init, self.params)
+        if info['inliers'] < self.params['min_inlier_ratio']:
+            # Bad match (occlusion, featureless view), trust the prediction for this scan
+            rel = init
+            self.failures += 1
+        pose = se2.compose(self.keyframe.pose, rel)
+
+        step = se2.between(self.pose, pose)
+        self.velocity = tuple(v / dt for v in step)
+        self.pose = pose
+        self.stamp = stamp
+        self.last_info = info
+        p = self.params
+        if math.hypot(rel[0], rel[1]) > p['keyframe_dist'] or abs(rel[2]) > p['keyframe_angle']:
+            self.keyframe = Keyframe(pts, pose, p)
+            self.keyframes += 1
+        self.timings.append(time.perf_counter() - start)
+        return pose
+
+
+def benchmark(n_scans=400, index='kdtree', noise=0.01, sway=0.01, seed=0, scans=None):
+    """
+    Run filter + ICP over a simulated walk (or recorded scans) and print ms/scan and drift.
+
+    scans, if given, is an iterable of (stamp, ranges, angle_min, angle_increment[, true pose]).
+    """
+    from orion_lidar import scan_sim
+
+    laser_pose = (0.1, 0.0, 0.0)
+    if scans is None:
+        rng = np.random.default_rng(seed)
+        world = scan_sim.office_world()
+        truth = [se2.compose(p, scan_sim.body_sway(k, sway))
+                 for k, p in enumerate(scan_sim.trajectory(n_scans))]
+        scans = [(0.1 * k,
+                  scan_sim.raycast(world, se2.compose(p, laser_pose), noise=noise, rng=rng),
+                  scan_sim.ANGLE_MIN, scan_sim.ANGLE_INCREMENT, p) for k, p in enumerate(truth)]
+
+    odom = IcpOdometry(laser_pose, index=index)
+    filt = None
+    est, gt = [], []
+    filter_ms = []
+    for scan in scans:
+        stamp, ranges, amin, inc = scan[:4]
+        t0 = time.perf_counter()
+        if filt is None:
+            filt = ScanFilter(len(ranges), amin, inc)
+        pts = to_points(filt(ranges), filt.out_angle_min, filt.out_angle_increment)
+        filter_ms.append(1000 * (time.perf_counter() - t0))
+        est.append(odom.update(pts, stamp))
+        if len(scan) > 4 and np.isfinite(scan[4]).all():
+            gt.append(tuple(scan[4]))
+
+    ms = np.array(odom.timings) * 1000
+    print('%s index, %d scans: filter %.2f ms, ICP ms/scan p50 %.2f  p95 %.2f  max %.2f, '
+          '%d keyframes, %d fallbacks'
+          % (index, len(est), np.median(filter_ms), np.median(ms), np.percentile(ms, 95), ms.max(),
+             odom.keyframes, odom.failures))
+    if gt and len(gt) == len(est):
+        # Both trajectories start at their own origin
+        est_w = [se2.compose(gt[0], p) for p in est]
+        dist = sum(math.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(gt, gt[1:]))
+        err = [math.hypot(e[0] - g[0], e[1] - g[1]) for e, g in zip(est_w, gt)]
+        yaw = abs(se2.wrap(est_w[-1][2] - gt[-1][2]))
+        print('  travelled %.2f m, final error %.3f m (%.2f %%), max %.3f m, heading %.2f deg'
+              % (dist, err[-1], 100 * err[-1] / max(dist, 1e-9), max(err), math.degrees(yaw)))
+        return {'ms': ms, 'final_error': err[-1], 'distance': dist, 'heading_error': yaw}
+    return {'ms': ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ICP laser odometry benchmark')
+    parser.add_argument('--benchmark', action='store_true')
+    parser.add_argument('--scans', type=int, default=400)
+    parser.add_argument('--noise', type=float, default=0.01, help='Range noise sigma, m')
+    parser.add_argument('--index', choices=['kdtree', 'grid', 'both'], default='both')
+    parser.add_argument('--log', help='Run on a recorded scan log instead of simulated scans')
+    parser.add_argument('--record', metavar='LOG', help='Write the simulated scans to a log first')
+    args = parser.parse_args()
+    if args.record:
+        record_sim(args.record, args.scans, args.noise)
+        args.log = args.log or args.record
+    for kind in (['kdtree', 'grid'] if args.index == 'both' else [args.index]):
+        benchmark(args.scans, kind, args.noise, scans=ScanLog(args.log) if args.log else None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""ROS 2 node running IcpOdometry on /scan_filtered, publishing /odom and odom -> base_link."""
+
+import time
+
+from geometry_msgs.msg import TransformStamped
+from nav_msgs.msg import Odometry
+from orion_lidar import se2
+from orion_lidar.icp_odometry import DEFAULTS, IcpOdometry
+from orion_lidar.scan_filter import to_points
+import rclpy
+from rclpy.node import Node
+from rclpy.qos import qos_profile_sensor_data
+from sensor_msgs.msg import LaserScan
+from tf2_ros import TransformBroadcaster
+
+
+def stamp_to_sec(stamp):
+    return stamp.sec + 1e-9 * stamp.nanosec
+
+
+class IcpOdometryNode(Node):
+
+    def __init__(self, **kwargs):
+        super().__init__('icp_odometry', **kwargs)
+        self.declare_parameter('scan_topic', '/scan_filtered')
+        self.declare_parameter('odom_topic', '/odom')
+        # Optional odometry (leg odometry) whose motion is used as the ICP initial guess
+        self.declare_parameter('guess_odom_topic', '')
+        self.declare_parameter('odom_frame', 'odom')
+        self.declare_parameter('base_frame', 'base_link')
+        self.declare_parameter('publish_tf', True)
+        self.declare_parameter('laser_pose', [0.1, 0.0, 0.0])
+        for name, value in DEFAULTS.items():
+            self.declare_parameter(name, value)
+        params = {name: self.get_parameter(name).value for name in DEFAULTS}
+        self.odom = IcpOdometry(tuple(self.get_parameter('laser_pose').value), **params)
+        self.odom_frame = self.get_parameter('odom_frame').value
+        self.base_frame = self.get_parameter('base_frame').value
+        self.guess_pose = None  # Latest pose from the guess topic
+        self.guess_at_scan = None  # Guess pose at the previous scan
+        self.timings = []
+
+        self.pub = self.create_publisher(Odometry, self.get_parameter('odom_topic').value, 10)
+        self.tf = TransformBroadcaster(self) if self.get_parameter('publish_tf').value else None
+        scan_topic = self.get_parameter('scan_topic').value
+        if scan_topic:  # Empty when lidar_stack calls on_scan directly
+            self.sub = self.create_subscription(
+                LaserScan, scan_topic, self.on_scan, qos_profile_sensor_data)
+        guess_topic = self.get_parameter('guess_odom_topic').value
+        if guess_topic:
+            self.guess_sub = self.create_subscription(Odometry, guess_topic, self.on_guess, 10)
+
+    def on_guess(self, msg):
+        p = msg.pose.pose
+        q = p.orientation
+        self.guess_pose = (p.position.x, p.position.y,
+                           se2.quaternion_to_yaw(q.x, q.y, q.z, q.w))
+
+    def on_scan(self, msg):
+        start = time.perf_counter()
+        points = to_points(msg.ranges, msg.angle_min, msg.angle_increment)
+        guess = None
+        if self.guess_pose is not None:
+            if self.guess_at_scan is not None:
+                guess = se2.between(self.guess_at_scan, self.guess_pose)
+            self.guess_at_scan = self.guess_pose
+        pose = self.odom.update(points, stamp_to_sec(msg.header.stamp), guess)
+        self.publish(msg.header.stamp, pose)
+
+        self.timings.append(time.perf_counter() - start)
+        if len(self.timings) == 100:
+            info = self.odom.last_info
+            self.get_logger().info(
+                'ICP %.2f ms/scan (mean of 100), %d iterations, %.0f %% inliers, %d fallbacks'
+                % (1000.0 * sum(self.timings) / 100, info.get('iterations', 0),
+                   100 * info.get('inliers', 0.0), self.odom.failures))
+            self.timings.clear()
+
+    def publish(self, stamp, pose):
+        qx, qy, qz, qw = se2.yaw_to_quaternion(pose[2])
+        out = Odometry()
+        out.header.stamp = stamp
+        out.header.frame_id = self.odom_frame
+        out.child_frame_id = self.base_frame
+        out.pose.pose.position.x = pose[0]
+        out.pose.pose.position.y = pose[1]
+        out.pose.pose.orientation.x = qx
+        out.pose.pose.orientation.y = qy
+        out.pose.pose.orientation.z = qz
+        out.pose.pose.orientation.w = qw
+        vx, vy, wz = self.odom.velocity
+        out.twist.twist.linear.x = vx
+        out.twist.twist.linear.y = vy
+        out.twist.twist.angular.z = wz
+        self.pub.publish(out)
+
+        if self.tf is not None:
+            t = TransformStamped()
+            t.header = out.header
+            t.child_frame_id = self.base_frame
+            t.transform.translation.x = pose[0]
+            t.transform.translation.y = pose[1]
+            t.transform.rotation = out.pose.pose.orientation
+            self.tf.sendTransform(t)
+
+
+def main(args=None):
+    rclpy.init(args=args)
+    node = IcpOdometryNode()
+    try:
+        rclpy.spin(node)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.destroy_node()
+        rclpy.try_shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Node layout of the lidar stack, as plain dicts so it can be tested without ROS or hardware.
+
+launch/lidar_stack.launch.py turns each spec into a launch_ros Node, and lidar_stack
+(orion_lidar/stack.py) uses orion_node_params() to build the Orion nodes in one process.
+"""
+
+# Same as base_to_laser_tf in lidar.launch.py: x y z yaw pitch roll parent child
+LASER_TF = ['0.1', '0', '0.05', '0', '0', '0', 'base_link', 'laser']
+ODOMETRY = ('icp', 'rf2o')
+
+
+def orion_node_params(odometry='icp', fusion=False, local_map=True):
+    """
+    Return {node name: parameter overrides} for the Orion Python nodes that should run.
+
+    With fusion, ICP odometry moves to /scan_odom without TF and takes its initial guess
+    from the fused /odom, which then owns odom -> base_link.
+    """
+    if odometry not in ODOMETRY:
+        raise ValueError('odometry must be one of %s, not %r' % (', '.join(ODOMETRY), odometry))
+    nodes = {'scan_filter': {}}
+    if odometry == 'icp':
+        nodes['icp_odometry'] = {}
+        if fusion:
+            nodes['icp_odometry'] = {'odom_topic': '/scan_odom', 'publish_tf': False,
+                                     'guess_odom_topic': '/odom'}
+    if fusion:
+        nodes['odom_fusion'] = {}
+    if local_map:
+        nodes['local_occupancy_grid'] = {}
+    return nodes
+
+
+# Executable per Orion node name when they run as separate processes
+EXECUTABLES = {
+    'scan_filter': 'scan_filter_node',
+    'icp_odometry': 'icp_odometry_node',
+    'odom_fusion': 'odom_fusion_node',
+    'local_occupancy_grid': 'occupancy_grid_node',
+}
+
+
+def stack_nodes(serial_port='/dev/ttyUSB0', odometry='icp', fusion=False, local_map=True,
+                slam=True, rviz=False, single_process=True, rviz_config=''):
+    """Return the Node specs (launch_ros.actions.Node keyword arguments) of the stack."""
+    orion = orion_node_params(odometry, fusion, local_map)
+    specs = [
+        {
+            'package': 'sllidar_ros2',
+            'executable': 'sllidar_node',
+            'name': 'sllidar_node',
+            'output': 'screen',
+            'parameters': [{
+                'serial_port': serial_port,
+                'serial_baudrate': 115200,  # A1M8
+                'frame_id': 'laser',
+                'inverted': False,
+                'angle_compensate': True,
+            }],
+        },
+        {
+            'package': 'tf2_ros',
+            'executable': 'static_transform_publisher',
+            'name': 'base_to_laser_broadcaster',
+            'arguments': list(LASER_TF),
+        },
+    ]
+    if single_process:
+        # No 'name': launch_ros turns it into a process-wide __node:= remap, which would
+        # rename every node in the process to lidar_stack. The parameters have no node name
+        # either, so they reach the lidar_stack config node, the only one declaring them.
+        specs.append({
+            'package': 'orion_lidar',
+            'executable': 'lidar_stack',
+            'output': 'screen',
+            'parameters': [{'odometry': odometry, 'fusion': fusion, 'local_map': local_map}],
+        })
+    else:
+        for name, params in orion.items():
+            spec = {'package': 'orion_lidar', 'executable': EXECUTABLES[name], 'name': name,
+                    'output': 'screen'}
+            if params:
+                spec['parameters'] = [params]
+            specs.append(spec)
+    if odometry == 'rf2o':
+        specs.append({
+            'package': 'rf2o_laser_odometry',
+            'executable': 'rf2o_laser_odometry_node',
+            'name': 'rf2o_laser_odometry',
+            'output': 'screen',
+            'parameters': [{
+                'laser_scan_topic': '/scan_filtered',
+                'odom_topic': '/scan_odom' if fusion else '/odom',
+                'publish_tf': not fusion,
+                'base_frame_id': 'base_link',
+                'odom_frame_id': 'odom',
+                'init_pose_from_topic': '',
+                'freq': 10.0,
+            }],
+        })
+    if slam:
+        specs.append({
+            'package': 'slam_toolbox',
+            'executable': 'async_slam_toolbox_node',
+            'name': 'slam_toolbox',
+            'output': 'screen',
+            'parameters': [{
+                'use_sim_time': False,
+                'odom_frame': 'odom',
+                'map_frame': 'map',
+                'base_frame': 'base_link',
+                'scan_topic': '/scan_filtered',
+                'mode': 'mapping',
+                'minimum_travel_distance': 0.1,
+                'transform_timeout': 0.5,
+            }],
+        })
+    if rviz:
+        specs.append({
+            'package': 'rviz2',
+            'executable': 'rviz2',
+            'name': 'rviz2',
+            'arguments': ['-d', rviz_config] if rviz_config else [],
+        })
+    return specs
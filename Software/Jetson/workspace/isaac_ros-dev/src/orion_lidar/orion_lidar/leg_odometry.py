@@ -0,0 +1,186 @@
+"""
+Leg odometry from commanded joint angles, and a small EKF fusing it with scan odometry.
+
+Forward kinematics is a vectorized copy of kinematics.leg_FK_calc in
+Software/kinematics_sim/matplotlib_simple_sim (same link lengths, leg origins and angle
+corrections), checked against it in test/test_leg_odometry.py. Feet at the bottom of the
+stance (within contact_margin of the lowest foot) are taken as planted; the body motion
+between two joint samples is the 2D rigid transform that keeps the planted feet in place.
+
+Leg odometry runs at the joint command rate (50-100 Hz) and drifts with slip and servo lag.
+Scan odometry runs at the A1M8 rate (10 Hz) and drifts much less. OdomEkf predicts with the
+leg increments and corrects with the scan odometry pose, so the published odom has the rate
+of the legs and the drift of the laser.
+"""
+
+import bisect
+import math
+
+import numpy as np
+
+from orion_lidar import se2
+
+# Same as kinematics.py
+LINK_1 = 0.045
+LINK_2 = 0.1115
+LINK_3 = 0.155
+BODY_LENGTH = 0.25205
+BODY_WIDTH = 0.105577
+# Leg IDs as in kinematics.leg_ID_origins and host_control: left front, left back,
+# right front, right back (kinematics.leg_origins itself is in drawing order)
+LEG_ORIGINS = np.array([[BODY_LENGTH / 2, BODY_WIDTH / 2, 0.0],
+                        [-BODY_LENGTH / 2, BODY_WIDTH / 2, 0.0],
+                        [BODY_LENGTH / 2, -BODY_WIDTH / 2, 0.0],
+                        [-BODY_LENGTH / 2, -BODY_WIDTH / 2, 0.0]])
+RIGHT = np.array([False, False, True, True])
+# JointState names in leg ID order, hip, femur, tibia per leg
+JOINT_NAMES = ['%s_%s' % (leg, joint) for leg in ('lf', 'lb', 'rf', 'rb')
+               for joint in ('hip', 'femur', 'tibia')]
+
+
+def foot_positions(angles):
+    """
+    Return feet in the body frame, (..., 4, 3), from joint angles (..., 4, 3).
+
+    Angles are what kinematics.leg_IK returns (after angle_corrector), in radians.
+    """
+    a = np.asarray(angles, np.float64)
+    # Undo angle_corrector
+    t1 = np.where(RIGHT, a[..., 0] + math.pi, a[..., 0])
+    t2 = np.where(RIGHT, a[..., 1], -a[..., 1]) + 1.25 * math.pi
+    t3 = math.pi / 4 - a[..., 2]
+    # Foot in the leg plane, then rotated about x; with phi = 90 deg the plane angle is
+    # theta_1 - pi on the right and theta_1 on the left
+    u = LINK_2 * np.cos(t2) + LINK_3 * np.cos(t2 + t3)
+    w = LINK_2 * np.sin(t2) + LINK_3 * np.sin(t2 + t3)
+    r = np.where(RIGHT, t1 - math.pi, t1)
+    feet = np.stack([u,
+                     LINK_1 * np.cos(t1) - np.sin(r) * w,
+                     LINK_1 * np.sin(t1) + np.cos(r) * w], axis=-1)
+    return feet + LEG_ORIGINS
+
+
+def contacts(feet, margin=0.0005):
+    """Return the planted feet: within margin of the lowest one."""
+    z = feet[..., 2]
+    return z <= z.min(axis=-1, keepdims=True) + margin
+
+
+def rigid_2d(src, dst):
+    """Return the pose (x, y, theta) that maps the (N, 2) src points closest onto dst."""
+    if len(src) == 0:
+        return (0.0, 0.0, 0.0)
+    ms, md = src.mean(axis=0), dst.mean(axis=0)
+    theta = 0.0
+    if len(src) > 1:
+        cs, cd = src - ms, dst - md
+        theta = math.atan2((cs[:, 0] * cd[:, 1] - cs[:, 1] * cd[:, 0]).sum(),
+                           (cs[:, 0] * cd[:, 0] + cs[:, 1] * cd[:, 1]).sum())
+    c, s = math.cos(theta), math.sin(theta)
+    return (md[0] - (c * ms[0] - s * ms[1]), md[1] - (s * ms[0] + c * ms[1]), theta)
+
+
+class LegOdometry:
+    """Body motion between joint samples from the feet that stay planted."""
+
+    def __init__(self, contact_margin=0.0005):
+        self.contact_margin = contact_margin
+        self.feet = None
+        self.contact = None
+
+    def update(self, angles):
+        """Add one (4, 3) joint angle sample; returns (body delta, contact mask)."""
+        return self.update_feet(foot_positions(angles))
+
+    def update_feet(self, feet):
+        contact = contacts(feet, self.contact_margin)
+        delta = (0.0, 0.0, 0.0)
+        if self.feet is not None:
+            # A planted foot does not move in the world, so its body frame position now,
+            # seen from the previous body pose, is where it was before
+            both = contact & self.contact
+            delta = rigid_2d(feet[both, :2], self.feet[both, :2])
+        self.feet = feet
+        self.contact = contact
+        return delta, contact
+
+
+class OdomEkf:
+    """
+    Planar pose EKF, predicted by leg odometry and corrected by scan odometry.
+
+    Scan odometry poses are aligned to the fused frame at the first scan and then used as
+    pose measurements, so the fused pose drifts like the scan odometry, not the legs.
+    Scans arrive late; the correction is computed against the fused pose at the scan stamp.
+    leg_noise is the (x, y, theta) standard deviation per unit of leg motion plus
+    leg_noise_floor per sample; scan_sigma is the standard deviation of a scan pose.
+    """
+
+    def __init__(self, leg_noise=(0.2, 0.2, 0.2), leg_noise_floor=(5e-4, 5e-4, 5e-4),
+                 scan_sigma=(0.002, 0.002, math.radians(0.2)), history=2.0):
+        self.leg_noise = np.array(leg_noise)
+        self.leg_noise_floor = np.array(leg_noise_floor)
+        self.r = np.diag(np.square(scan_sigma))
+        self.history_len = history
+        self.x = np.zeros(3)
+        self.p = np.zeros((3, 3))
+        self.stamps = []  # Pose history for delayed scan corrections
+        self.poses = []
+        self.align = None
+
+    @property
+    def pose(self):
+        return (float(self.x[0]), float(self.x[1]), float(self.x[2]))
+
+    def predict(self, delta, stamp):
+        c, s = math.cos(self.x[2]), math.sin(self.x[2])
+        dx, dy, _ = delta
+        f = np.array([[1.0, 0.0, -s * dx - c * dy],
+                      [0.0, 1.0, c * dx - s * dy],
+                      [0.0, 0.0, 1.0]])
+        g = np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+        q = np.diag(np.square(self.leg_noise * np.abs(delta) + self.leg_noise_floor))
+        self.x = np.array(se2.compose(self.pose, delta))
+        self.p = f @ self.p @ f.T + g @ q @ g.T
+        self._remember(stamp)
+
+    def pose_at(self, stamp):
+        """Fused pose at a past stamp, linearly interpolated from the history."""
+        i = bisect.bisect_left(self.stamps, stamp)
+        if i == 0:
+            return self.poses[0] if self.poses else self.pose
+        if i == len(self.stamps):
+            return self.poses[-1]
+        t0, t1 = self.stamps[i - 1], self.stamps[i]
+        a, b = self.poses[i - 1], self.poses[i]
+        k = (stamp - t0) / (t1 - t0) if t1 > t0 else 1.0
+        return (a[0] + k * (b[0] - a[0]), a[1] + k * (b[1] - a[1]),
+                se2.wrap(a[2] + k * se2.wrap(b[2] - a[2])))
+
+    def correct_scan(self, scan_pose, stamp):
+        """Correct with a scan odometry pose (in its own odom frame) taken at stamp."""
+        h = self.pose_at(stamp)
+        if self.align is None:
+            # Scan odometry frame -> fused odom frame, fixed at the first scan
+            self.align = se2.compose(h, se2.inverse(scan_pose))
+            return
+        z = se2.compose(self.align, scan_pose)
+        r = np.array([z[0] - h[0], z[1] - h[1], se2.wrap(z[2] - h[2])])
+        k = self.p @ np.linalg.inv(self.p + self.r)
+        corr = k @ r
+        self.x = self.x + corr
+        self.x[2] = se2.wrap(self.x[2])
+        self.p = (np.eye(3) - k) @ self.p
+        # Poses after the scan were predicted from the uncorrected one
+        i = bisect.bisect_left(self.stamps, stamp)
+        for j in range(i, len(self.poses)):
+            p = self.poses[j]
+            self.poses[j] = (p[0] + corr[0], p[1] + corr[1], se2.wrap(p[2] + corr[2]))
+
+    def _remember(self, stamp):
+        self.stamps.append(stamp)
+        self.poses.append(self.pose)
+        cut = bisect.bisect_left(self.stamps, stamp - self.history_len)
+        if cut > 64:
+            del self.stamps[:cut]
+            del self.poses[:cut]
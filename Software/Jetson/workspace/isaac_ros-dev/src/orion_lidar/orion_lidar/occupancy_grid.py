@@ -0,0 +1,192 @@
+"""
+Local log-odds occupancy grid in sparse square tiles, for gait and foothold planning.
+
+Cells are addressed by global integer indices (floor(x / resolution)), tiles are
+tile_size x tile_size float32 arrays in a dict keyed by tile index and created on the
+first write. Tiles further than keep_radius from the robot are dropped after every scan,
+so memory stays bounded however far the robot walks (SLAM Toolbox keeps the global map).
+
+Ray casting is a vectorized DDA over all beams at once: a ray passes through the two
+cells on either side of every cell boundary it crosses, so the free cells of a scan are
+those pairs for every x and y boundary crossing (ragged per ray, built with np.repeat),
+without stepping the rays one cell at a time. Each cell is updated once per scan.
+"""
+
+import math
+
+import numpy as np
+
+DEFAULTS = {
+    'resolution': 0.05,  # m per cell
+    'tile_size': 64,  # Cells per tile side, power of two
+    'max_range': 6.0,  # m, beams are cut here (no hit marked)
+    'keep_radius': 8.0,  # m, tiles further from the robot are evicted
+    'l_hit': 0.85,
+    'l_miss': -0.4,
+    'l_min': -2.0,
+    'l_max': 3.5,
+}
+
+
+KEY_OFFSET = 1 << 30  # Keys stay positive int64
+
+
+def ray_cells(x0, y0, x1, y1, resolution):
+    """
+    Return the integer (ix, iy) cells crossed by the segments (x0, y0) -> (x1, y1).
+
+    x0, y0 are scalars (the sensor), x1, y1 arrays. Returns (N, 2) with repeats across
+    rays; cells where a ray only touches a corner may be missed or added.
+    """
+    ox, oy = x0 / resolution, y0 / resolution
+    ex, ey = x1 / resolution, y1 / resolution
+    dx, dy = ex - ox, ey - oy
+    out = [np.array([[math.floor(ox), math.floor(oy)]], np.int64)]
+    for a0, a1, da, b0, db, swap in ((ox, ex, dx, oy, dy, False), (oy, ey, dy, ox, dx, True)):
+        lo = np.floor(np.minimum(a0, a1)).astype(np.int64)
+        n = np.floor(np.maximum(a0, a1)).astype(np.int64) - lo  # Boundaries crossed per ray
+        total = int(n.sum())
+        if total == 0:
+            continue
+        first = np.repeat(np.cumsum(n) - n, n)
+        boundary = np.repeat(lo + 1, n) + (np.arange(total) - first)
+        ray = np.repeat(np.arange(len(n)), n)
+        t = (boundary - a0) / da[ray]
+        other = np.floor(b0 + t * db[ray]).astype(np.int64)
+        cells = np.empty((2 * total, 2), np.int64)
+        cells[0::2, 0] = boundary - 1
+        cells[1::2, 0] = boundary
+        cells[0::2, 1] = other
+        cells[1::2, 1] = other
+        out.append(cells[:, ::-1] if swap else cells)
+    return np.concatenate(out)
+
+
+def cell_keys(cells):
+    """Pack (N, 2) integer cells into int64 keys, for fast unique and set operations."""
+    cells = np.asarray(cells, np.int64)
+    return ((cells[:, 0] + KEY_OFFSET) << 32) | (cells[:, 1] + KEY_OFFSET)
+
+
+def key_cells(keys):
+    return np.stack([(keys >> 32) - KEY_OFFSET, (keys & 0xFFFFFFFF) - KEY_OFFSET], axis=1)
+
+
+class TiledGrid:
+    """Sparse log-odds grid; see the module docstring."""
+
+    def __init__(self, **params):
+        p = dict(DEFAULTS)
+        unknown = set(params) - set(p)
+        if unknown:
+            raise ValueError('unknown occupancy grid parameters: %s' % ', '.join(sorted(unknown)))
+        p.update(params)
+        if p['tile_size'] & (p['tile_size'] - 1):
+            raise ValueError('tile_size must be a power of two')
+        self.params = p
+        self.resolution = p['resolution']
+        self.tile_size = p['tile_size']
+        self.tile_bits = self.tile_size.bit_length() - 1
+        self.tiles = {}
+        self.evicted = 0
+
+    @property
+    def nbytes(self):
+        return sum(t.nbytes for t in self.tiles.values())
+
+    def _tile(self, key):
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = self.tiles[key] = np.zeros((self.tile_size, self.tile_size), np.float32)
+        return tile
+
+    def _apply(self, cells, value):
+        """Add value to every (unique) cell, clamped to [l_min, l_max]."""
+        if len(cells) == 0:
+            return
+        bits, mask = self.tile_bits, self.tile_size - 1
+        tiles = cell_keys(cells >> bits)
+        order = np.argsort(tiles, kind='stable')
+        tiles, cells = tiles[order], cells[order]
+        tx, ty = cells[:, 0] >> bits, cells[:, 1] >> bits
+        change = np.flatnonzero(tiles[1:] != tiles[:-1]) + 1
+        lo, hi = self.params['l_min'], self.params['l_max']
+        for start, end in zip(np.r_[0, change], np.r_[change, len(cells)]):
+            tile = self._tile((int(tx[start]), int(ty[start])))
+            ix, iy = cells[start:end, 0] & mask, cells[start:end, 1] & mask
+            tile[iy, ix] = np.clip(tile[iy, ix] + value, lo, hi)
+
+    def insert_scan(self, laser_pose, ranges, angle_min, angle_increment):
+        """Ray cast one scan from laser_pose (x, y, theta) in the grid frame."""
+        p = self.params
+        ranges = np.asarray(ranges, np.float64)
+        theta = laser_pose[2] + angle_min + angle_increment * np.arange(ranges.size)
+        valid = np.isfinite(ranges) & (ranges > 0)
+        r, theta = ranges[valid], theta[valid]
+        hit = r < p['max_range']
+        r = np.minimum(r, p['max_range'])
+        x1 = laser_pose[0] + r * np.cos(theta)
+        y1 = laser_pose[1] + r * np.sin(theta)
+
+        res = self.resolution
+        hits = np.unique(cell_keys(np.floor(np.stack([x1[hit], y1[hit]], axis=1) / res)))
+        free = np.unique(cell_keys(ray_cells(laser_pose[0], laser_pose[1], x1, y1, res)))
+        # A cell with a return in it stays a hit even if another ray passes through
+        free = free[~np.isin(free, hits, assume_unique=True)]
+        self._apply(key_cells(free), p['l_miss'])
+        self._apply(key_cells(hits), p['l_hit'])
+        self.evict(laser_pose[:2])
+
+    def evict(self, center, radius=None):
+        """Drop tiles whose centre is further than radius (keep_radius) from center."""
+        radius = self.params['keep_radius'] if radius is None else radius
+        side = self.tile_size * self.resolution
+        # Tile centre within radius + half a tile diagonal keeps every cell within radius
+        limit = (radius + side * 0.7072) ** 2
+        for key in list(self.tiles):
+            cx = (key[0] + 0.5) * side - center[0]
+            cy = (key[1] + 0.5) * side - center[1]
+            if cx * cx + cy * cy > limit:
+                del self.tiles[key]
+                self.evicted += 1
+
+    def log_odds(self, points):
+        """Return the log odds at (N, 2) points, 0 (unknown) outside the stored tiles."""
+        cells = np.floor(np.asarray(points) / self.resolution).astype(np.int64)
+        out = np.zeros(len(cells), np.float32)
+        bits, mask = self.tile_bits, self.tile_size - 1
+        tx, ty = cells[:, 0] >> bits, cells[:, 1] >> bits
+        for key in set(zip(tx.tolist(), ty.tolist())):
+            tile = self.tiles.get(key)
+            if tile is None:
+                continue
+            sel = (tx == key[0]) & (ty == key[1])
+            out[sel] = tile[cells[sel, 1] & mask, cells[sel, 0] & mask]
+        return out
+
+    def window(self, center, half_size):
+        """
+        Return (log odds array [row = y, col = x], (x, y) of cell [0, 0]) around center.
+
+        A dense copy of the 2 * half_size square, for planners that want plain arrays.
+        """
+        res, n = self.resolution, self.tile_size
+        c0 = np.floor((np.asarray(center[:2]) - half_size) / res).astype(np.int64)
+        c1 = np.ceil((np.asarray(center[:2]) + half_size) / res).astype(np.int64)
+        out = np.zeros((c1[1] - c0[1], c1[0] - c0[0]), np.float32)
+        bits = self.tile_bits
+        for tx in range(c0[0] >> bits, ((c1[0] - 1) >> bits) + 1):
+            for ty in range(c0[1] >> bits, ((c1[1] - 1) >> bits) + 1):
+                tile = self.tiles.get((tx, ty))
+                if tile is None:
+                    continue
+                # Overlap of the tile and the window in global cells
+                x0, x1 = max(tx * n, c0[0]), min((tx + 1) * n, c1[0])
+                y0, y1 = max(ty * n, c0[1]), min((ty + 1) * n, c1[1])
+                out[y0 - c0[1]:y1 - c0[1], x0 - c0[0]:x1 - c0[0]] = \
+                    tile[y0 - ty * n:y1 - ty * n, x0 - tx * n:x1 - tx * n]
+        return out, (c0[0] * res, c0[1] * res)
+
+
+def probability(log_odds):
+    return 1.0 / (1.0 + np.exp(-log_odds))
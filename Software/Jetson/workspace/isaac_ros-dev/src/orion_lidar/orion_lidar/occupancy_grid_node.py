@@ -0,0 +1,97 @@
+"""ROS 2 node building the tiled local occupancy grid from /scan_filtered into /local_map."""
+
+import time
+
+from nav_msgs.msg import OccupancyGrid
+import numpy as np
+from orion_lidar import se2
+from orion_lidar.occupancy_grid import DEFAULTS, probability, TiledGrid
+import rclpy
+from rclpy.node import Node
+from rclpy.qos import qos_profile_sensor_data
+from rclpy.time import Time
+from sensor_msgs.msg import LaserScan
+from tf2_ros import Buffer, TransformException, TransformListener
+
+
+class OccupancyGridNode(Node):
+
+    def __init__(self, **kwargs):
+        super().__init__('local_occupancy_grid', **kwargs)
+        self.declare_parameter('scan_topic', '/scan_filtered')
+        self.declare_parameter('map_topic', '/local_map')
+        self.declare_parameter('odom_frame', 'odom')
+        self.declare_parameter('publish_rate', 2.0)
+        self.declare_parameter('window_half_size', 3.0)  # m, published square around the laser
+        for name, value in DEFAULTS.items():
+            self.declare_parameter(name, value)
+        self.grid = TiledGrid(**{name: self.get_parameter(name).value for name in DEFAULTS})
+        self.odom_frame = self.get_parameter('odom_frame').value
+        self.half_size = self.get_parameter('window_half_size').value
+        self.laser_pose = None
+        self.timings = []
+
+        self.tf_buffer = Buffer()
+        self.tf_listener = TransformListener(self.tf_buffer, self)
+        self.pub = self.create_publisher(OccupancyGrid, self.get_parameter('map_topic').value, 1)
+        scan_topic = self.get_parameter('scan_topic').value
+        if scan_topic:  # Empty when lidar_stack calls on_scan directly
+            self.sub = self.create_subscription(
+                LaserScan, scan_topic, self.on_scan, qos_profile_sensor_data)
+        self.timer = self.create_timer(1.0 / self.get_parameter('publish_rate').value,
+                                       self.publish)
+
+    def on_scan(self, msg):
+        try:
+            tf = self.tf_buffer.lookup_transform(
+                self.odom_frame, msg.header.frame_id, Time.from_msg(msg.header.stamp))
+        except TransformException as e:
+            self.get_logger().warn('no %s pose for the scan: %s' % (self.odom_frame, e),
+                                   throttle_duration_sec=5.0)
+            return
+        start = time.perf_counter()
+        q = tf.transform.rotation
+        self.laser_pose = (tf.transform.translation.x, tf.transform.translation.y,
+                           se2.quaternion_to_yaw(q.x, q.y, q.z, q.w))
+        self.grid.insert_scan(self.laser_pose, msg.ranges, msg.angle_min, msg.angle_increment)
+
+        self.timings.append(time.perf_counter() - start)
+        if len(self.timings) == 100:
+            self.get_logger().info(
+                'grid %.2f ms/scan (mean of 100), %d tiles, %.1f MB'
+                % (1000.0 * sum(self.timings) / 100, len(self.grid.tiles),
+                   self.grid.nbytes / 1e6))
+            self.timings.clear()
+
+    def publish(self):
+        if self.laser_pose is None:
+            return
+        log_odds, origin = self.grid.window(self.laser_pose, self.half_size)
+        data = np.rint(100.0 * probability(log_odds)).astype(np.int8)
+        data[log_odds == 0.0] = -1  # Never observed
+        out = OccupancyGrid()
+        out.header.stamp = self.get_clock().now().to_msg()
+        out.header.frame_id = self.odom_frame
+        out.info.resolution = float(self.grid.resolution)
+        out.info.height, out.info.width = log_odds.shape
+        out.info.origin.position.x = float(origin[0])
+        out.info.origin.position.y = float(origin[1])
+        out.info.origin.orientation.w = 1.0
+        out.data = data.ravel().tolist()
+        self.pub.publish(out)
+
+
+def main(args=None):
+    rclpy.init(args=args)
+    node = OccupancyGridNode()
+    try:
+        rclpy.spin(node)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.destroy_node()
+        rclpy.try_shutdown()
+
+
+if __name__ == '__main__':
+    main()
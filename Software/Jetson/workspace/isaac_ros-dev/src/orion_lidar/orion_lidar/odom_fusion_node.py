@@ -0,0 +1,144 @@
+"""ROS 2 node fusing leg odometry (commanded joints) with scan odometry into /odom."""
+
+import math
+import time
+
+from geometry_msgs.msg import TransformStamped
+from nav_msgs.msg import Odometry
+import numpy as np
+from orion_lidar import se2
+from orion_lidar.leg_odometry import JOINT_NAMES, LegOdometry, OdomEkf
+import rclpy
+from rclpy.node import Node
+from sensor_msgs.msg import JointState
+from tf2_ros import TransformBroadcaster
+
+
+def stamp_to_sec(stamp):
+    return stamp.sec + 1e-9 * stamp.nanosec
+
+
+class OdomFusionNode(Node):
+
+    def __init__(self, **kwargs):
+        super().__init__('odom_fusion', **kwargs)
+        # Commanded joint angles in kinematics.leg_IK convention, radians, names JOINT_NAMES
+        self.declare_parameter('joint_topic', '/joint_commands')
+        # Scan odometry, e.g. icp_odometry_node with odom_topic:=/scan_odom publish_tf:=false
+        self.declare_parameter('scan_odom_topic', '/scan_odom')
+        self.declare_parameter('odom_topic', '/odom')
+        self.declare_parameter('odom_frame', 'odom')
+        self.declare_parameter('base_frame', 'base_link')
+        self.declare_parameter('publish_tf', True)
+        self.declare_parameter('contact_margin', 0.0005)
+        self.declare_parameter('leg_noise', [0.2, 0.2, 0.2])
+        self.declare_parameter('leg_noise_floor', [5e-4, 5e-4, 5e-4])
+        self.declare_parameter('scan_sigma', [0.002, 0.002, math.radians(0.2)])
+        self.legs = LegOdometry(self.get_parameter('contact_margin').value)
+        self.ekf = OdomEkf(self.get_parameter('leg_noise').value,
+                           self.get_parameter('leg_noise_floor').value,
+                           self.get_parameter('scan_sigma').value)
+        self.odom_frame = self.get_parameter('odom_frame').value
+        self.base_frame = self.get_parameter('base_frame').value
+        self.order = None  # Index of each JOINT_NAMES entry in the JointState message
+        self.last_stamp = None
+        self.velocity = (0.0, 0.0, 0.0)
+        self.timings = []
+
+        self.pub = self.create_publisher(Odometry, self.get_parameter('odom_topic').value, 10)
+        self.tf = TransformBroadcaster(self) if self.get_parameter('publish_tf').value else None
+        self.joint_sub = self.create_subscription(
+            JointState, self.get_parameter('joint_topic').value, self.on_joints, 10)
+        self.scan_sub = self.create_subscription(
+            Odometry, self.get_parameter('scan_odom_topic').value, self.on_scan_odom, 10)
+
+    def joint_angles(self, msg):
+        if not msg.name:
+            positions = msg.position
+        else:
+            if self.order is None:
+                index = {name: i for i, name in enumerate(msg.name)}
+                self.order = [index[name] for name in JOINT_NAMES]
+            positions = [msg.position[i] for i in self.order]
+        return np.asarray(positions, np.float64).reshape(4, 3)
+
+    def on_joints(self, msg):
+        start = time.perf_counter()
+        try:
+            angles = self.joint_angles(msg)
+        except (KeyError, ValueError):
+            self.get_logger().warn(
+                'joint state needs 12 positions named %s' % ', '.join(JOINT_NAMES),
+                throttle_duration_sec=5.0)
+            return
+        stamp = stamp_to_sec(msg.header.stamp)
+        delta, _ = self.legs.update(angles)
+        self.ekf.predict(delta, stamp)
+        if self.last_stamp is not None and stamp > self.last_stamp:
+            # Light low-pass, the commanded trot moves in steps
+            dt = stamp - self.last_stamp
+            self.velocity = tuple(0.8 * v + 0.2 * d / dt for v, d in zip(self.velocity, delta))
+        self.last_stamp = stamp
+        self.publish(msg.header.stamp)
+
+        self.timings.append(time.perf_counter() - start)
+        if len(self.timings) == 500:
+            self.get_logger().info(
+                'fusion %.3f ms/update (mean of 500)' % (1000.0 * sum(self.timings) / 500))
+            self.timings.clear()
+
+    def on_scan_odom(self, msg):
+        p = msg.pose.pose
+        q = p.orientation
+        pose = (p.position.x, p.position.y, se2.quaternion_to_yaw(q.x, q.y, q.z, q.w))
+        self.ekf.correct_scan(pose, stamp_to_sec(msg.header.stamp))
+
+    def publish(self, stamp):
+        pose = self.ekf.pose
+        qx, qy, qz, qw = se2.yaw_to_quaternion(pose[2])
+        out = Odometry()
+        out.header.stamp = stamp
+        out.header.frame_id = self.odom_frame
+        out.child_frame_id = self.base_frame
+        out.pose.pose.position.x = pose[0]
+        out.pose.pose.position.y = pose[1]
+        out.pose.pose.orientation.x = qx
+        out.pose.pose.orientation.y = qy
+        out.pose.pose.orientation.z = qz
+        out.pose.pose.orientation.w = qw
+        cov = self.ekf.p
+        for i, j in ((0, 0), (0, 1), (1, 0), (1, 1)):
+            out.pose.covariance[6 * i + j] = float(cov[i, j])
+        for i in range(2):
+            out.pose.covariance[6 * i + 5] = float(cov[i, 2])
+            out.pose.covariance[30 + i] = float(cov[2, i])
+        out.pose.covariance[35] = float(cov[2, 2])
+        out.twist.twist.linear.x = self.velocity[0]
+        out.twist.twist.linear.y = self.velocity[1]
+        out.twist.twist.angular.z = self.velocity[2]
+        self.pub.publish(out)
+
+        if self.tf is not None:
+            t = TransformStamped()
+            t.header = out.header
+            t.child_frame_id = self.base_frame
+            t.transform.translation.x = pose[0]
+            t.transform.translation.y = pose[1]
+            t.transform.rotation = out.pose.pose.orientation
+            self.tf.sendTransform(t)
+
+
+def main(args=None):
+    rclpy.init(args=args)
+    node = OdomFusionNode()
+    try:
+        rclpy.spin(node)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.destroy_node()
+        rclpy.try_shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Laser scan preprocessing for the A1M8 before scan matching and SLAM.
+
+Stages, all NumPy array operations on one scan:
+    1. range clipping      outside [range_min, range_max] or not finite -> invalid
+    2. body mask           returns inside the robot footprint (legs, laser mount) -> invalid
+    3. median filter       3-beam median (min/max network into preallocated buffers)
+    4. shadow filter       veiling points on edges, where the segment to the neighbour
+                           beam is almost parallel to the ray -> the farther point is invalid
+    5. downsampling        closest valid return per group of `downsample` beams
+
+Invalid beams are NaN. ScanFilter keeps every buffer between scans; filter_scan()
+is the same thing as a pure function for tests and offline use.
+"""
+
+import math
+
+import numpy as np
+
+DEFAULTS = {
+    'range_min': 0.15,
+    'range_max': 12.0,
+    # Robot footprint in base_link including the leg swing envelope: x_min, x_max, y_min, y_max
+    'body_box': (-0.20, 0.20, -0.14, 0.14),
+    # Laser pose in base_link (x, y, yaw), same as base_to_laser_tf in lidar.launch.py
+    'laser_pose': (0.1, 0.0, 0.0),
+    'body_margin': 0.02,
+    'median_window': 3,
+    'shadow_min_angle': math.radians(10.0),
+    'downsample': 2,
+}
+
+
+def body_intervals(angle_min, angle_increment, n, body_box, laser_pose, margin=0.0):
+    """
+    Return per-beam [enter, exit) ranges where the beam is inside the body box.
+
+    Slab intersection of every ray with the (margin-grown) box, done once per scan layout.
+    Beams that miss the box get enter = inf, exit = -inf.
+    """
+    x0, x1, y0, y1 = body_box
+    lx, ly, lyaw = laser_pose
+    x0, x1, y0, y1 = x0 - margin - lx, x1 + margin - lx, y0 - margin - ly, y1 + margin - ly
+    theta = angle_min + angle_increment * np.arange(n) + lyaw
+    dx, dy = np.cos(theta), np.sin(theta)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tx0, tx1 = x0 / dx, x1 / dx
+        ty0, ty1 = y0 / dy, y1 / dy
+    # Rays parallel to a slab are inside it for all t when the origin is, never otherwise
+    inside_x = (x0 <= 0) & (0 <= x1)
+    inside_y = (y0 <= 0) & (0 <= y1)
+    enter_x = np.where(dx == 0, np.where(inside_x, -np.inf, np.inf), np.minimum(tx0, tx1))
+    exit_x = np.where(dx == 0, np.where(inside_x, np.inf, -np.inf), np.maximum(tx0, tx1))
+    enter_y = np.where(dy == 0, np.where(inside_y, -np.inf, np.inf), np.minimum(ty0, ty1))
+    exit_y = np.where(dy == 0, np.where(inside_y, np.inf, -np.inf), np.maximum(ty0, ty1))
+    enter = np.maximum(np.maximum(enter_x, enter_y), 0.0)
+    leave = np.minimum(exit_x, exit_y)
+    miss = leave <= enter
+    enter[miss] = np.inf
+    leave[miss] = -np.inf
+    return enter.astype(np.float32), leave.astype(np.float32)
+
+
+class ScanFilter:
+    """Scan filter for a fixed scan layout, all buffers allocated once."""
+
+    def __init__(self, n, angle_min, angle_increment, **params):
+        p = dict(DEFAULTS)
+        unknown = set(params) - set(p)
+        if unknown:
+            raise ValueError('unknown scan filter parameters: %s' % ', '.join(sorted(unknown)))
+        p.update(params)
+        self.params = p
+        self.n = n
+        self.angle_min = angle_min
+        self.angle_increment = angle_increment
+        # A full turn wraps, neighbour of the last beam is the first one
+        self.wrap = abs(n * angle_increment) >= 2 * math.pi - 1.5 * abs(angle_increment)
+        self.body_enter, self.body_exit = body_intervals(
+            angle_min, angle_increment, n, p['body_box'], p['laser_pose'], p['body_margin'])
+
+        step = max(1, int(p['downsample']))
+        self.step = step
+        self.n_out = -(-n // step)
+        self.out_angle_increment = angle_increment * step
+        # Output beam at the centre of its group
+        self.out_angle_min = angle_min + angle_increment * (step - 1) / 2.0
+
+        d = abs(angle_increment)
+        self._sin_d = np.float32(math.sin(d))
+        self._cos_d = np.float32(math.cos(d))
+        self._tan_min = np.float32(math.tan(p['shadow_min_angle']))
+
+        f32 = np.float32
+        self._r = np.empty(n, f32)
+        self._prev = np.empty(n, f32)
+        self._next = np.empty(n, f32)
+        self._a = np.empty(n, f32)
+        self._b = np.empty(n, f32)
+        self._near = np.empty(n - 1, f32)
+        self._far = np.empty(n - 1, f32)
+        self._num = np.empty(n - 1, f32)
+        self._den = np.empty(n - 1, f32)
+        self._bad = np.empty(n, bool)
+        self._tmp = np.empty(n, bool)
+        self._tmp2 = np.empty(n, bool)
+        self._pair = np.empty(n - 1, bool)
+        self._pair_far_next = np.empty(n - 1, bool)
+        self._pair_tmp = np.empty(n - 1, bool)
+        self._out = np.full(self.n_out * step, np.nan, f32)
+        self._res = np.empty(self.n_out, f32)
+        self.counts = {}
+
+    def __call__(self, ranges):
+        """Filter one scan; returns a view into an internal buffer, copy it to keep it."""
+        p = self.params
+        r, bad, tmp = self._r, self._bad, self._tmp
+        r[:] = ranges
+        counts = self.counts
+
+        # 1. Range clipping, NaN compares false so it lands in bad too
+        np.greater_equal(r, p['range_min'], out=bad)
+        np.less_equal(r, p['range_max'], out=tmp)
+        np.logical_and(bad, tmp, out=bad)
+        np.logical_not(bad, out=bad)
+        counts['range'] = int(np.count_nonzero(bad))
+
+        # 2. Body mask
+        tmp2 = self._tmp2
+        np.greater_equal(r, self.body_enter, out=tmp)
+        np.less(r, self.body_exit, out=tmp2)
+        tmp &= tmp2
+        np.logical_not(bad, out=tmp2)
+        tmp &= tmp2
+        counts['body'] = int(np.count_nonzero(tmp))
+        bad |= tmp
+        np.copyto(r, np.nan, where=bad)
+
+        # 3. Median of 3; invalid beams stay invalid, an isolated valid beam between
+        #    two invalid ones goes (the median of it and two infs is inf)
+        if p['median_window'] and p['median_window'] > 1:
+            if p['median_window'] != 3:
+                raise ValueError('only median_window 3 (or 0 to disable) is supported')
+            before = int(np.count_nonzero(bad))
+            self._median3()
+            np.isnan(r, out=bad)
+            counts['median'] = int(np.count_nonzero(bad)) - before
+        else:
+            counts['median'] = 0
+
+        # 4. Shadow (veiling) points
+        counts['shadow'] = self._shadows() if p['shadow_min_angle'] > 0 else 0
+
+        # 5. Downsampling, fmin ignores NaN unless the whole group is NaN
+        out = self._out
+        out[:self.n] = r
+        with np.errstate(invalid='ignore'):
+            np.fmin.reduce(out.reshape(self.n_out, self.step), axis=1, out=self._res)
+        return self._res
+
+    def _median3(self):
+        r, prev, nxt, a, b = self._r, self._prev, self._next, self._a, self._b
+        bad, tmp = self._bad, self._tmp2
+        n = self.n
+        # Neighbours with NaN as +inf, so the median network below stays NaN free
+        np.copyto(a, r)
+        np.copyto(a, np.inf, where=bad)
+        prev[1:] = a[:-1]
+        nxt[:-1] = a[1:]
+        prev[0] = a[-1] if self.wrap else np.inf
+        nxt[n - 1] = a[0] if self.wrap else np.inf
+        # median(p, c, q) = max(min(p, c), min(max(p, c), q))
+        np.minimum(prev, a, out=b)
+        np.maximum(prev, a, out=prev)
+        np.minimum(prev, nxt, out=prev)
+        np.maximum(b, prev, out=b)
+        # Keep invalid beams invalid, inf medians become invalid too
+        np.isinf(b, out=tmp)
+        tmp |= bad
+        np.copyto(b, np.nan, where=tmp)
+        np.copyto(r, b)
+
+    def _shadows(self):
+        r = self._r
+        near, far, num, den = self._near, self._far, self._num, self._den
+        pair, far_next = self._pair, self._pair_far_next
+        r0, r1 = r[:-1], r[1:]
+        np.minimum(r0, r1, out=near)
+        np.maximum(r0, r1, out=far)
+        # Angle at the far point between its ray and the segment to the near point:
+        # tan = near sin(d) / (far - near cos(d)); tiny angle = segment runs along the ray
+        np.multiply(near, self._sin_d, out=num)
+        np.multiply(near, self._cos_d, out=den)
+        np.subtract(far, den, out=den)
+        with np.errstate(invalid='ignore'):
+            np.multiply(den, self._tan_min, out=far)
+            np.less(num, far, out=pair)
+            np.greater(r1, r0, out=far_next)
+        both = self._pair_tmp
+        bad = self._tmp
+        bad[:] = False
+        np.logical_and(pair, far_next, out=both)
+        bad[1:] |= both
+        np.logical_not(far_next, out=far_next)
+        np.logical_and(pair, far_next, out=both)
+        bad[:-1] |= both
+        np.copyto(r, np.nan, where=bad)
+        return int(np.count_nonzero(bad))
+
+
+def filter_scan(ranges, angle_min, angle_increment, **params):
+    """Return (filtered ranges, out angle_min, out angle_increment) for one scan."""
+    ranges = np.asarray(ranges, np.float32)
+    f = ScanFilter(ranges.size, angle_min, angle_increment, **params)
+    return f(ranges).copy(), f.out_angle_min, f.out_angle_increment
+
+
+def to_points(ranges, angle_min, angle_increment):
+    """Return the valid beams as an (N, 2) array of x, y in the laser frame."""
+    ranges = np.asarray(ranges)
+    theta = angle_min + angle_increment * np.arange(ranges.size)
+    valid = np.isfinite(ranges)
+    r = ranges[valid]
+    return np.stack([r * np.cos(theta[valid]), r * np.sin(theta[valid])], axis=1)
@@ -0,0 +1,85 @@
+"""ROS 2 node running ScanFilter on /scan and publishing /scan_filtered."""
+
+import time
+
+from orion_lidar.scan_filter import DEFAULTS, ScanFilter
+import rclpy
+from rclpy.node import Node
+from rclpy.qos import qos_profile_sensor_data
+from sensor_msgs.msg import LaserScan
+
+
+class ScanFilterNode(Node):
+
+    def __init__(self, **kwargs):
+        super().__init__('scan_filter', **kwargs)
+        self.declare_parameter('scan_topic', '/scan')
+        self.declare_parameter('filtered_topic', '/scan_filtered')
+        for name, value in DEFAULTS.items():
+            self.declare_parameter(name, list(value) if isinstance(value, tuple) else value)
+        self.filter = None
+        self.layout = None
+        self.timings = []
+        # In-process consumers of the filtered LaserScan (lidar_stack), called after publishing
+        self.listeners = []
+
+        self.pub = self.create_publisher(
+            LaserScan, self.get_parameter('filtered_topic').value, qos_profile_sensor_data)
+        self.sub = self.create_subscription(
+            LaserScan, self.get_parameter('scan_topic').value, self.on_scan,
+            qos_profile_sensor_data)
+
+    def params(self):
+        out = {}
+        for name, value in DEFAULTS.items():
+            v = self.get_parameter(name).value
+            out[name] = tuple(v) if isinstance(value, tuple) else v
+        return out
+
+    def on_scan(self, msg):
+        start = time.perf_counter()
+        layout = (len(msg.ranges), msg.angle_min, msg.angle_increment)
+        if layout != self.layout:
+            # Buffers and the body mask depend on the scan layout only
+            self.filter = ScanFilter(*layout, **self.params())
+            self.layout = layout
+            self.get_logger().info(
+                'scan layout %d beams, downsampled to %d' % (layout[0], self.filter.n_out))
+        ranges = self.filter(msg.ranges)
+
+        out = LaserScan()
+        out.header = msg.header
+        out.angle_min = float(self.filter.out_angle_min)
+        out.angle_increment = float(self.filter.out_angle_increment)
+        out.angle_max = out.angle_min + out.angle_increment * (ranges.size - 1)
+        out.time_increment = msg.time_increment * self.filter.step
+        out.scan_time = msg.scan_time
+        out.range_min = max(msg.range_min, float(self.filter.params['range_min']))
+        out.range_max = min(msg.range_max, float(self.filter.params['range_max']))
+        out.ranges = ranges.tolist()
+        self.pub.publish(out)
+
+        self.timings.append(time.perf_counter() - start)
+        if len(self.timings) == 100:
+            self.get_logger().info(
+                'filter %.3f ms/scan (mean of 100), last removed %s'
+                % (1000.0 * sum(self.timings) / 100, self.filter.counts))
+            self.timings.clear()
+        for listener in self.listeners:
+            listener(out)
+
+
+def main(args=None):
+    rclpy.init(args=args)
+    node = ScanFilterNode()
+    try:
+        rclpy.spin(node)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.destroy_node()
+        rclpy.try_shutdown()
+
+
+if __name__ == '__main__':
+    main()
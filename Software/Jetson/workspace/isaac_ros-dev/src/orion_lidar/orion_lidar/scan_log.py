@@ -0,0 +1,180 @@
+"""
+Scan logs: LaserScan ranges and odom -> base_link poses in a memory-mapped file.
+
+A log is a directory with
+    meta.json   scan layout (beams, angle_min, angle_increment, ...) and the row count
+    scans.npy   structured rows (stamp f8, pose f8[3], ranges f4[beams]), opened with
+                np.lib.format.open_memmap, so np.load(..., mmap_mode='r') reads it too
+
+The file is preallocated for `capacity` rows and written in place; recording costs a
+row copy per scan and reading maps only the pages that are touched. pose is NaN where
+no TF was available. Rows past the count in meta.json (after a crash, the last flush)
+are found again up to the first NaN stamp: every flush marks the rows the next appends
+go to, plus one, as unwritten (a stamp of 0.0 is valid, simulated logs start there).
+
+    python3 -m orion_lidar.scan_log LOG                 # info, filter + ICP at max speed
+    python3 -m orion_lidar.scan_log LOG --rate 1.0      # same at recorded speed
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+META = 'meta.json'
+SCANS = 'scans.npy'
+
+
+def row_dtype(n_beams):
+    return np.dtype([('stamp', '<f8'), ('pose', '<f8', (3,)), ('ranges', '<f4', (n_beams,))])
+
+
+class ScanRecorder:
+    """Append scans to a new log; use as a context manager or call close()."""
+
+    def __init__(self, path, n_beams, angle_min, angle_increment, capacity=36000,
+                 flush_every=100, **meta):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.meta = dict(meta, beams=n_beams, angle_min=angle_min,
+                         angle_increment=angle_increment, capacity=capacity, count=0)
+        self.rows = np.lib.format.open_memmap(
+            os.path.join(path, SCANS), mode='w+', dtype=row_dtype(n_beams), shape=(capacity,))
+        self.count = 0
+        self.flush_every = flush_every
+        self._mark_unwritten()
+        self._write_meta()
+
+    def append(self, stamp, ranges, pose=None):
+        """Store one scan; returns False once the log is full."""
+        if self.count >= len(self.rows):
+            return False
+        row = self.rows[self.count]
+        row['stamp'] = stamp
+        row['pose'] = (np.nan, np.nan, np.nan) if pose is None else pose
+        row['ranges'] = ranges
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.flush()
+        return True
+
+    def flush(self):
+        self._mark_unwritten()
+        self.rows.flush()
+        self._write_meta()
+
+    def _mark_unwritten(self):
+        # NaN stamps up to one row past the next flush, ScanLog stops counting there
+        self.rows['stamp'][self.count:self.count + self.flush_every + 1] = np.nan
+
+    def close(self):
+        if self.rows is not None:
+            self.flush()
+            self.rows = None
+
+    def _write_meta(self):
+        self.meta['count'] = self.count
+        tmp = os.path.join(self.path, META + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, META))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ScanLog:
+    """
+    Read-only view of a log.
+
+    Iterating yields (stamp, ranges, angle_min, angle_increment, pose) tuples, the
+    format icp_odometry.benchmark() takes; ranges are views into the mapped file.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, META)) as f:
+            self.meta = json.load(f)
+        rows = np.load(os.path.join(path, SCANS), mmap_mode='r')
+        count = self.meta['count']
+        # Rows written after the last flush have a stamp, the first unwritten one is NaN
+        while count < len(rows) and not np.isnan(rows['stamp'][count]):
+            count += 1
+        self.rows = rows[:count]
+        self.angle_min = self.meta['angle_min']
+        self.angle_increment = self.meta['angle_increment']
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def stamps(self):
+        return self.rows['stamp']
+
+    @property
+    def ranges(self):
+        return self.rows['ranges']
+
+    @property
+    def poses(self):
+        return self.rows['pose']
+
+    def __iter__(self):
+        for row in self.rows:
+            yield row['stamp'], row['ranges'], self.angle_min, self.angle_increment, row['pose']
+
+    def replay(self, rate=1.0):
+        """Iterate at rate x recorded speed (sleeping between scans), 0 for max speed."""
+        start = None
+        for scan in self:
+            if rate > 0:
+                if start is None:
+                    start = (time.monotonic(), scan[0])
+                delay = start[0] + (scan[0] - start[1]) / rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield scan
+
+
+def record_sim(path, n_scans=400, noise=0.01, sway=0.01, seed=0):
+    """Write a simulated walk (scan_sim) to a log, poses are ground truth."""
+    from orion_lidar import scan_sim, se2
+
+    rng = np.random.default_rng(seed)
+    world = scan_sim.office_world()
+    laser_pose = (0.1, 0.0, 0.0)
+    with ScanRecorder(path, scan_sim.N_BEAMS, scan_sim.ANGLE_MIN, scan_sim.ANGLE_INCREMENT,
+                      capacity=n_scans, source='scan_sim', laser_pose=laser_pose) as rec:
+        for k, p in enumerate(scan_sim.trajectory(n_scans)):
+            p = se2.compose(p, scan_sim.body_sway(k, sway))
+            ranges = scan_sim.raycast(world, se2.compose(p, laser_pose), noise=noise, rng=rng)
+            rec.append(0.1 * k, ranges, p)
+
+
+def main():
+    from orion_lidar.icp_odometry import benchmark
+
+    parser = argparse.ArgumentParser(description='Scan log info and offline filter + ICP run')
+    parser.add_argument('log')
+    parser.add_argument('--rate', type=float, default=0.0, help='Replay speed, 0 = max')
+    parser.add_argument('--index', choices=['kdtree', 'grid'], default='kdtree')
+    args = parser.parse_args()
+    log = ScanLog(args.log)
+    if len(log) == 0:
+        raise SystemExit('%s: empty log' % args.log)
+    duration = log.stamps[-1] - log.stamps[0]
+    print('%s: %d scans x %d beams, %.1f s, %s' % (
+        args.log, len(log), log.meta['beams'], duration,
+        'with poses' if np.isfinite(log.poses).all() else 'poses missing on some scans'))
+    start = time.perf_counter()
+    benchmark(index=args.index, scans=log.replay(args.rate))
+    wall = time.perf_counter() - start
+    print('  replayed in %.2f s (%.1fx recorded speed)' % (wall, duration / max(wall, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
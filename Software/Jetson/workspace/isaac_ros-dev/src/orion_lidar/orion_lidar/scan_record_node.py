@@ -0,0 +1,106 @@
+"""ROS 2 node recording /scan and odom -> base_link into a scan log (see scan_log.py)."""
+
+import os
+import time
+
+from orion_lidar import se2
+from orion_lidar.scan_log import ScanRecorder
+import rclpy
+from rclpy.node import Node
+from rclpy.qos import qos_profile_sensor_data
+from rclpy.time import Time
+from sensor_msgs.msg import LaserScan
+from tf2_ros import Buffer, TransformException, TransformListener
+
+
+def stamp_to_sec(stamp):
+    return stamp.sec + 1e-9 * stamp.nanosec
+
+
+class ScanRecordNode(Node):
+
+    def __init__(self, **kwargs):
+        super().__init__('scan_record', **kwargs)
+        self.declare_parameter('scan_topic', '/scan')
+        self.declare_parameter('path', '')  # Default ~/scan_logs/<date>-<time>
+        self.declare_parameter('capacity', 36000)  # Rows preallocated, 1 h at 10 Hz
+        self.declare_parameter('odom_frame', 'odom')
+        self.declare_parameter('base_frame', 'base_link')
+        self.path = self.get_parameter('path').value or os.path.join(
+            os.path.expanduser('~'), 'scan_logs', time.strftime('%Y%m%d-%H%M%S'))
+        self.odom_frame = self.get_parameter('odom_frame').value
+        self.base_frame = self.get_parameter('base_frame').value
+        self.recorder = None
+        self.missing_tf = 0
+        self.skipped = 0  # Scans with a different beam count than the log
+
+        self.tf_buffer = Buffer()
+        self.tf_listener = TransformListener(self.tf_buffer, self)
+        self.sub = self.create_subscription(
+            LaserScan, self.get_parameter('scan_topic').value, self.on_scan,
+            qos_profile_sensor_data)
+
+    def lookup_pose(self, stamp):
+        # Only at the scan stamp: the latest transform would record a wrong pose for the scan,
+        # a NaN pose is something replay and the offline tools know to skip
+        try:
+            tf = self.tf_buffer.lookup_transform(
+                self.odom_frame, self.base_frame, Time.from_msg(stamp))
+        except TransformException:
+            return None
+        q = tf.transform.rotation
+        return (tf.transform.translation.x, tf.transform.translation.y,
+                se2.quaternion_to_yaw(q.x, q.y, q.z, q.w))
+
+    def on_scan(self, msg):
+        if self.recorder is None:
+            self.recorder = ScanRecorder(
+                self.path, len(msg.ranges), msg.angle_min, msg.angle_increment,
+                capacity=self.get_parameter('capacity').value, frame_id=msg.header.frame_id,
+                range_min=msg.range_min, range_max=msg.range_max, scan_time=msg.scan_time,
+                time_increment=msg.time_increment)
+            self.get_logger().info('recording %d beam scans to %s' % (len(msg.ranges), self.path))
+        if len(msg.ranges) != self.recorder.meta['beams']:
+            # The log has a fixed row width, drop scans from a reconfigured driver
+            self.skipped += 1
+            self.get_logger().warn(
+                'skipping %d beam scan, the log has %d beams (%d skipped)' % (
+                    len(msg.ranges), self.recorder.meta['beams'], self.skipped),
+                throttle_duration_sec=10.0)
+            return
+        pose = self.lookup_pose(msg.header.stamp)
+        if pose is None:
+            self.missing_tf += 1
+            self.get_logger().warn(
+                'no %s -> %s transform at the scan stamp, pose not recorded (%d scans)' % (
+                    self.odom_frame, self.base_frame, self.missing_tf),
+                throttle_duration_sec=10.0)
+        if not self.recorder.append(stamp_to_sec(msg.header.stamp), msg.ranges, pose):
+            self.get_logger().warn('scan log full, not recording', throttle_duration_sec=10.0)
+            return
+        count = self.recorder.count
+        if count % 600 == 0:
+            self.get_logger().info('%d scans recorded, %d without TF' % (count, self.missing_tf))
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.get_logger().info('%d scans in %s, %d without TF, %d skipped' % (
+                self.recorder.count, self.path, self.missing_tf, self.skipped))
+
+
+def main(args=None):
+    rclpy.init(args=args)
+    node = ScanRecordNode()
+    try:
+        rclpy.spin(node)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.close()
+        node.destroy_node()
+        rclpy.try_shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""ROS 2 node publishing a scan log on /scan (and optionally odom -> base_link)."""
+
+import math
+import time
+
+from geometry_msgs.msg import TransformStamped
+from orion_lidar import se2
+from orion_lidar.scan_log import ScanLog
+import rclpy
+from rclpy.node import Node
+from rclpy.qos import qos_profile_sensor_data
+from sensor_msgs.msg import LaserScan
+from tf2_ros import TransformBroadcaster
+
+
+class ScanReplayNode(Node):
+
+    def __init__(self, **kwargs):
+        super().__init__('scan_replay', **kwargs)
+        self.declare_parameter('path', '')
+        self.declare_parameter('scan_topic', '/scan')
+        self.declare_parameter('rate', 1.0)  # x recorded speed, 0 = one scan per timer tick
+        self.declare_parameter('loop', False)
+        # Recorded odom -> base_link, off when an odometry node runs on the replayed scans
+        self.declare_parameter('publish_tf', False)
+        self.declare_parameter('odom_frame', 'odom')
+        self.declare_parameter('base_frame', 'base_link')
+        path = self.get_parameter('path').value
+        if not path:
+            raise ValueError('scan_replay needs the path parameter')
+        self.log = ScanLog(path)
+        if len(self.log) == 0:
+            raise ValueError('%s: empty log' % path)
+        meta = self.log.meta
+        self.rate = self.get_parameter('rate').value
+        self.loop = self.get_parameter('loop').value
+        self.odom_frame = self.get_parameter('odom_frame').value
+        self.base_frame = self.get_parameter('base_frame').value
+        self.tf = TransformBroadcaster(self) if self.get_parameter('publish_tf').value else None
+
+        self.msg = LaserScan()
+        self.msg.header.frame_id = meta.get('frame_id', 'laser')
+        self.msg.angle_min = float(meta['angle_min'])
+        self.msg.angle_increment = float(meta['angle_increment'])
+        self.msg.angle_max = self.msg.angle_min + self.msg.angle_increment * (meta['beams'] - 1)
+        self.msg.range_min = float(meta.get('range_min', 0.0))
+        self.msg.range_max = float(meta.get('range_max', math.inf))
+        self.msg.scan_time = float(meta.get('scan_time', 0.0))
+        self.msg.time_increment = float(meta.get('time_increment', 0.0))
+
+        self.index = 0
+        self.start = None  # (wall clock, log stamp) of the first scan of this pass
+        self.pub = self.create_publisher(
+            LaserScan, self.get_parameter('scan_topic').value, qos_profile_sensor_data)
+        self.timer = self.create_timer(0.001, self.on_timer)
+        self.get_logger().info('replaying %d scans from %s at %s' % (
+            len(self.log), path, 'max speed' if self.rate <= 0 else '%gx' % self.rate))
+
+    def on_timer(self):
+        if self.index >= len(self.log):
+            if not self.loop:
+                self.timer.cancel()
+                self.get_logger().info('replay done')
+                return
+            self.index = 0
+            self.start = None
+        stamp = float(self.log.stamps[self.index])
+        now = time.monotonic()
+        if self.start is None:
+            self.start = (now, stamp)
+        elif self.rate > 0 and now < self.start[0] + (stamp - self.start[1]) / self.rate:
+            return
+        # Stamped with the current time, so TF lookups and SLAM work without sim time
+        header_stamp = self.get_clock().now().to_msg()
+        self.msg.header.stamp = header_stamp
+        self.msg.ranges = self.log.ranges[self.index].tolist()
+        self.pub.publish(self.msg)
+        pose = self.log.poses[self.index]
+        if self.tf is not None and all(math.isfinite(v) for v in pose):
+            self.publish_pose(header_stamp, pose)
+        self.index += 1
+
+    def publish_pose(self, stamp, pose):
+        qx, qy, qz, qw = se2.yaw_to_quaternion(float(pose[2]))
+        t = TransformStamped()
+        t.header.stamp = stamp
+        t.header.frame_id = self.odom_frame
+        t.child_frame_id = self.base_frame
+        t.transform.translation.x = float(pose[0])
+        t.transform.translation.y = float(pose[1])
+        t.transform.rotation.x = qx
+        t.transform.rotation.y = qy
+        t.transform.rotation.z = qz
+        t.transform.rotation.w = qw
+        self.tf.sendTransform(t)
+
+
+def main(args=None):
+    rclpy.init(args=args)
+    node = ScanReplayNode()
+    try:
+        rclpy.spin(node)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.destroy_node()
+        rclpy.try_shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Simulated 2D lidar scans for tests and offline benchmarks without the A1M8.
+
+The world is a list of line segments; raycast() intersects every beam with every
+segment in one NumPy expression, which is plenty for a few hundred segments.
+"""
+
+import math
+
+import numpy as np
+
+# A1M8 with angle_compensate: 720 beams over 360 degrees at ~10 Hz
+N_BEAMS = 720
+ANGLE_MIN = -math.pi
+ANGLE_INCREMENT = 2 * math.pi / N_BEAMS
+RANGE_MAX = 12.0
+
+
+def box(x0, y0, x1, y1):
+    return [(x0, y0, x1, y0), (x1, y0, x1, y1), (x1, y1, x0, y1), (x0, y1, x0, y0)]
+
+
+def office_world():
+    """Return an 8 x 6 m room with a corridor, pillars and furniture as (M, 4) segments."""
+    segs = box(-4.0, -3.0, 4.0, 3.0)
+    segs += [(-4.0, 1.0, -1.5, 1.0), (-0.5, 1.0, 2.0, 1.0)]  # Wall with a doorway
+    segs += box(1.0, -2.0, 1.6, -1.2)  # Cabinet
+    segs += box(-2.5, -1.8, -2.1, -1.4)  # Pillar
+    segs += [(3.0, -3.0, 4.0, -2.0), (2.5, 2.0, 3.5, 2.6)]  # Angled walls
+    segs += box(-3.2, 1.8, -2.0, 2.4)  # Desk in the other room
+    return np.array(segs, dtype=np.float64)
+
+
+def raycast(segments, pose, n=N_BEAMS, angle_min=ANGLE_MIN, angle_increment=ANGLE_INCREMENT,
+            range_max=RANGE_MAX, noise=0.0, rng=None):
+    """Return float32 ranges for a laser at pose (x, y, theta), inf where nothing is hit."""
+    theta = pose[2] + angle_min + angle_increment * np.arange(n)
+    d = np.stack([np.cos(theta), np.sin(theta)], axis=1)[:, None, :]  # (n, 1, 2)
+    a = segments[None, :, :2] - np.array(pose[:2])
+    e = segments[None, :, 2:] - segments[None, :, :2]  # (1, m, 2)
+    # Solve origin + t d = a + u e for t, u (2D cross products)
+    denom = d[..., 0] * e[..., 1] - d[..., 1] * e[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (a[..., 0] * e[..., 1] - a[..., 1] * e[..., 0]) / denom
+        u = (a[..., 0] * d[..., 1] - a[..., 1] * d[..., 0]) / denom
+    hit = (t > 0) & (u >= 0) & (u <= 1)
+    r = np.where(hit, t, np.inf).min(axis=1)
+    if noise:
+        rng = rng or np.random.default_rng()
+        r = r + rng.normal(0.0, noise, n)
+    r[r > range_max] = np.inf
+    return r.astype(np.float32)
+
+
+def trajectory(n_scans, dt=0.1, speed=0.25, center=(-0.2, -1.0), radii=(3.2, 1.5)):
+    """Return ground-truth base poses on an ellipse around the lower room, one per scan."""
+    rx, ry = radii
+    perimeter = 2 * math.pi * math.sqrt((rx * rx + ry * ry) / 2)
+    poses = []
+    for k in range(n_scans):
+        u = 2 * math.pi * speed * dt * k / perimeter - math.pi / 2
+        x, y = center[0] + rx * math.cos(u), center[1] + ry * math.sin(u)
+        poses.append((x, y, math.atan2(ry * math.cos(u), -rx * math.sin(u))))
+    return poses
+
+
+def body_sway(k, amplitude=0.01, period=5):
+    """Return a small lateral/yaw wobble per scan, like a trotting body adds to the laser."""
+    phase = 2 * math.pi * k / period
+    return (0.0, amplitude * math.sin(phase), 0.5 * amplitude * math.sin(phase))
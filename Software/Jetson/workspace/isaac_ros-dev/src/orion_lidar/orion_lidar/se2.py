@@ -0,0 +1,42 @@
+"""Planar pose helpers, poses are (x, y, theta) tuples or arrays."""
+
+import math
+
+import numpy as np
+
+
+def wrap(theta):
+    """Wrap an angle to [-pi, pi)."""
+    return (theta + math.pi) % (2 * math.pi) - math.pi
+
+
+def compose(a, b):
+    """Return a * b, pose b expressed in the frame of pose a."""
+    c, s = math.cos(a[2]), math.sin(a[2])
+    return (a[0] + c * b[0] - s * b[1], a[1] + s * b[0] + c * b[1], wrap(a[2] + b[2]))
+
+
+def inverse(a):
+    c, s = math.cos(a[2]), math.sin(a[2])
+    return (-c * a[0] - s * a[1], s * a[0] - c * a[1], -a[2])
+
+
+def between(a, b):
+    """Return the motion from pose a to pose b, in the frame of a."""
+    return compose(inverse(a), b)
+
+
+def transform(pose, points):
+    """Apply a pose to an (N, 2) point array."""
+    c, s = math.cos(pose[2]), math.sin(pose[2])
+    rot = np.array([[c, -s], [s, c]], dtype=points.dtype)
+    return points @ rot.T + np.array(pose[:2], dtype=points.dtype)
+
+
+def yaw_to_quaternion(theta):
+    """Return (x, y, z, w) for a rotation about z."""
+    return (0.0, 0.0, math.sin(theta / 2), math.cos(theta / 2))
+
+
+def quaternion_to_yaw(x, y, z, w):
+    return math.atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
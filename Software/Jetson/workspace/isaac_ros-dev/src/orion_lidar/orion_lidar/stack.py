@@ -0,0 +1,71 @@
+"""
+Run the Orion lidar nodes in one process and one executor.
+
+rclpy has no intra-process transport, so filtered scans are handed to ICP odometry and
+the local occupancy grid as LaserScan objects by direct call instead of through a
+subscription. /scan_filtered is still published for SLAM Toolbox and RViz. Other topics
+between the nodes (odometry) go through rclpy as usual, without extra processes.
+"""
+
+from orion_lidar.icp_odometry_node import IcpOdometryNode
+from orion_lidar.launch_config import orion_node_params
+from orion_lidar.occupancy_grid_node import OccupancyGridNode
+from orion_lidar.odom_fusion_node import OdomFusionNode
+from orion_lidar.scan_filter_node import ScanFilterNode
+import rclpy
+from rclpy.executors import MultiThreadedExecutor, SingleThreadedExecutor
+from rclpy.node import Node
+from rclpy.parameter import Parameter
+
+NODE_CLASSES = {
+    'scan_filter': ScanFilterNode,
+    'icp_odometry': IcpOdometryNode,
+    'odom_fusion': OdomFusionNode,
+    'local_occupancy_grid': OccupancyGridNode,
+}
+# Nodes that take filtered scans straight from scan_filter
+SCAN_CONSUMERS = ('icp_odometry', 'local_occupancy_grid')
+
+
+def build_nodes(odometry='icp', fusion=False, local_map=True):
+    """Create the nodes with the same overrides as the multi-process launch, wired up."""
+    nodes = {}
+    for name, params in orion_node_params(odometry, fusion, local_map).items():
+        params = dict(params)
+        if name in SCAN_CONSUMERS:
+            params['scan_topic'] = ''
+        overrides = [Parameter(key, value=value) for key, value in params.items()]
+        nodes[name] = NODE_CLASSES[name](parameter_overrides=overrides)
+    for name in SCAN_CONSUMERS:
+        if name in nodes:
+            nodes['scan_filter'].listeners.append(nodes[name].on_scan)
+    return nodes
+
+
+def main(args=None):
+    rclpy.init(args=args)
+    config = Node('lidar_stack')
+    config.declare_parameter('odometry', 'icp')
+    config.declare_parameter('fusion', False)
+    config.declare_parameter('local_map', True)
+    config.declare_parameter('threads', 1)  # 1 = single-threaded executor
+    nodes = build_nodes(config.get_parameter('odometry').value,
+                        config.get_parameter('fusion').value,
+                        config.get_parameter('local_map').value)
+    threads = config.get_parameter('threads').value
+    executor = SingleThreadedExecutor() if threads <= 1 else MultiThreadedExecutor(threads)
+    for node in [config] + list(nodes.values()):
+        executor.add_node(node)
+    config.get_logger().info('running %s in one process' % ', '.join(nodes))
+    try:
+        executor.spin()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for node in [config] + list(nodes.values()):
+            node.destroy_node()
+        rclpy.try_shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
-from setuptools import find_packages, setup
-import os
 from glob import glob
+import os
+
+from setuptools import find_packages, setup
 
 package_name = 'orion_lidar'
 
@@ -14,7 +15,8 @@ setup(
         ('share/' + package_name, ['package.xml']),
         # Include all launch files in the launch directory
         (os.path.join('share', package_name, 'launch'), glob('launch/*.launch.py')),
-        (os.path.join('share', package_name, 'rviz'), glob(os.path.join('rviz', '*.rviz'))),
+        (os.path.join('share', package_name, 'rviz'),
+         glob(os.path.join('rviz_configs', '*.rviz'))),
     ],
     install_requires=['setuptools'],
     zip_safe=True,
@@ -29,6 +31,13 @@ setup(
     },
     entry_points={
         'console_scripts': [
+            'scan_filter_node = orion_lidar.scan_filter_node:main',
+            'icp_odometry_node = orion_lidar.icp_odometry_node:main',
+            'odom_fusion_node = orion_lidar.odom_fusion_node:main',
+            'scan_record_node = orion_lidar.scan_record_node:main',
+            'scan_replay_node = orion_lidar.scan_replay_node:main',
+            'occupancy_grid_node = orion_lidar.occupancy_grid_node:main',
+            'lidar_stack = orion_lidar.stack:main',
         ],
     },
 )
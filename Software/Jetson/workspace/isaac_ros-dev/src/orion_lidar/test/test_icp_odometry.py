@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+from orion_lidar import scan_sim, se2
+from orion_lidar.icp_odometry import DEFAULTS, GridIndex, icp, IcpOdometry, Keyframe
+from orion_lidar.scan_filter import to_points
+import pytest
+
+LASER = (0.1, 0.0, 0.0)
+
+
+def scan_points(world, pose, rng=None, noise=0.0):
+    """Return laser frame points seen from base pose."""
+    r = scan_sim.raycast(world, se2.compose(pose, LASER), noise=noise, rng=rng)
+    return to_points(r, scan_sim.ANGLE_MIN, scan_sim.ANGLE_INCREMENT)
+
+
+def test_se2_roundtrip():
+    a, b = (1.0, -2.0, 0.7), (0.3, 0.1, -2.9)
+    assert np.allclose(se2.compose(a, se2.between(a, b)), b)
+    assert np.allclose(se2.compose(a, se2.inverse(a)), (0.0, 0.0, 0.0))
+    assert abs(se2.quaternion_to_yaw(*se2.yaw_to_quaternion(2.5)) - 2.5) < 1e-12
+
+
+def test_grid_index_matches_brute_force():
+    rng = np.random.default_rng(1)
+    ref = rng.uniform(-3, 3, (2000, 2))
+    query = rng.uniform(-3, 3, (500, 2))
+    idx, valid = GridIndex(ref, cell=0.15, per_cell=64).query(query, 0.15)
+    d = np.linalg.norm(ref[None, :, :] - query[:, None, :], axis=2)
+    best = d.argmin(axis=1)
+    near = d.min(axis=1) <= 0.15
+    assert (valid == near).all()
+    assert (idx[valid] == best[valid]).all()
+
+
+@pytest.mark.parametrize('index', ['kdtree', 'grid'])
+def test_icp_recovers_offset(index):
+    world = scan_sim.office_world()
+    params = dict(DEFAULTS, index=index)
+    ref = se2.transform(LASER, scan_points(world, (0.0, -2.0, 0.0)))
+    true = (0.08, -0.05, math.radians(4.0))
+    src = se2.transform(LASER, scan_points(world, se2.compose((0.0, -2.0, 0.0), true)))
+    pose, info = icp(src, Keyframe(ref, (0.0, 0.0, 0.0), params), (0.0, 0.0, 0.0), params)
+    assert np.allclose(pose[:2], true[:2], atol=5e-3)
+    assert abs(pose[2] - true[2]) < math.radians(0.2)
+    assert info['inliers'] > 0.8
+
+
+def test_odometry_drift_on_simulated_walk():
+    world = scan_sim.office_world()
+    rng = np.random.default_rng(0)
+    truth = scan_sim.trajectory(150)
+    odom = IcpOdometry(LASER)
+    for k, pose in enumerate(truth):
+        est = odom.update(scan_points(world, pose, rng, 0.01), 0.1 * k)
+    est = se2.compose(truth[0], est)
+    dist = sum(math.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(truth, truth[1:]))
+    assert math.hypot(est[0] - truth[-1][0], est[1] - truth[-1][1]) < 0.01 * dist
+    assert abs(se2.wrap(est[2] - truth[-1][2])) < math.radians(1.0)
+    assert odom.failures == 0
+
+
+def test_unknown_parameter():
+    with pytest.raises(ValueError):
+        IcpOdometry(LASER, max_iter=5)
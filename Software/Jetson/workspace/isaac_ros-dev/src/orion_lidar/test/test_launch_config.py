@@ -0,0 +1,105 @@
+import importlib.util
+import os
+
+from orion_lidar.launch_config import orion_node_params, stack_nodes
+import pytest
+
+LAUNCH_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'launch',
+                           'lidar_stack.launch.py')
+
+
+# Keyword arguments of launch_ros.actions.Node the specs may use
+NODE_KWARGS = {'package', 'executable', 'name', 'output', 'parameters', 'arguments'}
+
+
+def executables(specs):
+    return [s['executable'] for s in specs]
+
+
+def test_headless_single_process():
+    specs = stack_nodes()
+    assert 'rviz2' not in executables(specs)
+    assert executables(specs).count('lidar_stack') == 1
+    assert not {'scan_filter_node', 'icp_odometry_node'} & set(executables(specs))
+    assert 'rf2o_laser_odometry_node' not in executables(specs)
+    assert specs[0]['parameters'][0]['serial_port'] == '/dev/ttyUSB0'
+
+
+def test_multi_process_with_rviz():
+    specs = stack_nodes(single_process=False, rviz=True, rviz_config='/tmp/m.rviz')
+    names = executables(specs)
+    assert 'lidar_stack' not in names
+    assert {'scan_filter_node', 'icp_odometry_node', 'occupancy_grid_node'} <= set(names)
+    assert specs[-1]['arguments'] == ['-d', '/tmp/m.rviz']
+
+
+def test_fusion_moves_scan_odometry():
+    params = orion_node_params('icp', fusion=True)
+    assert params['icp_odometry']['odom_topic'] == '/scan_odom'
+    assert params['icp_odometry']['publish_tf'] is False
+    assert 'odom_fusion' in params
+    rf2o = [s for s in stack_nodes(odometry='rf2o', fusion=True)
+            if s['executable'] == 'rf2o_laser_odometry_node'][0]
+    assert rf2o['parameters'][0]['odom_topic'] == '/scan_odom'
+    assert 'icp_odometry' not in orion_node_params('rf2o')
+
+
+def test_one_odom_tf_publisher():
+    odometry_nodes = ('icp_odometry_node', 'odom_fusion_node', 'rf2o_laser_odometry_node')
+    for odometry in ('icp', 'rf2o'):
+        for fusion in (False, True):
+            specs = stack_nodes(odometry=odometry, fusion=fusion, single_process=False)
+            publishers = [s['executable'] for s in specs if s['executable'] in odometry_nodes
+                          and s.get('parameters', [{}])[0].get('publish_tf', True)]
+            assert publishers == (['odom_fusion_node'] if fusion else
+                                  ['%s_node' % ('icp_odometry' if odometry == 'icp'
+                                                else 'rf2o_laser_odometry')])
+
+
+def test_node_arguments():
+    for single_process in (True, False):
+        for odometry in ('icp', 'rf2o'):
+            specs = stack_nodes(odometry=odometry, fusion=True, single_process=single_process,
+                                rviz=True)
+            for spec in specs:
+                assert {'package', 'executable'} <= set(spec) <= NODE_KWARGS
+                for params in spec.get('parameters', []):
+                    assert all(isinstance(key, str) for key in params)
+                assert all(isinstance(a, str) for a in spec.get('arguments', []))
+            names = [s['name'] for s in specs if 'name' in s]
+            assert len(names) == len(set(names))
+
+
+def test_single_process_keeps_node_names():
+    # A name on the lidar_stack process would be a __node:= remap for every node in it
+    stack = [s for s in stack_nodes(fusion=True) if s['executable'] == 'lidar_stack'][0]
+    assert 'name' not in stack
+    assert set(stack['parameters'][0]) == {'odometry', 'fusion', 'local_map'}
+    # Separate processes are named like the nodes of the single process
+    specs = stack_nodes(fusion=True, single_process=False)
+    assert [s['name'] for s in specs if s['package'] == 'orion_lidar'] == \
+        list(orion_node_params('icp', fusion=True))
+
+
+def test_bad_odometry():
+    with pytest.raises(ValueError):
+        stack_nodes(odometry='laser')
+
+
+def test_launch_description():
+    pytest.importorskip('launch_ros')
+    from launch import LaunchContext
+    from launch.actions import DeclareLaunchArgument, OpaqueFunction
+
+    spec = importlib.util.spec_from_file_location('lidar_stack_launch', LAUNCH_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    ld = module.generate_launch_description()
+    args = [e for e in ld.entities if isinstance(e, DeclareLaunchArgument)]
+    assert {'rviz', 'single_process', 'serial_port'} <= {a.name for a in args}
+    context = LaunchContext()
+    for a in args:
+        context.launch_configurations[a.name] = a.default_value[0].text
+    setup = [e for e in ld.entities if isinstance(e, OpaqueFunction)][0]
+    nodes = setup.execute(context)
+    assert 'rviz2' not in [n.node_executable for n in nodes]
@@ -0,0 +1,88 @@
+import math
+import os
+import sys
+
+import numpy as np
+from orion_lidar import se2
+from orion_lidar.leg_odometry import foot_positions, LEG_ORIGINS, LegOdometry, OdomEkf, rigid_2d
+import pytest
+
+KINEMATICS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', '..',
+                              '..', '..', 'kinematics_sim', 'matplotlib_simple_sim')
+
+
+def trot_feet(t, period=1.0, stride=0.02, z=-0.15, height=0.03):
+    """Return body frame feet of the joint_streamer trot, (4, 3), stance feet move -x."""
+    out = np.empty((4, 3))
+    for leg, offset in enumerate((0.0, 0.5, 0.5, 0.0)):
+        phase = (t / period + offset) % 1.0
+        if phase < 0.5:
+            p = phase * 2
+            out[leg] = (-stride + 2 * stride * p, 0.0, z + math.sin(p * math.pi) * height)
+        else:
+            p = (phase - 0.5) * 2
+            out[leg] = (stride - 2 * stride * p, 0.0, z)
+    return out + LEG_ORIGINS
+
+
+def test_fk_matches_kinematics():
+    if not os.path.isdir(KINEMATICS_DIR):
+        pytest.skip('kinematics_sim not in this checkout')
+    pytest.importorskip('matplotlib')
+    sys.path.insert(0, KINEMATICS_DIR)
+    try:
+        from kinematics import kinematics
+    finally:
+        sys.path.remove(KINEMATICS_DIR)
+    k = kinematics()
+    # Rows in leg ID order (lf, lb, rf, rb), the order host_control streams the joints in
+    assert np.allclose(LEG_ORIGINS, k.leg_ID_origins)
+    rng = np.random.default_rng(0)
+    targets = np.stack([rng.uniform(-0.06, 0.06, (50, 4)), rng.uniform(-0.03, 0.03, (50, 4)),
+                        rng.uniform(-0.20, -0.11, (50, 4))], axis=-1)
+    angles = np.array([[k.leg_IK(list(p), legID=leg)[:3] for leg, p in enumerate(row)]
+                       for row in targets])
+    assert np.allclose(foot_positions(angles), targets + LEG_ORIGINS, atol=1e-9)
+    assert np.allclose(k.leg_FK_calc(angles[0, 2], is_right=True), targets[0, 2], atol=1e-9)
+
+
+def test_rigid_2d():
+    rng = np.random.default_rng(2)
+    src = rng.uniform(-1, 1, (4, 2))
+    pose = (0.1, -0.2, 0.3)
+    assert np.allclose(rigid_2d(src, se2.transform(pose, src)), pose)
+    assert np.allclose(rigid_2d(src[:1], src[:1] + 0.5), (0.5, 0.5, 0.0))
+
+
+def test_leg_odometry_trot_distance():
+    odom = LegOdometry()
+    pose = (0.0, 0.0, 0.0)
+    for k in range(401):  # 4 s at 100 Hz
+        delta, contact = odom.update_feet(trot_feet(k / 100.0))
+        assert contact.sum() >= 2
+        pose = se2.compose(pose, delta)
+    # Stance feet sweep 2 * stride per half period: 0.08 m/s
+    assert pose[0] == pytest.approx(0.32, abs=2e-3)
+    assert abs(pose[1]) < 1e-9 and abs(pose[2]) < 1e-9
+
+
+def test_ekf_leg_rate_with_scan_drift():
+    # Leg odometry overestimates by 10 % and sees a yaw bias, the scan odometry is exact
+    truth = [(0.0, 0.0, 0.0)]
+    ekf = OdomEkf()
+    leg_only = (0.0, 0.0, 0.0)
+    for k in range(1, 1001):  # 10 s at 100 Hz, scans at 10 Hz
+        step = (0.001, 0.0, math.radians(0.05))
+        truth.append(se2.compose(truth[-1], step))
+        measured = (1.1 * step[0], 0.0, step[2] + math.radians(0.02))
+        leg_only = se2.compose(leg_only, measured)
+        ekf.predict(measured, k / 100.0)
+        if k % 10 == 0:
+            # Scan odometry in its own frame, 30 ms old when it arrives
+            ekf.correct_scan(se2.compose((3.0, 1.0, 1.0), truth[k - 3]), (k - 3) / 100.0)
+    truth = truth[-1]
+    leg_err = math.hypot(leg_only[0] - truth[0], leg_only[1] - truth[1])
+    err = math.hypot(ekf.pose[0] - truth[0], ekf.pose[1] - truth[1])
+    assert leg_err > 0.1
+    assert err < 0.05 * leg_err
+    assert abs(se2.wrap(ekf.pose[2] - truth[2])) < math.radians(1.0)
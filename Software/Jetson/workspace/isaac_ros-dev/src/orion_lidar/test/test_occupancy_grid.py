@@ -0,0 +1,78 @@
+import math
+import time
+
+import numpy as np
+from orion_lidar import scan_sim
+from orion_lidar.occupancy_grid import cell_keys, ray_cells, TiledGrid
+import pytest
+
+
+def sampled_cells(x0, y0, x1, y1, resolution, step=1e-6):
+    t = np.arange(0.0, 1.0 + step, step)[:, None]
+    pts = np.stack([x0 + t * (x1 - x0), y0 + t * (y1 - y0)], axis=-1).reshape(-1, 2)
+    return np.unique(cell_keys(np.floor(pts / resolution)))
+
+
+def test_ray_cells_match_dense_sampling():
+    rng = np.random.default_rng(3)
+    x0, y0 = 0.123, -0.456
+    x1 = x0 + rng.uniform(-1.0, 1.0, 16)
+    y1 = y0 + rng.uniform(-1.0, 1.0, 16)
+    x1[0], y1[0] = x0 + 1.0, y0  # Axis aligned rays
+    x1[1], y1[1] = x0, y0 - 1.0
+    for k in range(len(x1)):
+        cells = np.unique(cell_keys(ray_cells(x0, y0, x1[k:k + 1], y1[k:k + 1], 0.05)))
+        assert np.array_equal(cells, sampled_cells(x0, y0, x1[k], y1[k], 0.05))
+
+
+def test_room_walls_and_free_space():
+    grid = TiledGrid(resolution=0.05, tile_size=32)
+    world = np.array(scan_sim.box(-2.0, -1.5, 2.0, 1.5))
+    pose = (0.0, 0.0, 0.3)
+    r = scan_sim.raycast(world, pose)
+    for _ in range(3):
+        grid.insert_scan(pose, r, scan_sim.ANGLE_MIN, scan_sim.ANGLE_INCREMENT)
+    assert (grid.log_odds(np.array([[1.99, 0.3], [-1.0, 1.499], [0.4, -1.5]])) > 2.0).all()
+    assert (grid.log_odds(np.array([[0.5, 0.5], [-1.5, -1.0], [1.8, 1.3]])) < -1.0).all()
+    assert grid.log_odds(np.array([[3.0, 0.0]]))[0] == 0.0  # Behind the wall, unknown
+    window, origin = grid.window(pose, 2.5)
+    assert window.shape == (100, 100)
+    assert np.allclose(origin, (-2.5, -2.5))
+    assert np.count_nonzero(window > 0) > 0.9 * 2 * (80 + 60)
+    assert window.min() >= -2.0 and window.max() <= 3.5
+
+
+def test_memory_bounded_on_long_walk():
+    grid = TiledGrid(keep_radius=4.0, max_range=4.0)
+    n = 200
+    world = np.array(scan_sim.box(-1.0, -1.0, 60.0, 1.0))
+    peak = 0
+    for k in range(n):
+        pose = (0.25 * k, 0.0, 0.0)  # 50 m
+        r = scan_sim.raycast(world, pose)
+        grid.insert_scan(pose, r, scan_sim.ANGLE_MIN, scan_sim.ANGLE_INCREMENT)
+        peak = max(peak, len(grid.tiles))
+    side = grid.tile_size * grid.resolution
+    bound = (2 * math.ceil(4.0 / side + 1) + 1) ** 2
+    assert peak <= bound
+    assert grid.evicted > 0
+    assert min(key[0] for key in grid.tiles) * side > 0.25 * (n - 1) - 4.0 - 2 * side
+
+
+@pytest.mark.parametrize('max_range', [6.0, 12.0])
+def test_scan_update_time(max_range):
+    world = scan_sim.office_world()
+    grid = TiledGrid(max_range=max_range)
+    poses = scan_sim.trajectory(60)
+    scans = [scan_sim.raycast(world, p) for p in poses]
+    times = []
+    for pose, r in zip(poses, scans):
+        start = time.perf_counter()
+        # Filtered scans are 360 beams (downsample 2)
+        grid.insert_scan(pose, r[::2], scan_sim.ANGLE_MIN, 2 * scan_sim.ANGLE_INCREMENT)
+        times.append(time.perf_counter() - start)
+    ms = 1000 * np.median(times)
+    print('occupancy grid update, max_range %.0f m: %.2f ms/scan median, %d tiles'
+          % (max_range, ms, len(grid.tiles)))
+    # One A1M8 scan period is 100 ms
+    assert ms < 25.0
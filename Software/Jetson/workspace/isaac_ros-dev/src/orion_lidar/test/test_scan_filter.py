@@ -0,0 +1,93 @@
+import math
+
+import numpy as np
+
+from orion_lidar.scan_filter import filter_scan, ScanFilter, to_points
+
+N = 720
+ANGLE_MIN = -math.pi
+INC = 2 * math.pi / N
+NO_BODY = {'body_box': (0.0, 0.0, 0.0, 0.0), 'laser_pose': (5.0, 5.0, 0.0), 'body_margin': 0.0}
+
+
+def room_scan(half=3.0):
+    """Return ranges to the walls of a square room centred on the laser."""
+    theta = ANGLE_MIN + INC * np.arange(N)
+    c, s = np.abs(np.cos(theta)), np.abs(np.sin(theta))
+    with np.errstate(divide='ignore'):
+        r = np.minimum(half / c, half / s)
+    return r.astype(np.float32)
+
+
+def beam(angle):
+    return int(round((angle - ANGLE_MIN) / INC)) % N
+
+
+def test_range_clipping():
+    r = room_scan()
+    r[10], r[20], r[30], r[40] = 0.05, 20.0, np.inf, np.nan
+    out, _, _ = filter_scan(r, ANGLE_MIN, INC, downsample=1, median_window=0,
+                            shadow_min_angle=0.0, **NO_BODY)
+    assert np.isnan(out[[10, 20, 30, 40]]).all()
+    assert np.isfinite(np.delete(out, [10, 20, 30, 40])).all()
+
+
+def test_body_mask():
+    # Laser 0.1 m ahead of the centre, body box back edge at -0.2 (+0.02 margin)
+    r = room_scan()
+    back = beam(math.pi)
+    r[back] = 0.25
+    r[back + 4] = 0.5
+    f = ScanFilter(N, ANGLE_MIN, INC, downsample=1, median_window=0, shadow_min_angle=0.0)
+    out = f(r)
+    assert np.isnan(out[back])
+    assert out[back + 4] == np.float32(0.5)
+    assert f.counts['body'] == 1
+
+
+def test_median_removes_speckle():
+    r = room_scan()
+    r[100] = 0.8
+    r[200:203] = np.nan
+    r[201] = 1.5
+    out, _, _ = filter_scan(r, ANGLE_MIN, INC, downsample=1, shadow_min_angle=0.0, **NO_BODY)
+    assert min(r[99], r[101]) <= out[100] <= max(r[99], r[101])
+    assert np.isnan(out[200:203]).all()
+
+
+def test_shadow_points():
+    # Object edge at 1 m, wall at 3 m behind it, one mixed return in between
+    r = room_scan()
+    i = beam(0.0)
+    r[i - 10:i] = 1.0
+    r[i] = 2.0
+    out, _, _ = filter_scan(r, ANGLE_MIN, INC, downsample=1, median_window=0, **NO_BODY)
+    assert np.isnan(out[i])
+    assert np.isfinite(out[i - 10:i]).all()
+    assert np.isfinite(out[i + 2:i + 10]).all()
+
+
+def test_downsample_keeps_closest():
+    r = room_scan()
+    out, amin, inc = filter_scan(r, ANGLE_MIN, INC, downsample=2, median_window=0,
+                                 shadow_min_angle=0.0, **NO_BODY)
+    assert out.size == N // 2
+    assert np.allclose(out, np.minimum(r[0::2], r[1::2]))
+    assert math.isclose(inc, 2 * INC)
+    assert math.isclose(amin, ANGLE_MIN + INC / 2)
+
+
+def test_reused_buffers_match_pure_function():
+    rng = np.random.default_rng(0)
+    f = ScanFilter(N, ANGLE_MIN, INC)
+    for _ in range(5):
+        r = room_scan() + rng.normal(0, 0.01, N).astype(np.float32)
+        r[rng.integers(0, N, 20)] = np.nan
+        expected, _, _ = filter_scan(r, ANGLE_MIN, INC)
+        np.testing.assert_array_equal(f(r), expected)
+
+
+def test_points_are_on_the_walls():
+    pts = to_points(room_scan(), ANGLE_MIN, INC)
+    assert pts.shape == (N, 2)
+    assert np.allclose(np.abs(pts).max(axis=1), 3.0, atol=1e-4)
@@ -0,0 +1,66 @@
+import time
+
+import numpy as np
+
+from orion_lidar.icp_odometry import benchmark
+from orion_lidar.scan_log import record_sim, ScanLog, ScanRecorder
+
+
+def test_roundtrip(tmp_path):
+    rng = np.random.default_rng(0)
+    ranges = rng.uniform(0.1, 10.0, (5, 360)).astype(np.float32)
+    with ScanRecorder(str(tmp_path), 360, -3.14, 0.0174, capacity=10, frame_id='laser') as rec:
+        for k in range(5):
+            assert rec.append(1.0 + 0.1 * k, ranges[k], None if k == 2 else (k, 0.0, 0.1))
+    log = ScanLog(str(tmp_path))
+    assert len(log) == 5
+    assert log.meta['frame_id'] == 'laser'
+    assert np.array_equal(log.ranges, ranges)
+    assert np.allclose(log.stamps, 1.0 + 0.1 * np.arange(5))
+    assert np.isnan(log.poses[2]).all()
+    assert np.allclose(log.poses[4], (4, 0.0, 0.1))
+    stamp, r, amin, inc, pose = next(iter(log))
+    assert stamp == 1.0 and amin == -3.14 and r.shape == (360,)
+
+
+def test_full_and_unflushed(tmp_path):
+    rec = ScanRecorder(str(tmp_path), 8, 0.0, 0.1, capacity=3, flush_every=100)
+    assert all(rec.append(1.0 + k, np.ones(8)) for k in range(3))
+    assert not rec.append(9.0, np.ones(8))
+    rec.rows.flush()  # Data on disk, meta.json still says 0 rows (as after a crash)
+    assert len(ScanLog(str(tmp_path))) == 3
+    rec.close()
+
+
+def test_unflushed_from_stamp_zero(tmp_path):
+    rec = ScanRecorder(str(tmp_path), 8, 0.0, 0.1, capacity=20, flush_every=4)
+    for k in range(7):
+        rec.append(0.1 * k, np.full(8, k))  # First stamp is 0.0, like record_sim
+    rec.rows.flush()  # Flushed at 4 rows, 3 more only in the mapped file
+    log = ScanLog(str(tmp_path))
+    assert log.meta['count'] == 4
+    assert len(log) == 7
+    assert np.allclose(log.stamps, 0.1 * np.arange(7))
+    rec.close()
+    rec = ScanRecorder(str(tmp_path), 8, 0.0, 0.1, capacity=20, flush_every=4)
+    rec.append(0.0, np.ones(8))
+    rec.rows.flush()  # Crash before the first flush
+    assert len(ScanLog(str(tmp_path))) == 1
+    rec.close()
+
+
+def test_replay_rate(tmp_path):
+    record_sim(str(tmp_path), n_scans=6)
+    log = ScanLog(str(tmp_path))
+    start = time.monotonic()
+    assert len(list(log.replay(rate=0))) == 6
+    fast = time.monotonic() - start
+    start = time.monotonic()
+    assert len(list(log.replay(rate=5.0))) == 6  # 0.5 s of scans at 5x
+    assert time.monotonic() - start >= 0.09 > fast
+
+
+def test_benchmark_on_log(tmp_path):
+    record_sim(str(tmp_path), n_scans=60)
+    result = benchmark(scans=ScanLog(str(tmp_path)))
+    assert result['final_error'] < 0.01 * result['distance'] + 0.005
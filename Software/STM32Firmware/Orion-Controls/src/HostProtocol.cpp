@@ -0,0 +1,75 @@
+#include "HostProtocol.h"
+
+uint16_t crc16(const uint8_t *data, size_t n) {
+  // CRC-16/CCITT-FALSE, bitwise. 36 byte frames, so a table isn't worth the flash
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < n; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (int b = 0; b < 8; b++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+bool HostProtocol::feed(uint8_t b) {
+  // Hunt for the two sync bytes
+  if (len_ == 0 && b != HOST_SYNC0) return false;
+  if (len_ == 1 && b != HOST_SYNC1) {
+    len_ = (b == HOST_SYNC0) ? 1 : 0;
+    return false;
+  }
+  buf_[len_++] = b;
+
+  if (len_ == 4 && buf_[3] > HOST_MAX_PAYLOAD) return resync();
+  if (len_ < HOST_HEADER_SIZE || len_ < HOST_HEADER_SIZE + buf_[3] + 2) return false;
+
+  // Complete frame
+  uint8_t payloadLen = buf_[3];
+  size_t end = HOST_HEADER_SIZE + payloadLen;
+  uint16_t crc = buf_[end] | (buf_[end + 1] << 8);
+  if (crc != crc16(buf_ + 2, end - 2)) {
+    crcErrors_++;
+    return resync();
+  }
+  len_ = 0;
+
+  if (buf_[2] != HOST_TYPE_JOINTS || payloadLen != sizeof(joints_.offsets)) return false;
+  uint16_t seq = buf_[4] | (buf_[5] << 8);
+  if (haveSeq_) dropped_ += (uint16_t)(seq - joints_.seq - 1);
+  haveSeq_ = true;
+  // STM32 is little endian like the wire format
+  memcpy(&joints_, buf_ + 4, sizeof(joints_));
+  return true;
+}
+
+bool HostProtocol::resync() {
+  // Drop the first byte and restart from the next possible sync in what was already received
+  uint8_t n = len_;
+  bool found = false;
+  len_ = 0;
+  for (uint8_t i = 1; i < n; i++) {
+    if (len_ == 0 && buf_[i] != HOST_SYNC0) continue;
+    found |= feed(buf_[i]);
+  }
+  return found;
+}
+
+void HostProtocol::sendStatus(Stream &port) {
+  uint8_t frame[HOST_HEADER_SIZE + 8 + 2];
+  uint16_t fields[4] = {joints_.seq, crcErrors_, dropped_, overflows_};
+  uint32_t now = micros();
+  frame[0] = HOST_SYNC0;
+  frame[1] = HOST_SYNC1;
+  frame[2] = HOST_TYPE_STATUS;
+  frame[3] = sizeof(fields);
+  frame[4] = statusSeq_ & 0xFF;
+  frame[5] = statusSeq_ >> 8;
+  memcpy(frame + 6, &now, 4);
+  memcpy(frame + HOST_HEADER_SIZE, fields, sizeof(fields));
+  uint16_t crc = crc16(frame + 2, HOST_HEADER_SIZE + sizeof(fields) - 2);
+  frame[HOST_HEADER_SIZE + sizeof(fields)] = crc & 0xFF;
+  frame[HOST_HEADER_SIZE + sizeof(fields) + 1] = crc >> 8;
+  port.write(frame, sizeof(frame));
+  statusSeq_++;
+}
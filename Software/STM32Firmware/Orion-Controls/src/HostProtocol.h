@@ -0,0 +1,57 @@
+#ifndef HOST_PROTOCOL_H
+#define HOST_PROTOCOL_H
+
+#include <Arduino.h>
+
+// Binary frames from the host, see Software/host_control/orion_protocol.py (keep the two in sync)
+// sync 0xA5 0x5A | type | length | seq (u16) | timestamp us (u32) | payload | CRC-16/CCITT-FALSE
+// All fields little endian, CRC covers type .. end of payload
+#define HOST_SYNC0 0xA5
+#define HOST_SYNC1 0x5A
+#define HOST_TYPE_JOINTS 0x01
+#define HOST_TYPE_STATUS 0x81
+#define HOST_NUM_JOINTS 12
+#define HOST_HEADER_SIZE 10
+#define HOST_MAX_PAYLOAD 64
+
+struct __attribute__((packed)) JointFrame {
+  uint16_t seq;
+  uint32_t timestampUs;
+  // Servo offsets from SERVO_CENTER_*, centidegrees. Legs FL, FR, BL, BR, joints hip, femur, tibia
+  int16_t offsets[HOST_NUM_JOINTS];
+};
+
+class HostProtocol {
+  public:
+    // Feed one received byte, returns true when a complete JOINTS frame passed the CRC.
+    // Never blocks, call it for every byte in Serial.available()
+    bool feed(uint8_t b);
+
+    // Last complete JOINTS frame
+    const JointFrame &joints() const { return joints_; }
+
+    // Sends last seq, CRC errors, dropped frames and overflows back to the host
+    void sendStatus(Stream &port);
+
+    // Call when the UART RX buffer was found full, bytes may have been lost
+    void noteOverflow() { overflows_++; }
+
+    uint16_t crcErrors() const { return crcErrors_; }
+    uint16_t dropped() const { return dropped_; }
+
+  private:
+    uint8_t buf_[HOST_HEADER_SIZE + HOST_MAX_PAYLOAD + 2];
+    uint8_t len_ = 0;
+    JointFrame joints_ = {};
+    bool haveSeq_ = false;
+    uint16_t statusSeq_ = 0;
+    uint16_t crcErrors_ = 0;
+    uint16_t dropped_ = 0;
+    uint16_t overflows_ = 0;
+
+    bool resync();
+};
+
+uint16_t crc16(const uint8_t *data, size_t n);
+
+#endif
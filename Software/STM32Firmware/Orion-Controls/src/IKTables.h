@@ -0,0 +1,43 @@
+// Generated by Software/host_control/fixed_ik.py --generate from the constants in LegIK.h, do not edit
+#ifndef IK_TABLES_H
+#define IK_TABLES_H
+
+#include <stdint.h>
+
+#define IK_POS_SHIFT 6 // Positions in 1/64 mm
+#define IK_LUT_BITS 8
+
+// Squared lengths, Q12 mm^2
+static const int64_t IK_L1_SQ = 6326231LL;
+static const int64_t IK_SUM_SQ = 215549379LL;
+static const int64_t IK_DIFF_SQ = 443023LL;
+static const int64_t IK_4_L2_SQ = 196448256LL;
+static const int32_t IK_TIBIA_OFFSET_MDEG = 5880;
+
+// atan(i / 256) in millidegrees, i = 0 .. 256
+static const uint16_t ATAN_LUT[257] = {
+      0,   224,   448,   671,   895,  1119,  1343,  1566,  1790,  2013,  2237,  2460,
+   2684,  2907,  3130,  3353,  3576,  3799,  4022,  4245,  4467,  4690,  4912,  5134,
+   5356,  5578,  5799,  6021,  6242,  6463,  6684,  6905,  7125,  7345,  7565,  7785,
+   8005,  8224,  8443,  8662,  8881,  9099,  9317,  9535,  9752,  9970, 10187, 10403,
+  10620, 10836, 11051, 11267, 11482, 11697, 11911, 12125, 12339, 12553, 12766, 12978,
+  13191, 13403, 13614, 13825, 14036, 14247, 14457, 14666, 14876, 15085, 15293, 15501,
+  15709, 15916, 16123, 16329, 16535, 16740, 16945, 17150, 17354, 17558, 17761, 17964,
+  18166, 18368, 18569, 18770, 18970, 19170, 19370, 19569, 19767, 19965, 20163, 20360,
+  20556, 20752, 20947, 21142, 21337, 21531, 21724, 21917, 22109, 22301, 22493, 22683,
+  22874, 23063, 23253, 23441, 23629, 23817, 24004, 24191, 24376, 24562, 24747, 24931,
+  25115, 25298, 25481, 25663, 25844, 26025, 26206, 26386, 26565, 26744, 26922, 27100,
+  27277, 27453, 27629, 27805, 27979, 28154, 28327, 28501, 28673, 28845, 29017, 29187,
+  29358, 29527, 29697, 29865, 30033, 30201, 30368, 30534, 30700, 30865, 31030, 31194,
+  31357, 31520, 31682, 31844, 32005, 32166, 32326, 32486, 32645, 32803, 32961, 33118,
+  33275, 33431, 33587, 33742, 33896, 34050, 34203, 34356, 34509, 34660, 34811, 34962,
+  35112, 35262, 35410, 35559, 35707, 35854, 36001, 36147, 36293, 36438, 36582, 36726,
+  36870, 37013, 37155, 37297, 37439, 37579, 37720, 37859, 37999, 38137, 38276, 38413,
+  38550, 38687, 38823, 38959, 39094, 39228, 39362, 39496, 39629, 39762, 39894, 40025,
+  40156, 40286, 40416, 40546, 40675, 40803, 40931, 41059, 41186, 41312, 41438, 41564,
+  41689, 41814, 41938, 42061, 42184, 42307, 42429, 42551, 42672, 42793, 42913, 43033,
+  43152, 43271, 43390, 43508, 43625, 43742, 43859, 43975, 44091, 44206, 44321, 44435,
+  44549, 44662, 44775, 44888, 45000
+};
+
+#endif
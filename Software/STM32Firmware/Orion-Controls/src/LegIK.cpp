@@ -1,4 +1,5 @@
 #include "LegIK.h"
+#include "LegIKFixed.h"
 
 LegIK::LegIK(float servoCenterHip, float servoCenterFemur, float servoCenterTibia, 
              int channelHip, int channelFemur, int channelTibia, 
@@ -19,15 +20,6 @@ bool LegIK::calculate(float x, float y, float z) {
   // Calculate virtual Hip Angle
   // Note: atan2(y, z) handles the quadrant logic better than atan(y/z)
   float theta1_rad = atan2(y, z); 
-  // Final Hip Servo Angle
-  if(IS_FRONT_LEG) {
-    thetaHipServo_ = SERVO_CENTER_HIP + toDegrees(theta1_rad);
-    offset_hip = SERVO_CENTER_HIP + 4;
-  } else {
-    // For rear legs Hip servo moves in the oppsite direction
-    thetaHipServo_ = SERVO_CENTER_HIP - toDegrees(theta1_rad);
-    offset_hip = SERVO_CENTER_HIP - 4;
-  }
 
   // --- Leg Plane (Femur & Tibia) ---
   // D is now the desired vertical distance in the leg-plane
@@ -44,20 +36,42 @@ bool LegIK::calculate(float x, float y, float z) {
   float beta_femur = asin((L3_TIBIA * sin(theta3_rad)) / G);
   float theta2_rad = toRadians(90) - (beta_femur - alpha_femur); // TODO: will this reference to 90 deg cause issues if moving femur above horizontal?
   
+  // Final Hip, Femur and Tibia Servo Angles
+  setServoAngles(toDegrees(theta1_rad), toDegrees(theta2_rad), toDegrees(theta3_rad));
+  return true;
+}
+
+bool LegIK::calculateFixed(float x, float y, float z) {
+  int32_t angles[3]; // theta1, theta2, theta3 in millidegrees
+  if (!ikSolveFixed(ikToQ(x), ikToQ(y), ikToQ(z), angles)) return false;
+  setServoAngles(angles[0] / 1000.0, angles[1] / 1000.0, angles[2] / 1000.0);
+  return true;
+}
+
+void LegIK::setServoAngles(float theta1Deg, float theta2Deg, float theta3Deg) {
+  // Final Hip Servo Angle
+  if(IS_FRONT_LEG) {
+    thetaHipServo_ = SERVO_CENTER_HIP + theta1Deg;
+    offset_hip = SERVO_CENTER_HIP + 4;
+  } else {
+    // For rear legs Hip servo moves in the oppsite direction
+    thetaHipServo_ = SERVO_CENTER_HIP - theta1Deg;
+    offset_hip = SERVO_CENTER_HIP - 4;
+  }
+
   // Accounting for Tibia servo offset and femur coupling
-  float phi = toDegrees(theta3_rad) - THETA_TIBIA_OFFSET;
-  float theta_s = 90 - phi + toDegrees(theta2_rad);
+  float phi = theta3Deg - THETA_TIBIA_OFFSET;
+  float theta_s = 90 - phi + theta2Deg;
   
   // Final Femur and Tibia Servo Angles
   if(IS_LEFT_LEG) {
-    thetaFemurServo_ = SERVO_CENTER_FEMUR - toDegrees(theta2_rad);
+    thetaFemurServo_ = SERVO_CENTER_FEMUR - theta2Deg;
     thetaTibiaServo_ = SERVO_CENTER_TIBIA - theta_s; 
   } else {
     // For right legs femur and tibia servo moves in the oppsite direction
-    thetaFemurServo_ = SERVO_CENTER_FEMUR + toDegrees(theta2_rad);
+    thetaFemurServo_ = SERVO_CENTER_FEMUR + theta2Deg;
     thetaTibiaServo_ = SERVO_CENTER_TIBIA + theta_s; 
   }
-  return true;
 }
 
 int LegIK::getHipServoChannel() { return CHANNEL_HIP;}
@@ -14,6 +14,9 @@ class LegIK {
     // Returns true if position is reachable, false if not
     bool calculate(float x, float y, float z);
 
+    // Same as calculate() with fixed-point math and lookup tables (LegIKFixed.h), no float trig
+    bool calculateFixed(float x, float y, float z);
+
     // Getters for the servo angles, accounting for alignment (in degrees)
     float getHipServoAngle();
     float getFemurServoAngle();
@@ -51,6 +54,7 @@ class LegIK {
 
     float toDegrees(float rad);
     float toRadians(float deg);
+    void setServoAngles(float theta1Deg, float theta2Deg, float theta3Deg);
 };
 
 #endif
\ No newline at end of file
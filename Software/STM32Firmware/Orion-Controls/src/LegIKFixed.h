@@ -0,0 +1,91 @@
+#ifndef LEGIK_FIXED_H
+#define LEGIK_FIXED_H
+
+// Fixed-point version of the LegIK::calculate math, no float trig.
+// Bit-identical to solve_fixed() in Software/host_control/fixed_ik.py, which also
+// generates IKTables.h and sweeps the workspace against the float solver; keep them in sync.
+// Positions in Q6 mm (1/64 mm), squared lengths in Q12, ratios in Q15, angles in millidegrees.
+
+#include <math.h>
+#include <stdint.h>
+#include "IKTables.h"
+
+static inline uint32_t ikIsqrt(uint32_t v) {
+  // floor(sqrt(v)), one result bit per iteration
+  uint32_t root = 0;
+  uint32_t bit = 1UL << 30;
+  while (bit > v) bit >>= 2;
+  while (bit) {
+    if (v >= root + bit) {
+      v -= root + bit;
+      root = (root >> 1) + bit;
+    } else {
+      root >>= 1;
+    }
+    bit >>= 2;
+  }
+  return root;
+}
+
+static inline int32_t ikAtanLut(uint32_t r) {
+  // atan of a Q15 ratio 0..1 in mdeg, linear interpolation between table entries
+  const int seg = 15 - IK_LUT_BITS;
+  uint32_t i = r >> seg;
+  if (i >= (1 << IK_LUT_BITS)) return ATAN_LUT[1 << IK_LUT_BITS];
+  int32_t frac = r & ((1 << seg) - 1);
+  int32_t a = ATAN_LUT[i];
+  int32_t b = ATAN_LUT[i + 1];
+  // b >= a, so the shift never sees a negative value
+  return a + (((b - a) * frac + (1 << (seg - 1))) >> seg);
+}
+
+static inline int32_t ikAtan2(int64_t y, int64_t x) {
+  // atan2 in mdeg, (-180000, 180000]
+  uint64_t ay = y < 0 ? -y : y;
+  uint64_t ax = x < 0 ? -x : x;
+  if (ax == 0 && ay == 0) return 0;
+  // Normalize so min << 15 fits in 32 bits
+  while (ax >= (1UL << 16) || ay >= (1UL << 16)) {
+    ax >>= 1;
+    ay >>= 1;
+  }
+  int32_t a;
+  if (ay <= ax) {
+    a = ikAtanLut(((uint32_t)ay << 15) / (uint32_t)ax);
+  } else {
+    a = 90000 - ikAtanLut(((uint32_t)ax << 15) / (uint32_t)ay);
+  }
+  if (x < 0) a = 180000 - a;
+  return y < 0 ? -a : a;
+}
+
+static inline int32_t ikToQ(float mm) {
+  return (int32_t)floorf(mm * (1 << IK_POS_SHIFT) + 0.5f);
+}
+
+// theta1, theta2, theta3 in mdeg from Q6 inputs, same angles as LegIK::calculate.
+// Returns false where the float version returns false or would produce NaN.
+static inline bool ikSolveFixed(int32_t x, int32_t y, int32_t z, int32_t out[3]) {
+  if ((int64_t)y * y + (int64_t)z * z - IK_L1_SQ < 0) return false;
+  out[0] = ikAtan2(y, z);
+
+  int64_t gSq = (int64_t)x * x + (int64_t)z * z;
+  if (gSq > IK_SUM_SQ) return false;
+  int64_t a = gSq - IK_DIFF_SQ;
+  int64_t b = IK_SUM_SQ - gSq;
+  if (a < 0) return false; // Closer than |L2 - L3|
+
+  // theta3 = acos(...) = 2 atan2(sqrt(A), sqrt(B)); A, B < 2^28 so 4 extra bits still fit
+  int64_t sa = ikIsqrt((uint32_t)(a << 4));
+  int64_t sb = ikIsqrt((uint32_t)(b << 4));
+  int32_t theta3 = 2 * ikAtan2(sa, sb);
+  int32_t alpha = ikAtan2(x, z);
+  // beta = asin(L3 sin(theta3) / G), abs() keeps asin's range
+  int64_t c = IK_4_L2_SQ - b + a;
+  int32_t beta = ikAtan2(2 * sa * sb, (c < 0 ? -c : c) << 4);
+  out[1] = 90000 - (beta - alpha);
+  out[2] = theta3;
+  return true;
+}
+
+#endif
@@ -2,6 +2,14 @@
 #include <Adafruit_PWMServoDriver.h>
 #include "LegIK.h"
 #include "ServoConfig.h"
+#include "HostProtocol.h"
+
+// 1 = take joint targets from the host (Software/host_control/joint_streamer.py) instead of stepGait()
+#define HOST_CONTROL 0
+#define HOST_BAUD 115200
+#define HOST_STATUS_EVERY 10 // Send a STATUS frame back every N applied frames
+// 1 = fixed-point IK with lookup tables (LegIKFixed.h), checked against the float version by host_control/fixed_ik.py
+#define USE_FIXED_IK 0
 
 Adafruit_PWMServoDriver pwm = Adafruit_PWMServoDriver();
 
@@ -11,6 +19,17 @@ LegIK legBackLeft(BL_SERVO_CENTER_HIP, BL_SERVO_CENTER_FEMUR, BL_SERVO_CENTER_TI
 LegIK legBackRight(BR_SERVO_CENTER_HIP, BR_SERVO_CENTER_FEMUR, BR_SERVO_CENTER_TIBIA, CH_BR_HIP, CH_BR_FEMUR, CH_BR_TIBIA, false, false);
 
 String readString = "";
+HostProtocol host;
+
+// Frame order of HostProtocol joint offsets: FL, FR, BL, BR x hip, femur, tibia
+const int HOST_CHANNELS[HOST_NUM_JOINTS] = {
+  CH_FL_HIP, CH_FL_FEMUR, CH_FL_TIBIA, CH_FR_HIP, CH_FR_FEMUR, CH_FR_TIBIA,
+  CH_BL_HIP, CH_BL_FEMUR, CH_BL_TIBIA, CH_BR_HIP, CH_BR_FEMUR, CH_BR_TIBIA};
+const float HOST_CENTERS[HOST_NUM_JOINTS] = {
+  FL_SERVO_CENTER_HIP, FL_SERVO_CENTER_FEMUR, FL_SERVO_CENTER_TIBIA,
+  FR_SERVO_CENTER_HIP, FR_SERVO_CENTER_FEMUR, FR_SERVO_CENTER_TIBIA,
+  BL_SERVO_CENTER_HIP, BL_SERVO_CENTER_FEMUR, BL_SERVO_CENTER_TIBIA,
+  BR_SERVO_CENTER_HIP, BR_SERVO_CENTER_FEMUR, BR_SERVO_CENTER_TIBIA};
 
 // Default Home Position
 float currentX = 0;
@@ -25,6 +44,7 @@ void setServoAngle(int, float);
 void standingPose();
 void crouchingPose();
 void heelingPose();
+void pollHost();
 
 void setup() {
   delay(40000);
@@ -41,9 +61,16 @@ void setup() {
   delay(2000);
   // Serial.begin(9600);
   // Serial.println("Inverse Kinematics Ready. Enter X value:");
+#if HOST_CONTROL
+  Serial.begin(HOST_BAUD);
+#endif
 }
 
 void loop() {
+#if HOST_CONTROL
+  pollHost();
+  return;
+#endif
   
   // Set Z position to commanded input position
   //  while (Serial.available()) {
@@ -217,8 +244,22 @@ void heelingPose() {
     updateLeg(legBackRight, back_x, y, back_z);
 }
 
+void pollHost() {
+  // Drain whatever arrived without waiting, the host paces the frames
+  static uint16_t applied = 0;
+  if (Serial.available() >= SERIAL_RX_BUFFER_SIZE - 1) host.noteOverflow();
+  while (Serial.available()) {
+    if (!host.feed(Serial.read())) continue;
+    const JointFrame &frame = host.joints();
+    for (int i = 0; i < HOST_NUM_JOINTS; i++) {
+      setServoAngle(HOST_CHANNELS[i], HOST_CENTERS[i] + frame.offsets[i] / 100.0);
+    }
+    if (++applied % HOST_STATUS_EVERY == 0) host.sendStatus(Serial);
+  }
+}
+
 void updateLeg(LegIK &leg, float x, float y, float z) {
-  if (leg.calculate(x, y, z)) {
+  if (USE_FIXED_IK ? leg.calculateFixed(x, y, z) : leg.calculate(x, y, z)) {
     float h = leg.getHipServoAngle();
     float f = leg.getFemurServoAngle();
     float t = leg.getTibiaServoAngle();
@@ -1,6 +1,12 @@
 import cv2
 import numpy as np
 import onnxruntime as ort
+import os
+import sys
+
+# profiler.py lives one folder up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from profiler import profiler
 
 # === CONFIGURATION ===
 CALIB_FILE = "stereo_calibration.npz"
@@ -33,10 +39,11 @@ class HitNetRunner:
         blobR = np.transpose(imgR, (2, 0, 1))[None, :, :, :]
 
         # 2. Inference
-        outputs = self.session.run(self.output_names, {
-            self.input_names[0]: blobL,
-            self.input_names[1]: blobR
-        })
+        with profiler.stage("nn_inference"):
+            outputs = self.session.run(self.output_names, {
+                self.input_names[0]: blobL,
+                self.input_names[1]: blobR
+            })
 
         # 3. Process Output (Disparity Map)
         disparity = outputs[0].squeeze()
@@ -84,25 +91,29 @@ def run_depth_sensing():
     cap_right = cv2.VideoCapture(gstreamer_pipeline(sensor_id=1, width=WIDTH, height=HEIGHT), cv2.CAP_GSTREAMER)
 
     while True:
-        retL, frameL = cap_left.read()
-        retR, frameR = cap_right.read()
+        with profiler.stage("capture"):
+            retL, frameL = cap_left.read()
+            retR, frameR = cap_right.read()
 
         if not retL or not retR: break
 
         # 1. Rectify (CRITICAL: Neural nets still need rectified inputs!)
-        rectified_L = cv2.remap(frameL, map1_L, map2_L, cv2.INTER_LINEAR)
-        rectified_R = cv2.remap(frameR, map1_R, map2_R, cv2.INTER_LINEAR)
+        with profiler.stage("rectify"):
+            rectified_L = cv2.remap(frameL, map1_L, map2_L, cv2.INTER_LINEAR)
+            rectified_R = cv2.remap(frameR, map1_R, map2_R, cv2.INTER_LINEAR)
 
         # 2. Neural Inference
-        disparity = stereo_net.compute(rectified_L, rectified_R)
+        with profiler.stage("nn_matcher"):
+            disparity = stereo_net.compute(rectified_L, rectified_R)
 
         # 3. Visualization
         # Normalize disparity for display (HitNet output is metric-like, needs scaling)
-        disp_vis = (disparity / np.max(disparity) * 255).astype(np.uint8)
-        disp_color = cv2.applyColorMap(disp_vis, cv2.COLORMAP_MAGMA)
+        with profiler.stage("visualize"):
+            disp_vis = (disparity / np.max(disparity) * 255).astype(np.uint8)
+            disp_color = cv2.applyColorMap(disp_vis, cv2.COLORMAP_MAGMA)
 
-        cv2.imshow("Left Rectified", rectified_L)
-        cv2.imshow("Neural Depth", disp_color)
+            cv2.imshow("Left Rectified", rectified_L)
+            cv2.imshow("Neural Depth", disp_color)
 
         if cv2.waitKey(1) == ord('q'):
             break
@@ -111,5 +122,8 @@ def run_depth_sensing():
     cap_right.release()
     cv2.destroyAllWindows()
 
+    profiler.report()
+    profiler.export_chrome_trace("trace_stereo_nn.json")
+
 if __name__ == "__main__":
     run_depth_sensing()
\ No newline at end of file
@@ -0,0 +1,204 @@
+'''
+Confidence-aware disparity post-processing
+
+Takes the raw left disparity from SGBM and returns a filtered disparity plus a
+per-pixel confidence map (0.0 - 1.0) so downstream code can skip garbage pixels.
+
+Steps, all run at a reduced working resolution:
+1. Right-view disparity from a second matcher (flipped images, same SGBM settings)
+2. Left/right consistency check -> validity mask + confidence
+3. Edge-preserving filtering: OpenCV contrib WLS filter when cv2.ximgproc is
+   installed, otherwise confidence-weighted hole filling + guided filter
+4. Guided upsampling back to the input resolution, using the left image as guide
+
+The whole stage has a millisecond budget. Optional steps (3 and the guided
+part of 4) are skipped when the budget is already spent, and the working scale
+adapts between frames to keep the average inside the budget.
+'''
+
+import time
+
+import cv2
+import numpy as np
+
+# WLS filter lives in opencv-contrib-python, it is optional
+HAS_XIMGPROC = hasattr(cv2, "ximgproc")
+
+
+def guided_filter(guide, src, radius, eps):
+    '''
+    He et al. guided filter built from box filters (no opencv-contrib needed).
+    guide and src are float32 images of the same size, guide in 0-1 range.
+    '''
+    ksize = (2 * radius + 1, 2 * radius + 1)
+    mean_I = cv2.boxFilter(guide, -1, ksize)
+    mean_p = cv2.boxFilter(src, -1, ksize)
+    corr_Ip = cv2.boxFilter(guide * src, -1, ksize)
+    corr_II = cv2.boxFilter(guide * guide, -1, ksize)
+
+    var_I = corr_II - mean_I * mean_I
+    cov_Ip = corr_Ip - mean_I * mean_p
+    a = cov_Ip / (var_I + eps)
+    b = mean_p - a * mean_I
+
+    mean_a = cv2.boxFilter(a, -1, ksize)
+    mean_b = cv2.boxFilter(b, -1, ksize)
+    return mean_a * guide + mean_b
+
+
+def right_num_disparities(left_matcher, scale=1.0):
+    '''
+    numDisparities for the right matcher. `scale` is the working width over the
+    width the left matcher ran at (its numDisparities is in pixels of that width),
+    the result is kept a multiple of 16.
+    '''
+    return max(16, int(round(left_matcher.getNumDisparities() * scale / 16.0)) * 16)
+
+
+def make_right_matcher(left_matcher, num_disp):
+    '''
+    SGBM with the same settings as `left_matcher` but `num_disp` disparities,
+    used on horizontally flipped images to get the right-view disparity.
+    '''
+    block = left_matcher.getBlockSize()
+    return cv2.StereoSGBM_create(
+        minDisparity=0,
+        numDisparities=num_disp,
+        blockSize=block,
+        P1=left_matcher.getP1(),
+        P2=left_matcher.getP2(),
+        disp12MaxDiff=left_matcher.getDisp12MaxDiff(),
+        uniquenessRatio=left_matcher.getUniquenessRatio(),
+        speckleWindowSize=left_matcher.getSpeckleWindowSize(),
+        speckleRange=left_matcher.getSpeckleRange(),
+        mode=left_matcher.getMode(),
+    )
+
+
+def right_disparity(matcher, gray_left, gray_right):
+    """Right-view disparity (positive pixels) by matching the flipped pair"""
+    flipped = matcher.compute(cv2.flip(gray_right, 1), cv2.flip(gray_left, 1))
+    return cv2.flip(flipped, 1).astype(np.float32) / 16.0
+
+
+def left_right_check(disp_left, disp_right, max_diff):
+    '''
+    Returns (valid mask, absolute left/right disagreement in pixels).
+    A left pixel x with disparity d must land on a right pixel x - d whose
+    disparity agrees within max_diff.
+    '''
+    h, w = disp_left.shape
+    x_right = np.arange(w, dtype=np.int32)[None, :] - np.rint(disp_left).astype(np.int32)
+    in_view = x_right >= 0
+    np.clip(x_right, 0, w - 1, out=x_right)
+    disp_at_right = np.take_along_axis(disp_right, x_right, axis=1)
+    lr_err = np.abs(disp_left - disp_at_right)
+    valid = (disp_left > 0) & (disp_at_right > 0) & in_view & (lr_err <= max_diff)
+    return valid, lr_err
+
+
+class DisparityPostProcessor:
+    def __init__(self, left_matcher, budget_ms=10.0, scale=0.5, min_scale=0.25, max_scale=1.0,
+                 lr_max_diff=1.5, texture_ref=20.0, wls_lambda=8000.0, wls_sigma=1.5,
+                 guide_radius=4, guide_eps=1e-3):
+        self.left_matcher = left_matcher
+        self.budget_ms = budget_ms
+        self.scale = scale
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.lr_max_diff = lr_max_diff  # In working-resolution pixels
+        self.texture_ref = texture_ref  # Sobel magnitude considered "fully textured"
+        self.wls_lambda = wls_lambda
+        self.wls_sigma = wls_sigma
+        self.guide_radius = guide_radius
+        self.guide_eps = guide_eps
+
+        # Cached per numDisparities (a multiple of 16), so the drifting working scale
+        # maps onto a handful of matchers
+        self._right_matchers = {}
+        self._wls = None
+        if HAS_XIMGPROC:
+            self._wls = cv2.ximgproc.createDisparityWLSFilterGeneric(False)
+            self._wls.setLambda(wls_lambda)
+            self._wls.setSigmaColor(wls_sigma)
+        self.last_ms = 0.0
+        self.skipped = []  # Optional steps dropped on the last frame to meet the budget
+
+    def _right_matcher(self, scale):
+        num_disp = right_num_disparities(self.left_matcher, scale)
+        matcher = self._right_matchers.get(num_disp)
+        if matcher is None:
+            matcher = self._right_matchers[num_disp] = make_right_matcher(self.left_matcher, num_disp)
+        return matcher
+
+    def process(self, disparity, gray_left, gray_right):
+        '''
+        disparity: float32 left disparity in pixels (SGBM output / 16), any size
+        gray_left, gray_right: the rectified grayscale images the left matcher ran on
+        Returns (filtered disparity, confidence) at the size of `disparity`
+        '''
+        start = time.perf_counter()
+        self.skipped = []
+        out_h, out_w = disparity.shape[:2]
+        scale = self.scale
+        work_size = (max(16, int(out_w * scale)), max(16, int(out_h * scale)))
+        s = work_size[0] / out_w
+
+        # 1. Reduced-resolution inputs, left disparity is resampled rather than recomputed
+        small_L = cv2.resize(gray_left, work_size, interpolation=cv2.INTER_AREA)
+        small_R = cv2.resize(gray_right, work_size, interpolation=cv2.INTER_AREA)
+        disp_L = cv2.resize(disparity, work_size, interpolation=cv2.INTER_NEAREST) * s
+        # Left numDisparities is in pixels of the width the matcher ran at, not of `disparity`
+        disp_R = right_disparity(self._right_matcher(work_size[0] / gray_left.shape[1]), small_L, small_R)
+
+        # 2. Consistency check and confidence
+        valid, lr_err = left_right_check(disp_L, disp_R, self.lr_max_diff)
+        gx = cv2.Sobel(small_L, cv2.CV_32F, 1, 0, ksize=3)
+        texture = np.minimum(np.abs(gx) / self.texture_ref, 1.0)
+        sigma = self.lr_max_diff * 0.5
+        confidence = np.exp(-(lr_err * lr_err) / (2.0 * sigma * sigma)) * (0.5 + 0.5 * texture)
+        confidence[~valid] = 0.0
+        confidence = confidence.astype(np.float32)
+        disp_L[~valid] = 0.0
+
+        # Hole filling is cheap and always done: confidence-weighted normalized convolution
+        support = cv2.boxFilter(confidence, -1, (9, 9))
+        filled = cv2.boxFilter(disp_L * confidence, -1, (9, 9)) / np.maximum(support, 1e-6)
+        filtered = np.where(valid, disp_L, filled).astype(np.float32)
+        # Filled pixels inherit (half) the support of their neighbourhood
+        confidence = np.where(valid, confidence, 0.5 * np.minimum(support, 1.0)).astype(np.float32)
+
+        guide_small = small_L.astype(np.float32) / 255.0
+
+        # 3. Edge-preserving filter
+        if self._elapsed_ms(start) < self.budget_ms * 0.6:
+            if self._wls is not None:
+                filtered = self._wls.filter(np.rint(filtered * 16.0).astype(np.int16), small_L).astype(np.float32) / 16.0
+            else:
+                filtered = guided_filter(guide_small, filtered, self.guide_radius // 2 + 1, self.guide_eps)
+        else:
+            self.skipped.append("filter")
+
+        # 4. Back to full resolution, disparity values scale with the width
+        up = cv2.resize(filtered, (out_w, out_h), interpolation=cv2.INTER_LINEAR) / s
+        confidence = cv2.resize(confidence, (out_w, out_h), interpolation=cv2.INTER_LINEAR)
+        if self._elapsed_ms(start) < self.budget_ms * 0.85:
+            guide = gray_left if gray_left.shape[:2] == (out_h, out_w) else \
+                cv2.resize(gray_left, (out_w, out_h), interpolation=cv2.INTER_LINEAR)
+            up = guided_filter(guide.astype(np.float32) / 255.0, up, self.guide_radius, self.guide_eps)
+        else:
+            self.skipped.append("guided_upsample")
+        up[confidence <= 0.0] = 0.0
+
+        # Adapt the working scale so the next frames stay inside the budget
+        self.last_ms = self._elapsed_ms(start)
+        if self.last_ms > self.budget_ms:
+            self.scale = max(self.min_scale, self.scale * 0.8)
+        elif self.last_ms < self.budget_ms * 0.5:
+            self.scale = min(self.max_scale, self.scale * 1.1)
+
+        return up, confidence
+
+    @staticmethod
+    def _elapsed_ms(start):
+        return (time.perf_counter() - start) * 1000.0
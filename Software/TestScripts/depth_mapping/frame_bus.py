@@ -0,0 +1,550 @@
+'''
+Shared-memory frame bus between the vision processes
+
+One capture process owns the stereo cameras, rectifies the pair and publishes
+it into a ring of fixed-size slots in multiprocessing.shared_memory. Any number
+of consumers (SGBM, neural matcher, recorder, RoboEyes gaze) attach by name and
+read the newest frame without copying it and without locks.
+
+Layout:
+    header  magic, version, slots, ndim, shape[4], dtype, newest frame id, publisher pid
+    slot i  seq, frame id, timestamp (CLOCK_MONOTONIC, same clock in every process), payload
+
+Writer (seqlock): seq += 1 (odd = being written), payload, frame id, timestamp,
+seq += 1 (even), then the header's newest frame id. The writer never waits.
+FramePublisher.writing() wraps this; if the payload write fails the slot is closed
+again with frame id 0, so readers skip it instead of seeing it as odd forever.
+The header's magic is written last, readers that attach earlier wait for it.
+A second publisher on the same name raises while the first one's pid is alive,
+a segment left by a crashed publisher is unlinked and created again.
+Reader: take the newest id, check the slot's seq is even and holds that id, copy
+the payload, then check seq did not move. A zero-copy reader gets a view into
+the slot and calls still_valid(frame) after processing it, which is only false
+if the writer lapped the whole ring (slots - 1 newer frames) in the meantime.
+
+Memory ordering: the seq, payload and header stores are plain numpy stores, and
+Python has no memory fences. x86 keeps stores (and loads) in program order, but
+the Jetson's ARM cores may reorder them, so a reader on another core can in
+principle see the even seq before all of the payload. The re-check of seq after
+the copy catches a writer that is still in the slot, not this reordering. In
+practice the payload write (copyto / remap, hundreds of kB) ends long before the
+seq store is visible, but the bus is not a proven seqlock on ARM: readers copy
+by default, and zero-copy views are for consumers that tolerate a rare torn frame.
+
+    # Capture process
+    python frame_bus.py capture              # stereo cameras
+    python frame_bus.py capture --images     # left.jpeg/right.jpeg on a loop, no cameras needed
+
+    # In a consumer, drop-in for the two cv2.VideoCapture objects
+    cap_left, cap_right = BusCapture.pair("orion_stereo")
+
+    python frame_bus.py record --out stereo.mp4
+    python frame_bus.py bench --readers 3    # latency/throughput vs multiprocessing.Queue
+'''
+
+import argparse
+import contextlib
+import multiprocessing as mp
+import os
+import signal
+import sys
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+# === CONFIGURATION ===
+BUS_NAME = "orion_stereo"
+SLOTS = 8
+POLL_S = 0.0005  # Reader sleep while waiting for a new frame
+
+MAGIC = 0x4F524246  # "ORBF"
+VERSION = 1
+HEADER_BYTES = 128
+SLOT_HEADER_BYTES = 64  # Keeps every payload 64-byte (cache line) aligned
+PID_FIELD = 10  # Header word holding the publisher's pid
+
+
+def _attach(name):
+    # Readers must not unlink the segment when they exit. Python < 3.13 has no track=False
+    # and registers every attach with the resource tracker, so registration is skipped by hand
+    # (unregistering afterwards would also drop the publisher's entry when the tracker is shared)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        from multiprocessing import resource_tracker
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _writer_pid(shm):
+    # Pid of the publisher that owns the segment if it is still running, else None
+    if shm.size < HEADER_BYTES:
+        return None
+    h = np.ndarray((HEADER_BYTES // 8,), np.uint64, buffer=shm.buf)
+    pid = int(h[PID_FIELD])
+    del h
+    if pid == 0:
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass  # Running under another user
+    return pid
+
+
+class _Ring:
+    """Views over one bus segment, shared by the publisher and the readers"""
+    def __init__(self, shm, slots, shape, dtype):
+        self.shm = shm
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        payload_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.slot_bytes = SLOT_HEADER_BYTES + (payload_bytes + 63) // 64 * 64
+        buf = shm.buf
+        self.header = np.ndarray((HEADER_BYTES // 8,), np.uint64, buffer=buf)
+        # meta[i] = [seq, frame id, timestamp bits]
+        self.meta = [np.ndarray((3,), np.uint64, buffer=buf, offset=HEADER_BYTES + i * self.slot_bytes)
+                     for i in range(slots)]
+        self.stamp = [np.ndarray((1,), np.float64, buffer=buf, offset=HEADER_BYTES + i * self.slot_bytes + 16)
+                      for i in range(slots)]
+        self.payload = [np.ndarray(self.shape, self.dtype, buffer=buf,
+                                   offset=HEADER_BYTES + i * self.slot_bytes + SLOT_HEADER_BYTES)
+                        for i in range(slots)]
+
+    @staticmethod
+    def size(slots, shape, dtype):
+        payload_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        return HEADER_BYTES + slots * (SLOT_HEADER_BYTES + (payload_bytes + 63) // 64 * 64)
+
+    def release(self):
+        # Views must go before the segment can be closed
+        self.header = self.meta = self.stamp = self.payload = None
+        self.shm.close()
+
+
+class FramePublisher:
+    def __init__(self, shape, dtype=np.uint8, name=BUS_NAME, slots=SLOTS):
+        if len(shape) > 4:
+            raise ValueError("Frame bus payloads have at most 4 dimensions")
+        size = _Ring.size(slots, shape, dtype)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            old = _attach(name)
+            pid = _writer_pid(old)
+            old.close()
+            if pid is not None:
+                raise FileExistsError(f"Frame bus '{name}' is being published by pid {pid}") from None
+            # Left over from a crashed capture process
+            old.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+        self.ring = _Ring(shm, slots, shape, dtype)
+        h = self.ring.header
+        h[:] = 0
+        h[PID_FIELD] = os.getpid()  # First, so a second publisher sees the segment is taken
+        h[1], h[2], h[3] = VERSION, slots, len(shape)
+        h[4:4 + len(shape)] = shape
+        h[8] = np.frombuffer(np.dtype(dtype).str.encode().ljust(8, b"\0"), np.uint64)[0]
+        h[0] = MAGIC  # Last: readers attaching meanwhile wait until the header is complete
+        self.frame_id = 0
+        self._slot = None
+
+    def begin(self):
+        """Writable view of the next slot, e.g. as cv2.remap(..., dst=view[0]). Finish with commit() or abort()"""
+        fid = self.frame_id + 1
+        slot = fid % self.ring.slots
+        # Odd: readers back off. No fence orders this before the payload stores, see the
+        # memory ordering note at the top
+        self.ring.meta[slot][0] += 1
+        self._slot = slot
+        return self.ring.payload[slot]
+
+    def commit(self, timestamp=None):
+        slot = self._slot
+        self.frame_id += 1
+        meta = self.ring.meta[slot]
+        meta[1] = self.frame_id
+        self.ring.stamp[slot][0] = time.monotonic() if timestamp is None else timestamp
+        meta[0] += 1  # Even: complete
+        self.ring.header[9] = self.frame_id
+        self._slot = None
+        return self.frame_id
+
+    def abort(self):
+        """Close a slot opened by begin() without publishing it"""
+        meta = self.ring.meta[self._slot]
+        # The payload is partly overwritten: back to even but with no frame id, so readers
+        # skip the slot, and still_valid() is false for views of the frame it held before
+        meta[1] = 0
+        meta[0] += 1
+        self._slot = None
+
+    @contextlib.contextmanager
+    def writing(self, timestamp=None):
+        """begin() / commit() as a with block, an exception inside aborts the slot instead"""
+        view = self.begin()
+        try:
+            yield view
+        except BaseException:
+            self.abort()
+            raise
+        self.commit(timestamp)
+
+    def publish(self, frames, timestamp=None):
+        with self.writing(timestamp) as view:
+            np.copyto(view, frames)
+        return self.frame_id
+
+    def close(self):
+        shm = self.ring.shm
+        self.ring.release()
+        shm.unlink()
+
+
+class Frame:
+    __slots__ = ("data", "frame_id", "timestamp", "slot", "seq", "dropped")
+
+    def __init__(self, data, frame_id, timestamp, slot, seq, dropped):
+        self.data = data
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.slot = slot
+        self.seq = seq
+        self.dropped = dropped  # Frames published since the previous read that this reader never saw
+
+
+class FrameBusReader:
+    def __init__(self, name=BUS_NAME, timeout=5.0):
+        # The segment can exist before the publisher has written its header (magic is last)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                shm = _attach(name)
+            except FileNotFoundError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+                continue
+            h = np.ndarray((HEADER_BYTES // 8,), np.uint64, buffer=shm.buf)
+            if int(h[0]) == MAGIC:
+                break
+            magic = int(h[0])
+            del h
+            shm.close()
+            if magic != 0:
+                raise ValueError(f"Shared memory '{name}' is not a frame bus")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Frame bus '{name}' header was not written within {timeout} s")
+            time.sleep(0.05)
+        version = int(h[1])
+        if version != VERSION:
+            del h
+            shm.close()
+            raise ValueError(f"Frame bus '{name}' has version {version}, expected {VERSION}")
+        ndim = int(h[3])
+        shape = tuple(int(v) for v in h[4:4 + ndim])
+        dtype = np.dtype(h[8:9].tobytes().rstrip(b"\0").decode())
+        slots = int(h[2])
+        del h
+        self.ring = _Ring(shm, slots, shape, dtype)
+        self.last_id = 0
+        self.torn = 0  # Copies thrown away because the writer overwrote the slot meanwhile
+
+    @property
+    def shape(self):
+        return self.ring.shape
+
+    def newest_id(self):
+        return int(self.ring.header[9])
+
+    def read(self, copy=True, timeout=1.0):
+        '''
+        Newest frame not seen yet (waits up to `timeout` seconds), or None.
+        The payload is copied and then the slot's seq is checked again, a torn copy is
+        dropped. copy=False returns a view into shared memory, check still_valid() after
+        using it (see the memory ordering note at the top).
+        '''
+        deadline = time.monotonic() + timeout
+        while True:
+            fid = self.newest_id()
+            if fid > self.last_id:
+                slot = fid % self.ring.slots
+                meta = self.ring.meta[slot]
+                seq = int(meta[0])
+                if seq % 2 == 0 and int(meta[1]) == fid:
+                    timestamp = float(self.ring.stamp[slot][0])
+                    data = self.ring.payload[slot]
+                    if copy:
+                        data = data.copy()
+                    if int(meta[0]) == seq:
+                        dropped = fid - self.last_id - 1 if self.last_id else 0
+                        self.last_id = fid
+                        return Frame(data, fid, timestamp, slot, seq, dropped)
+                    self.torn += 1
+                continue
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(POLL_S)
+
+    def still_valid(self, frame):
+        """True if a zero-copy frame was not overwritten while it was being used"""
+        return int(self.ring.meta[frame.slot][0]) == frame.seq
+
+    def close(self):
+        self.ring.release()
+
+
+class BusCapture:
+    '''
+    cv2.VideoCapture look-alike over one image of a bus payload, so the depth
+    scripts can swap their camera captures for the bus. Captures created by
+    pair() share a reader: reading the left one takes a new frame, the right one
+    returns its partner from the same slot.
+    Images are copies checked against the slot's seq, so a frame the writer
+    overwrote meanwhile is dropped and the next one is read instead.
+    copy=False hands out zero-copy views instead: the next read() (or release())
+    checks the previous view is still valid and counts the ones that were not in
+    `torn_views` with a warning, since the caller already used them.
+    '''
+    def __init__(self, reader, index, leader=True, copy=True):
+        self.reader = reader
+        self.index = index
+        self.leader = leader
+        self.copy = copy
+        self.frame = None
+        self.torn_views = 0  # Zero-copy frames overwritten while the caller was using them
+
+    @classmethod
+    def pair(cls, name=BUS_NAME, copy=True):
+        reader = FrameBusReader(name)
+        left = cls(reader, 0, leader=True, copy=copy)
+        right = cls(reader, 1, leader=False, copy=copy)
+        right.partner = left
+        return left, right
+
+    def isOpened(self):
+        return self.reader is not None
+
+    def _check_view(self):
+        # The caller is done with the previous zero-copy frame, was it overwritten meanwhile?
+        if self.copy or self.frame is None or self.reader.still_valid(self.frame):
+            return
+        self.torn_views += 1
+        print(f"BusCapture: frame {self.frame.frame_id} was overwritten while in use "
+              f"({self.torn_views} so far), pass copy=True if the processing is slower than the ring")
+
+    def read(self):
+        if self.leader:
+            self._check_view()
+            self.frame = self.reader.read(copy=self.copy)
+            frame = self.frame
+        else:
+            frame = self.partner.frame
+        if frame is None:
+            return False, None
+        return True, frame.data[self.index]
+
+    def release(self):
+        if self.leader and self.reader is not None:
+            self._check_view()
+            self.reader.close()
+        self.reader = None
+
+
+def capture_main(name=BUS_NAME, images=False, fps=30):
+    '''Owns the cameras: capture, rectify straight into the bus slots, publish'''
+    from stereo import gstreamer_pipeline, WIDTH, HEIGHT, CALIB_FILE
+    from governor import RectifyMaps
+    from profiler import profiler
+
+    publisher = FramePublisher((2, HEIGHT, WIDTH, 3), np.uint8, name)
+    # systemd/kill stop the capture with SIGTERM, still unlink the segment on the way out
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    print(f"Publishing rectified {WIDTH}x{HEIGHT} stereo pairs on '{name}', Ctrl-C to stop")
+    try:
+        if images:
+            left = cv2.resize(cv2.imread("left.jpeg"), (WIDTH, HEIGHT))
+            right = cv2.resize(cv2.imread("right.jpeg"), (WIDTH, HEIGHT))
+            pair = np.stack([left, right])
+            next_t = time.monotonic()
+            while True:
+                publisher.publish(pair)
+                next_t += 1.0 / fps
+                time.sleep(max(0.0, next_t - time.monotonic()))
+
+        data = np.load(CALIB_FILE)
+        rectify = RectifyMaps(data['mtxL'], data['distL'], data['mtxR'], data['distR'], data['R'], data['T'],
+                              (WIDTH, HEIGHT), cv2.CV_16SC2)
+        map1_L, map2_L, map1_R, map2_R = rectify.get((WIDTH, HEIGHT))
+        cap_left = cv2.VideoCapture(gstreamer_pipeline(sensor_id=0, width=WIDTH, height=HEIGHT), cv2.CAP_GSTREAMER)
+        cap_right = cv2.VideoCapture(gstreamer_pipeline(sensor_id=1, width=WIDTH, height=HEIGHT), cv2.CAP_GSTREAMER)
+        while True:
+            with profiler.stage("capture"):
+                retL, frameL = cap_left.read()
+                retR, frameR = cap_right.read()
+            if not retL or not retR:
+                break
+            stamp = time.monotonic()
+            with profiler.stage("rectify"):
+                # Rectify directly into the shared slot, no intermediate copy
+                with publisher.writing(stamp) as slot:
+                    cv2.remap(frameL, map1_L, map2_L, cv2.INTER_LINEAR, dst=slot[0])
+                    cv2.remap(frameR, map1_R, map2_R, cv2.INTER_LINEAR, dst=slot[1])
+        cap_left.release()
+        cap_right.release()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        publisher.close()
+        profiler.report()
+
+
+def record_main(name=BUS_NAME, out="stereo_recording.mp4", fps=30, seconds=None):
+    """Consumer that writes the pairs side by side into a video"""
+    reader = FrameBusReader(name)
+    _, h, w, _ = reader.shape
+    writer = cv2.VideoWriter(out, cv2.VideoWriter_fourcc(*"mp4v"), fps, (2 * w, h))
+    start = time.monotonic()
+    frames = dropped = 0
+    try:
+        while seconds is None or time.monotonic() - start < seconds:
+            frame = reader.read()
+            if frame is None:
+                break
+            writer.write(np.hstack([frame.data[0], frame.data[1]]))
+            frames += 1
+            dropped += frame.dropped
+    except KeyboardInterrupt:
+        pass
+    writer.release()
+    reader.close()
+    print(f"Recorded {frames} pairs to {out}, {dropped} dropped")
+
+
+def _bench_reader(name, end, work_ms, results):
+    reader = FrameBusReader(name)
+    lat, received, dropped, invalid = [], 0, 0, 0
+    while time.monotonic() < end:
+        frame = reader.read(copy=False, timeout=0.5)
+        if frame is None:
+            continue
+        lat.append((time.monotonic() - frame.timestamp) * 1000.0)
+        # Pretend to process the view in place
+        float(frame.data[0, ::64, ::64].mean())
+        if work_ms:
+            time.sleep(work_ms / 1000.0)
+        if not reader.still_valid(frame):
+            invalid += 1
+        received += 1
+        dropped += frame.dropped
+    results.put(("bus", os.getpid(), received, dropped, invalid, reader.torn, lat))
+    reader.close()
+
+
+def _bench_queue_reader(queue, end, results):
+    lat, received = [], 0
+    while time.monotonic() < end:
+        try:
+            stamp, data = queue.get(timeout=0.5)
+        except Exception:
+            continue
+        lat.append((time.monotonic() - stamp) * 1000.0)
+        received += 1
+    results.put(("queue", os.getpid(), received, 0, 0, 0, lat))
+
+
+def bench(readers=3, seconds=3.0, fps=60, width=640, height=360, work_ms=0.0):
+    '''
+    Publisher at `fps` with `readers` consumer processes, shared memory bus vs one
+    multiprocessing.Queue per consumer (pickle + pipe copy of every pair)
+    '''
+    shape = (2, height, width, 3)
+    pair = np.random.randint(0, 255, shape, dtype=np.uint8)
+    name = f"orion_bench_{os.getpid()}"
+    ctx = mp.get_context("spawn")
+
+    for kind in ("bus", "queue"):
+        results = ctx.Queue()
+        publisher = FramePublisher(shape, np.uint8, name) if kind == "bus" else None
+        queues = [ctx.Queue(maxsize=4) for _ in range(readers)] if kind == "queue" else []
+        # Absolute times on the shared monotonic clock, spawning the readers takes a while
+        start = time.monotonic() + 3.0
+        end = start + seconds
+        if kind == "bus":
+            procs = [ctx.Process(target=_bench_reader, args=(name, end + 0.5, work_ms, results))
+                     for _ in range(readers)]
+        else:
+            procs = [ctx.Process(target=_bench_queue_reader, args=(q, end + 0.5, results)) for q in queues]
+        for p in procs:
+            p.start()
+        time.sleep(max(0.0, start - time.monotonic()))
+
+        published = 0
+        publish_ms = []
+        next_t = time.monotonic()
+        while time.monotonic() < end:
+            t0 = time.perf_counter()
+            if kind == "bus":
+                publisher.publish(pair)
+            else:
+                stamp = time.monotonic()
+                for q in queues:
+                    if not q.full():
+                        q.put((stamp, pair))
+            publish_ms.append((time.perf_counter() - t0) * 1000.0)
+            published += 1
+            next_t += 1.0 / fps
+            time.sleep(max(0.0, next_t - time.monotonic()))
+
+        stats = [results.get(timeout=30) for _ in procs]
+        for p in procs:
+            p.join()
+        for q in queues:
+            # Frames nobody read any more would block the feeder thread at exit
+            q.cancel_join_thread()
+        if publisher is not None:
+            publisher.close()
+
+        lat = np.concatenate([np.array(s[6]) for s in stats if s[6]]) if any(s[6] for s in stats) else np.zeros(1)
+        received = sum(s[2] for s in stats)
+        print(f"{kind:5s}: published {published} pairs ({np.prod(shape) / 1e6:.2f} MB each) at {fps} FPS "
+              f"to {readers} readers, publish {np.mean(publish_ms):.3f} ms")
+        print(f"       received {received} ({100 * received / max(published * readers, 1):.0f}%), "
+              f"latency median {np.median(lat):.2f} ms, p99 {np.percentile(lat, 99):.2f} ms"
+              + (f", dropped {sum(s[3] for s in stats)}, overwritten while in use {sum(s[4] for s in stats)}, "
+                 f"torn copies {sum(s[5] for s in stats)}" if kind == "bus" else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared-memory stereo frame bus")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("capture", help="Publish rectified stereo pairs")
+    p.add_argument("--images", action="store_true", help="Loop left.jpeg/right.jpeg instead of the cameras")
+    p.add_argument("--fps", type=float, default=30)
+    p = sub.add_parser("record", help="Record the bus to a side-by-side video")
+    p.add_argument("--out", default="stereo_recording.mp4")
+    p.add_argument("--seconds", type=float)
+    p = sub.add_parser("bench", help="Latency/throughput vs multiprocessing.Queue")
+    p.add_argument("--readers", type=int, default=3)
+    p.add_argument("--seconds", type=float, default=3.0)
+    p.add_argument("--fps", type=float, default=60)
+    p.add_argument("--work-ms", type=float, default=0.0, help="Simulated processing per frame in each reader")
+    parser.add_argument("--name", default=BUS_NAME)
+    args = parser.parse_args()
+
+    if args.cmd == "capture":
+        capture_main(args.name, args.images, args.fps)
+    elif args.cmd == "record":
+        record_main(args.name, args.out, seconds=args.seconds)
+    else:
+        bench(args.readers, args.seconds, args.fps, work_ms=args.work_ms)
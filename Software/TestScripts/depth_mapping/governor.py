@@ -0,0 +1,164 @@
+'''
+Adaptive resolution governor for the depth loops
+
+The governor watches how long the matcher takes per frame and steps through a
+list of quality levels so the depth loop stays inside its time slice, e.g. when
+the Jetson is also running SLAM.
+
+Levels are plain dicts ordered from best quality (index 0) to cheapest, the
+governor does not care what is inside them:
+    SGBM:   {"size": (640, 360), "num_disp": 96}
+    Neural: {"model": "models/x.onnx", "input": (480, 320)}
+
+Hysteresis:
+- Latency is smoothed with an exponential moving average
+- Step down (cheaper) once the average stays over budget for `patience` frames
+- Step up (better) only once it stays under `up_ratio` * budget for 2 * `patience` frames
+- After every change wait `cooldown` frames so the new level can settle
+'''
+
+import time
+
+import cv2
+import numpy as np
+
+
+class DepthGovernor:
+    def __init__(self, levels, budget_ms, start_level=0, up_ratio=0.6,
+                 patience=10, cooldown=30, smoothing=0.2):
+        if not levels:
+            raise ValueError("DepthGovernor needs at least one level")
+        self.levels = levels
+        self.budget_ms = budget_ms
+        self.index = min(max(start_level, 0), len(levels) - 1)
+        self.up_ratio = up_ratio
+        self.patience = patience
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+
+        self.avg_ms = None
+        self._over = 0
+        self._under = 0
+        self._hold = 0
+
+    @property
+    def level(self):
+        return self.levels[self.index]
+
+    def update(self, latency_ms):
+        """Feed one frame's matcher latency, returns True if the level changed"""
+        if self.avg_ms is None:
+            self.avg_ms = latency_ms
+        else:
+            self.avg_ms += (latency_ms - self.avg_ms) * self.smoothing
+
+        if self._hold > 0:
+            self._hold -= 1
+            return False
+
+        if self.avg_ms > self.budget_ms:
+            self._over += 1
+            self._under = 0
+        elif self.avg_ms < self.budget_ms * self.up_ratio:
+            self._under += 1
+            self._over = 0
+        else:
+            self._over = self._under = 0
+
+        if self._over >= self.patience and self.index < len(self.levels) - 1:
+            return self._step(+1)
+        if self._under >= 2 * self.patience and self.index > 0:
+            return self._step(-1)
+        return False
+
+    def measure(self):
+        """Context manager that times the block and feeds it to update()"""
+        return _Measure(self)
+
+    def _step(self, direction):
+        self.index += direction
+        self._over = self._under = 0
+        self._hold = self.cooldown
+        # Forget the old average, the new level has a different cost
+        self.avg_ms = None
+        print(f"[governor] {'down' if direction > 0 else 'up'} to level {self.index}: {self.level}")
+        return True
+
+
+class _Measure:
+    def __init__(self, governor):
+        self.governor = governor
+        self.changed = False
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.changed = self.governor.update((time.perf_counter() - self.start) * 1000.0)
+        return False
+
+
+class RectifyMaps:
+    '''
+    Rectification maps for several output sizes from one calibration.
+
+    stereoRectify is solved once at the calibration resolution. For a smaller
+    output size only the new projection matrices are scaled, so a single remap
+    both rectifies and downsamples the full-resolution camera frame.
+    Maps are built lazily and cached per size.
+    '''
+    def __init__(self, mtxL, distL, mtxR, distR, R, T, base_size, map_type=cv2.CV_16SC2):
+        self.base_size = base_size
+        self.map_type = map_type
+        self.mtxL, self.distL = mtxL, distL
+        self.mtxR, self.distR = mtxR, distR
+        self.R1, self.R2, self.P1, self.P2, self.Q, _, _ = cv2.stereoRectify(
+            mtxL, distL, mtxR, distR, base_size, R, T, alpha=0
+        )
+        self._cache = {}
+
+    def scale(self, size):
+        return size[0] / self.base_size[0]
+
+    def get(self, size):
+        """Returns (map1_L, map2_L, map1_R, map2_R) producing rectified images of `size`"""
+        maps = self._cache.get(size)
+        if maps is None:
+            sx = size[0] / self.base_size[0]
+            sy = size[1] / self.base_size[1]
+            S = np.diag([sx, sy, 1.0])
+            P1 = S @ self.P1
+            P2 = S @ self.P2
+            map1_L, map2_L = cv2.initUndistortRectifyMap(self.mtxL, self.distL, self.R1, P1, size, self.map_type)
+            map1_R, map2_R = cv2.initUndistortRectifyMap(self.mtxR, self.distR, self.R2, P2, size, self.map_type)
+            maps = self._cache[size] = (map1_L, map2_L, map1_R, map2_R)
+        return maps
+
+    def Q_for(self, size):
+        """Reprojection matrix matching disparity computed at `size`"""
+        s = self.scale(size)
+        Q = self.Q.copy()
+        Q[0, 3] *= s  # -cx
+        Q[1, 3] *= s  # -cy
+        Q[2, 3] *= s  # f
+        Q[3, 3] *= s  # (cx - cx') / Tx
+        return Q
+
+
+def rescale_disparity(disparity, out_size, interpolation=cv2.INTER_NEAREST, min_valid=-1.0):
+    '''
+    Resize disparity computed at a reduced width back to `out_size` (w, h).
+    Disparity is measured in pixels, so the values are scaled by the width ratio
+    to keep downstream consumers (depth from Q, visualization) consistent.
+    Nearest neighbour by default so SGBM's invalid pixels are not blended into valid ones.
+    Only values above `min_valid` are scaled, SGBM marks invalid pixels with
+    minDisparity - 1 (-1 for minDisparity 0) and that marker has to stay as it is.
+    '''
+    h, w = disparity.shape[:2]
+    if (w, h) == tuple(out_size):
+        return disparity
+    scale = out_size[0] / w
+    d = cv2.resize(disparity, tuple(out_size), interpolation=interpolation)
+    return np.where(d > min_valid, d * scale, d)
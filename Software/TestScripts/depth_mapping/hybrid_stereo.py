@@ -0,0 +1,362 @@
+'''
+Hybrid stereo: cheap SGBM every frame, neural matcher only where SGBM fails
+
+SGBM runs on every frame. The disparity is split into a grid of tiles and the
+invalid-disparity ratio of each tile is measured. Tiles whose confidence
+(1 - invalid ratio) drops below MIN_TILE_CONFIDENCE are refined by the neural
+matcher:
+- If most of the frame is bad, the network runs once on the whole frame
+- Otherwise it runs once on a single crop bounding all the bad tiles (widened to
+  the left by numDisparities so the matches stay inside the crop)
+The network takes a fixed input size, so the crop (and the full frame) is grown
+inside the image to the network's aspect ratio and padded where the image runs out,
+instead of being stretched. A call then costs about the same whatever the crop
+size, so the crop is only used when it stays well below the padded full frame
+(full_frame_ratio), otherwise the network runs on the full frame. The last tile
+row/column take the remainder of the frame.
+The network's disparity is stitched into the SGBM holes of the bad tiles.
+
+The matcher keeps counters of how many frames/pixels needed the network, press
+'r' to print them, so accuracy can be traded for compute on purpose.
+'''
+
+import argparse
+
+import cv2
+import numpy as np
+from profiler import profiler
+from frame_bus import BusCapture
+from stereo import gstreamer_pipeline, WIDTH, HEIGHT, CALIB_FILE, FRAME_BUS
+
+# === CONFIGURATION ===
+MODEL_PATH = "models/crestereo_combined_iter2_120x160.onnx"
+GRID_ROWS, GRID_COLS = 4, 6
+# Tiles below this fraction of valid SGBM pixels are sent to the network
+MIN_TILE_CONFIDENCE = 0.65
+# Above this fraction of bad tiles the whole frame goes through the network in one call
+FULL_FRAME_RATIO = 0.5
+
+
+def tile_edges(size, count):
+    """count + 1 tile edges over size pixels, the last tile takes the remainder"""
+    edges = np.arange(count + 1) * (size // count)
+    edges[-1] = size
+    return edges
+
+
+class HybridMatcher:
+    def __init__(self, sgbm, neural, grid=(GRID_ROWS, GRID_COLS),
+                 min_tile_confidence=MIN_TILE_CONFIDENCE, full_frame_ratio=FULL_FRAME_RATIO):
+        self.sgbm = sgbm
+        self.neural = neural  # Anything with compute(left_bgr, right_bgr) -> float disparity of the same size
+        self.grid = grid
+        self.min_tile_confidence = min_tile_confidence
+        self.full_frame_ratio = full_frame_ratio
+        # Width / height the network resizes its input to, None if it takes any shape
+        input_size = getattr(neural, "input_size", None)
+        self.aspect = input_size[0] / input_size[1] if input_size else None
+
+        # Counters for report()
+        self.frames = 0
+        self.nn_frames = 0  # Frames where the network ran at all
+        self.nn_full_frames = 0  # Frames where it ran on the whole image
+        self.nn_calls = 0  # Network inferences, at most one per frame
+        self.tiles_total = 0
+        self.tiles_refined = 0
+        self.pixels_total = 0
+        self.pixels_through_nn = 0  # Pixels fed to the network (crops or full frame, with padding)
+        self.pixels_filled = 0  # SGBM holes replaced by network disparity
+
+    def tile_confidence(self, disparity):
+        """(rows, cols) array with the fraction of valid SGBM pixels per tile"""
+        rows, cols = self.grid
+        h, w = disparity.shape
+        ys, xs = tile_edges(h, rows), tile_edges(w, cols)
+        valid = disparity > 0
+        # The left numDisparities columns have no match in the right image for any matcher,
+        # count them as valid so they don't trigger the network for nothing
+        dead_band = self.sgbm.getMinDisparity() + self.sgbm.getNumDisparities()
+        valid[:, :dead_band] = True
+        counts = np.add.reduceat(np.add.reduceat(valid, ys[:-1], axis=0, dtype=np.int32), xs[:-1], axis=1)
+        return (counts / np.outer(np.diff(ys), np.diff(xs))).astype(np.float32)
+
+    def compute(self, left_bgr, right_bgr):
+        grayL = cv2.cvtColor(left_bgr, cv2.COLOR_BGR2GRAY)
+        grayR = cv2.cvtColor(right_bgr, cv2.COLOR_BGR2GRAY)
+        with profiler.stage("sgbm"):
+            disparity = self.sgbm.compute(grayL, grayR).astype(np.float32) / 16.0
+
+        h, w = disparity.shape
+        rows, cols = self.grid
+        ys, xs = tile_edges(h, rows), tile_edges(w, cols)
+        confidence = self.tile_confidence(disparity)
+        bad = confidence < self.min_tile_confidence
+
+        self.frames += 1
+        self.tiles_total += bad.size
+        self.pixels_total += h * w
+        if not bad.any():
+            return disparity
+
+        self.nn_frames += 1
+        self.tiles_refined += int(bad.sum())
+        holes = disparity <= 0
+
+        with profiler.stage("nn_refine"):
+            crop = self._refine_crop(bad, ys, xs, h, w)
+            if crop is None:
+                self.nn_full_frames += 1
+                crop = (0, h, 0, w)
+            y0, y1, x0, x1 = crop
+            nn_disp = self._neural(left_bgr, right_bgr, y0, y1, x0, x1)
+            for r, c in zip(*np.nonzero(bad)):
+                self._stitch(disparity, holes, nn_disp, ys[r], ys[r + 1], xs[c], xs[c + 1], x0, y0)
+        return disparity
+
+    def _refine_crop(self, bad, ys, xs, h, w):
+        # One crop bounding every bad tile, or None when the full frame is as cheap
+        if bad.mean() >= self.full_frame_ratio:
+            return None
+        bad_rows, bad_cols = np.nonzero(bad.any(axis=1))[0], np.nonzero(bad.any(axis=0))[0]
+        # Widen to the left so the right-image match of every pixel is inside the crop
+        margin = self.sgbm.getMinDisparity() + self.sgbm.getNumDisparities()
+        y0, y1 = ys[bad_rows[0]], ys[bad_rows[-1] + 1]
+        x0, x1 = max(0, xs[bad_cols[0]] - margin), xs[bad_cols[-1] + 1]
+        y0, y1, x0, x1 = self._aspect_crop(y0, y1, x0, x1, h, w)
+        crop_area = np.prod(self._padded_size(y1 - y0, x1 - x0))
+        if crop_area >= self.full_frame_ratio * np.prod(self._padded_size(h, w)):
+            return None
+        return y0, y1, x0, x1
+
+    def _padded_size(self, ch, cw):
+        # (height, width) once padded at the bottom/right to the network's aspect ratio
+        if self.aspect is None:
+            return ch, cw
+        if cw > ch * self.aspect:
+            return int(round(cw / self.aspect)), cw
+        return ch, int(round(ch * self.aspect))
+
+    def _aspect_crop(self, y0, y1, x0, x1, h, w):
+        # Grow the crop inside the image towards the network's aspect ratio
+        if self.aspect is None:
+            return y0, y1, x0, x1
+        ch, cw = y1 - y0, x1 - x0
+        if cw > ch * self.aspect:
+            # Too wide: add rows, centred on the crop and shifted back inside the image
+            need = min(h, int(round(cw / self.aspect)))
+            y0 = min(max(0, y0 - (need - ch) // 2), h - need)
+            y1 = y0 + need
+        else:
+            # Too tall: add columns on the left first, that is where the matches are
+            need = min(w, int(round(ch * self.aspect)))
+            x0 = max(0, x1 - need)
+            x1 = x0 + need
+        return y0, y1, x0, x1
+
+    def _neural(self, left_bgr, right_bgr, y0, y1, x0, x1):
+        # Network disparity of a crop, padded at the bottom/right to the network's aspect
+        # ratio so the resize to its input size doesn't stretch the image
+        ch, cw = y1 - y0, x1 - x0
+        ph, pw = self._padded_size(ch, cw)
+        self.nn_calls += 1
+        self.pixels_through_nn += ph * pw
+        left = left_bgr[y0:y1, x0:x1]
+        right = right_bgr[y0:y1, x0:x1]
+        if (ph, pw) != (ch, cw):
+            left = cv2.copyMakeBorder(left, 0, ph - ch, 0, pw - cw, cv2.BORDER_REPLICATE)
+            right = cv2.copyMakeBorder(right, 0, ph - ch, 0, pw - cw, cv2.BORDER_REPLICATE)
+        nn_disp = self.neural.compute(np.ascontiguousarray(left), np.ascontiguousarray(right))
+        return nn_disp[:ch, :cw]
+
+    def _stitch(self, disparity, holes, nn_disp, y0, y1, x0, x1, ox, oy=0):
+        # Fill only the SGBM holes of one tile, nn_disp starts at image coords (ox, oy)
+        tile_holes = holes[y0:y1, x0:x1]
+        src = nn_disp[y0 - oy:y1 - oy, x0 - ox:x1 - ox]
+        disparity[y0:y1, x0:x1][tile_holes] = src[tile_holes]
+        self.pixels_filled += int(tile_holes.sum())
+
+    def report(self):
+        if self.frames == 0:
+            return "No frames processed"
+        return (
+            f"frames: {self.frames}, network used on {100 * self.nn_frames / self.frames:.1f}% "
+            f"({self.nn_full_frames} full frame)\n"
+            f"tiles refined: {100 * self.tiles_refined / max(self.tiles_total, 1):.1f}%, "
+            f"pixels through network (with padding): {100 * self.pixels_through_nn / self.pixels_total:.1f}%, "
+            f"holes filled: {100 * self.pixels_filled / self.pixels_total:.1f}% of all pixels"
+        )
+
+
+class _FakeSGBM:
+    # SGBM stand-in for check(), returns a fixed disparity (x16 like OpenCV)
+    def __init__(self, disparity):
+        self.disparity = disparity
+
+    def compute(self, left, right):
+        return self.disparity
+
+    def getMinDisparity(self):
+        return 0
+
+    def getNumDisparities(self):
+        return 16 * 6
+
+
+class _FakeNeural:
+    # Neural matcher stand-in for check(), records the shape of every call
+    input_size = (160, 120)
+
+    def __init__(self):
+        self.shapes = []
+
+    def compute(self, left, right):
+        self.shapes.append(left.shape[:2])
+        return np.full(left.shape[:2], 7.0, np.float32)
+
+
+def check():
+    """At most one network call per frame, crops only when clearly cheaper, every bad tile filled"""
+    h, w = 360, 640
+    rows, cols = GRID_ROWS, GRID_COLS
+    ys, xs = tile_edges(h, rows), tile_edges(w, cols)
+    image = np.zeros((h, w, 3), np.uint8)
+    ok = True
+    cases = (
+        ("1 tile", [(1, 4)], False),
+        ("2 tiles, 2 rows", [(0, 4), (1, 5)], False),
+        ("4 rows x 2 cols", [(r, c) for r in range(4) for c in (2, 3)], True),
+        ("rows 0 and 3", [(r, c) for r in (0, 3) for c in range(1, 6)], True),
+        ("remainder corner", [(3, 5)], False),
+    )
+    for name, tiles, full in cases:
+        disparity = np.full((h, w), 16 * 40, np.int16)
+        for r, c in tiles:
+            disparity[ys[r]:ys[r + 1], xs[c]:xs[c + 1]] = -16
+        neural = _FakeNeural()
+        matcher = HybridMatcher(_FakeSGBM(disparity), neural)
+        out = matcher.compute(image, image)
+        filled = (out == 7).sum() == (disparity < 0).sum()
+        padded_frame = np.prod(matcher._padded_size(h, w))
+        cheaper = matcher.pixels_through_nn < FULL_FRAME_RATIO * padded_frame
+        aspects = [shape[1] / shape[0] for shape in neural.shapes]
+        # Padding is counted: a full frame call is the whole padded frame
+        case_ok = (len(neural.shapes) == 1 and matcher.nn_full_frames == full and filled
+                   and cheaper != full and (matcher.pixels_through_nn == padded_frame) == full)
+        ok &= case_ok
+        print(f"{name:18s} calls {len(neural.shapes)}, full frame {bool(matcher.nn_full_frames)}, "
+              f"{100 * matcher.pixels_through_nn / padded_frame:5.1f}% of the padded frame, "
+              f"aspect {aspects[0]:.2f}, {'OK' if case_ok else 'FAILED'}")
+    # No bad tiles, no call
+    neural = _FakeNeural()
+    HybridMatcher(_FakeSGBM(np.full((h, w), 16 * 40, np.int16)), neural).compute(image, image)
+    ok &= not neural.shapes
+    print("hybrid stereo check:", "OK" if ok else "FAILED")
+    return bool(ok)
+
+
+def run_depth_sensing():
+    from nn_stereo import NeuralStereoMatcher
+
+    # Load calibration data
+    try:
+        data = np.load(CALIB_FILE)
+        mtxL, distL = data['mtxL'], data['distL']
+        mtxR, distR = data['mtxR'], data['distR']
+        R, T = data['R'], data['T']
+    except Exception as e:
+        print(f"Error loading calibration file: {e}")
+        print("Please run the calibration script first!")
+        return
+
+    # Stereo Rectification
+    R1, R2, P1, P2, Q, roi1, roi2 = cv2.stereoRectify(
+        mtxL, distL, mtxR, distR, (WIDTH, HEIGHT), R, T, alpha=0
+    )
+    map1_L, map2_L = cv2.initUndistortRectifyMap(mtxL, distL, R1, P1, (WIDTH, HEIGHT), cv2.CV_16SC2)
+    map1_R, map2_R = cv2.initUndistortRectifyMap(mtxR, distR, R2, P2, (WIDTH, HEIGHT), cv2.CV_16SC2)
+
+    sgbm = cv2.StereoSGBM_create(
+        minDisparity=0,
+        numDisparities=16 * 6,
+        blockSize=5,
+        P1=8 * 3 * 5**2,
+        P2=32 * 3 * 5**2,
+        disp12MaxDiff=1,
+        uniquenessRatio=10,
+        speckleWindowSize=100,
+        speckleRange=32
+    )
+
+    print(f"Loading Neural Network from {MODEL_PATH}...")
+    try:
+        neural = NeuralStereoMatcher(MODEL_PATH)
+    except Exception as e:
+        print(f"Failed to load ONNX model: {e}")
+        return
+    matcher = HybridMatcher(sgbm, neural)
+
+    if FRAME_BUS:
+        # Rectified pairs from frame_bus.py capture, which owns the cameras
+        cap_left, cap_right = BusCapture.pair(FRAME_BUS)
+    else:
+        cap_left = cv2.VideoCapture(gstreamer_pipeline(sensor_id=0, width=WIDTH, height=HEIGHT), cv2.CAP_GSTREAMER)
+        cap_right = cv2.VideoCapture(gstreamer_pipeline(sensor_id=1, width=WIDTH, height=HEIGHT), cv2.CAP_GSTREAMER)
+
+    print("Press 'q' to quit, 'r' to print network usage")
+
+    while True:
+        with profiler.stage("capture"):
+            retL, frameL = cap_left.read()
+            retR, frameR = cap_right.read()
+
+        if not retL or not retR:
+            break
+
+        # 1. Rectify images
+        with profiler.stage("rectify"):
+            if FRAME_BUS:
+                rectified_L, rectified_R = frameL, frameR
+            else:
+                rectified_L = cv2.remap(frameL, map1_L, map2_L, cv2.INTER_LINEAR)
+                rectified_R = cv2.remap(frameR, map1_R, map2_R, cv2.INTER_LINEAR)
+
+        # 2. SGBM + neural refinement of the bad tiles
+        disparity = matcher.compute(rectified_L, rectified_R)
+
+        # 3. Visualization
+        with profiler.stage("visualize"):
+            disp_visual = cv2.normalize(disparity, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+            disp_color = cv2.applyColorMap(disp_visual, cv2.COLORMAP_JET)
+
+            cv2.imshow("Left Rectified", rectified_L)
+            cv2.imshow("Hybrid Disparity", disp_color)
+
+        key = cv2.waitKey(1)
+        # Hit "q" or "ESC" to close the window
+        if key == ord('q') or key == 27:
+            break
+        if key == ord('r'):
+            print(matcher.report())
+
+    cap_left.release()
+    cap_right.release()
+    cv2.destroyAllWindows()
+
+    print(matcher.report())
+    profiler.report()
+    profiler.export_chrome_trace("trace_hybrid_stereo.json")
+
+
+# --- Main Application Loop ---
+def main():
+    parser = argparse.ArgumentParser(description="SGBM with neural refinement of the bad tiles")
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+    if args.check:
+        check()
+    else:
+        run_depth_sensing()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,43 @@
+'''
+MiDaS monocular depth
+
+Single image:
+    python midas.py image.jpg
+
+Streaming from a camera index, video file or image sequence (e.g. "frames/%04d.png"),
+B frames per session.run call:
+    python midas.py --stream 0 --batch 4
+    python midas.py --stream recording.mp4 --batch 4 --anchors anchors.npy
+    python midas.py --stream bus --batch 4     # rectified pairs from frame_bus.py, anchors from stereo
+
+CPU throughput for several batch sizes:
+    python midas.py --benchmark
+
+MiDaS predicts relative inverse depth. With --anchors (N x 3 array of u, v, metric
+depth in meters, e.g. from lidar) the output is scaled to metric depth. On the frame
+bus the anchors come from SGBM on every pair instead (StereoAnchors).
+'''
+
+import argparse
 import cv2
 import numpy as np
 import onnxruntime as ort
 import os
 import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+from profiler import profiler
 
 # === CONFIGURATION ===
 # Using MiDaS v2.1 Small (256x256 input)
 MODEL_URL = "https://github.com/onnx/models/raw/main/vision/depth_estimation/midas/model/midas-9.onnx"
 MODEL_PATH = "./models/midas_v21_small_256.onnx"
+NET_SIZE = 256
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+PREPROCESS_WORKERS = 4
+CALIB_FILE = "stereo_calibration.npz"
+STEREO_ANCHOR_WIDTH = 320  # SGBM for the anchors runs at this width
 
 def download_model():
     if not os.path.exists(MODEL_PATH):
@@ -18,52 +48,189 @@ def download_model():
                 f.write(chunk)
         print("Download complete.")
 
+class MidasPreprocessor:
+    '''
+    Resize, BGR->RGB, mean/std normalization and HWC->CHW into preallocated
+    batch buffers. Two buffers are kept so batch k+1 can be filled while
+    batch k is still being used by session.run.
+    '''
+    def __init__(self, batch_size, size=NET_SIZE, workers=PREPROCESS_WORKERS):
+        self.size = size
+        self.buffers = [np.empty((batch_size, 3, size, size), dtype=np.float32) for _ in range(2)]
+        # Per-slot scratch so worker threads never share memory
+        self._resized = [np.empty((size, size, 3), dtype=np.uint8) for _ in range(batch_size)]
+        self._rgb = [np.empty((size, size, 3), dtype=np.uint8) for _ in range(batch_size)]
+        self._float = [np.empty((size, size, 3), dtype=np.float32) for _ in range(batch_size)]
+        self._scale = (1.0 / (255.0 * STD)).astype(np.float32)
+        self._offset = (MEAN / STD).astype(np.float32)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def _one(self, frame, out, slot):
+        cv2.resize(frame, (self.size, self.size), dst=self._resized[slot])
+        cv2.cvtColor(self._resized[slot], cv2.COLOR_BGR2RGB, dst=self._rgb[slot])
+        f = self._float[slot]
+        np.multiply(self._rgb[slot], self._scale, out=f, casting="unsafe")
+        np.subtract(f, self._offset, out=f)
+        out[slot] = f.transpose(2, 0, 1)
+
+    def batch(self, frames, buffer_index):
+        """Fills buffer `buffer_index` with `frames`, returns the filled view"""
+        out = self.buffers[buffer_index]
+        # OpenCV and NumPy release the GIL, so frames in a batch run in parallel
+        list(self.pool.map(lambda i: self._one(frames[i], out, i), range(len(frames))))
+        return out[:len(frames)]
+
+    def close(self):
+        self.pool.shutdown()
+
+class MidasRunner:
+    def __init__(self, model_path=MODEL_PATH, providers=('CPUExecutionProvider',)):
+        self.session = ort.InferenceSession(model_path, providers=list(providers))
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        # Exports with a fixed batch of 1 can't take a batch in one call, fall back to a loop
+        self.fixed_batch = inp.shape[0] if isinstance(inp.shape[0], int) else None
+        if self.fixed_batch == 1:
+            print("Note: this MiDaS export has a fixed batch size of 1, batches run frame by frame")
+
+    def run(self, blob):
+        """blob: (B, 3, H, W) float32 -> (B, H, W) relative inverse depth"""
+        if self.fixed_batch is None or self.fixed_batch == len(blob):
+            out = self.session.run(None, {self.input_name: blob})[0]
+        else:
+            out = np.concatenate([self.session.run(None, {self.input_name: blob[i:i + 1]})[0]
+                                  for i in range(len(blob))])
+        return out.reshape(len(blob), out.shape[-2], out.shape[-1])
+
+class MetricScaler:
+    '''
+    Scales relative MiDaS output to metric depth using sparse anchors.
+
+    MiDaS output is affine-invariant inverse depth, so 1/Z = a * rel + b is fit
+    by least squares over the anchors. The fit is smoothed over frames so the
+    scale does not flicker when anchors come and go.
+    '''
+    def __init__(self, smoothing=0.3, min_anchors=3, max_depth=20.0):
+        self.smoothing = smoothing
+        self.min_anchors = min_anchors
+        self.max_depth = max_depth
+        self.a = None
+        self.b = None
+
+    def update(self, rel_depth, anchors):
+        '''
+        rel_depth: (H, W) MiDaS output at image resolution
+        anchors: (N, 3) array of (u, v, metric depth in meters)
+        Returns True if the fit was updated
+        '''
+        if anchors is None or len(anchors) < self.min_anchors:
+            return False
+        anchors = np.asarray(anchors, dtype=np.float32)
+        h, w = rel_depth.shape
+        u = np.clip(anchors[:, 0].astype(np.int32), 0, w - 1)
+        v = np.clip(anchors[:, 1].astype(np.int32), 0, h - 1)
+        z = anchors[:, 2]
+        keep = z > 0
+        if keep.sum() < self.min_anchors:
+            return False
+        rel = rel_depth[v[keep], u[keep]]
+        A = np.stack([rel, np.ones_like(rel)], axis=1)
+        (a, b), *_ = np.linalg.lstsq(A, 1.0 / z[keep], rcond=None)
+        if self.a is None:
+            self.a, self.b = a, b
+        else:
+            self.a += (a - self.a) * self.smoothing
+            self.b += (b - self.b) * self.smoothing
+        return True
+
+    def apply(self, rel_depth):
+        """Metric depth in meters, 0 where the fit gives no valid depth"""
+        if self.a is None:
+            return None
+        inv = self.a * rel_depth + self.b
+        depth = np.zeros_like(rel_depth)
+        valid = inv > 1.0 / self.max_depth
+        depth[valid] = 1.0 / inv[valid]
+        return depth
+
+def anchors_from_disparity(disparity, focal_px, baseline_m, confidence=None, min_confidence=0.5, step=16):
+    '''
+    Sparse (u, v, depth) anchors from a stereo disparity map, sampled every `step`
+    pixels and only where disparity (and confidence if given) is valid.
+    '''
+    v, u = np.mgrid[step // 2:disparity.shape[0]:step, step // 2:disparity.shape[1]:step]
+    d = disparity[v, u]
+    keep = d > 0
+    if confidence is not None:
+        keep &= confidence[v, u] >= min_confidence
+    z = focal_px * baseline_m / d[keep]
+    return np.stack([u[keep], v[keep], z], axis=1).astype(np.float32)
+
+class StereoAnchors:
+    '''
+    Per-frame anchors from SGBM on a rectified pair. The pair is matched at
+    `width` and the anchors are mapped back to full-resolution pixels.
+    '''
+    def __init__(self, rectify, size, width=STEREO_ANCHOR_WIDTH, step=16):
+        self.scale = width / size[0]
+        self.size = (width, int(round(size[1] * self.scale)))
+        Q = rectify.Q_for(self.size)
+        self.focal_px = abs(Q[2, 3])
+        self.baseline_m = 1.0 / abs(Q[3, 2])  # Q[3, 2] = -1 / Tx
+        self.step = step
+        self.sgbm = cv2.StereoSGBM_create(minDisparity=0, numDisparities=16 * 4, blockSize=5,
+                                          P1=8 * 3 * 5**2, P2=32 * 3 * 5**2, uniquenessRatio=10,
+                                          speckleWindowSize=100, speckleRange=32)
+
+    def __call__(self, left, right):
+        grayL = cv2.cvtColor(cv2.resize(left, self.size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        grayR = cv2.cvtColor(cv2.resize(right, self.size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        disparity = self.sgbm.compute(grayL, grayR).astype(np.float32) / 16.0
+        anchors = anchors_from_disparity(disparity, self.focal_px, self.baseline_m, step=self.step)
+        anchors[:, :2] /= self.scale
+        return anchors
+
+def colorize(depth):
+    depth_min = depth.min()
+    depth_max = depth.max()
+    depth_norm = (255 * (depth - depth_min) / max(depth_max - depth_min, 1e-6)).astype(np.uint8)
+    return cv2.applyColorMap(depth_norm, cv2.COLORMAP_JET)
+
 def main(image_path):
     download_model()
-    
+
     # Load Model
     # Use ['CUDAExecutionProvider'] for Jetson/Desktop GPU
-    session = ort.InferenceSession(MODEL_PATH, providers=['CPUExecutionProvider'])
-    input_name = session.get_inputs()[0].name
+    runner = MidasRunner(MODEL_PATH)
 
     # Load and Preprocess Image
     img = cv2.imread(image_path)
     if img is None:
         print("Error: Image not found.")
         return
-        
-    img_h, img_w = img.shape[:2]
-    
-    # 1. Resize and convert to RGB
-    img_input = cv2.resize(img, (256, 256))
-    img_input = cv2.cvtColor(img_input, cv2.COLOR_BGR2RGB)
-
-    # 2. Normalize and explicitly cast to FLOAT32
-    # This is the line that fixes the "double vs float" error
-    img_input = img_input.astype(np.float32) / 255.0
 
-    # 3. Apply Mean/Std normalization
-    mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-    std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-    img_input = (img_input - mean) / std
+    img_h, img_w = img.shape[:2]
 
-    # 4. Final formatting
-    img_input = np.transpose(img_input, (2, 0, 1)) # HWC to CHW
-    img_input = np.expand_dims(img_input, axis=0)  # Add batch dimension
+    with profiler.stage("preprocess"):
+        # Resize, RGB, mean/std normalization and HWC -> CHW with a batch dimension
+        prep = MidasPreprocessor(batch_size=1)
+        img_input = prep.batch([img], 0)
+        prep.close()
 
     # Inference
     print("Computing depth...")
-    output = session.run(None, {input_name: img_input})
-    depth = np.squeeze(output[0])
-
-    # Post-process: Resize back to original resolution
-    depth_resized = cv2.resize(depth, (img_w, img_h))
-    
-    # Normalize for visualization
-    depth_min = depth_resized.min()
-    depth_max = depth_resized.max()
-    depth_norm = (255 * (depth_resized - depth_min) / (depth_max - depth_min)).astype(np.uint8)
-    depth_color = cv2.applyColorMap(depth_norm, cv2.COLORMAP_JET)
+    with profiler.stage("midas_inference"):
+        depth = runner.run(img_input)[0]
+
+    with profiler.stage("postprocess"):
+        # Post-process: Resize back to original resolution
+        depth_resized = cv2.resize(depth, (img_w, img_h))
+
+        # Normalize for visualization
+        depth_color = colorize(depth_resized)
+
+    profiler.report()
+    profiler.export_chrome_trace("trace_midas.json")
 
     # Show result
     cv2.imshow("Original", img)
@@ -71,9 +238,164 @@ def main(image_path):
     cv2.waitKey(0)
     cv2.destroyAllWindows()
 
+def read_batch(cap, batch_size, cap_right=None):
+    """Up to batch_size frames, plus their right partners when reading a stereo pair"""
+    frames, rights = [], []
+    while len(frames) < batch_size:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if cap_right is not None:
+            ret, right = cap_right.read()
+            if not ret:
+                break
+            rights.append(right)
+        frames.append(frame)
+    return frames, rights
+
+def stream(source, batch_size=4, anchors=None, show=True):
+    '''
+    Streaming depth from a camera/video/image sequence, or the frame bus ("bus").
+    Preprocessing of batch k+1 runs in a thread pool while session.run works on batch k.
+    anchors: None, an (N, 3) array used for every frame, or a callable
+    (left, right) -> (N, 3) anchors per frame, which needs the frame bus.
+    Every frame is scaled to metric depth when anchors are given, with or without display.
+    '''
+    download_model()
+    runner = MidasRunner(MODEL_PATH)
+    prep = MidasPreprocessor(batch_size)
+    scaler = MetricScaler()
+    fill_pool = ThreadPoolExecutor(max_workers=1)
+
+    cap_right = None
+    if source == "bus":
+        from frame_bus import BusCapture, BUS_NAME
+        # Frames are kept until their batch has run, so they are copied out of the ring
+        cap, cap_right = BusCapture.pair(BUS_NAME, copy=True)
+    else:
+        if callable(anchors):
+            print("Error: per-frame stereo anchors need the frame bus (--stream bus)")
+            return
+        cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not cap.isOpened():
+        print(f"Error: could not open {source}")
+        return
+
+    print("Press 'q' to quit")
+    frames, rights = read_batch(cap, batch_size, cap_right)
+    pending = fill_pool.submit(prep.batch, frames, 0) if frames else None
+    k = 0
+    n_frames = 0
+    n_scaled = 0
+    start = time.perf_counter()
+    while pending is not None:
+        with profiler.stage("wait_preprocess"):
+            blob = pending.result()
+        batch_frames, batch_rights = frames, rights
+
+        # Kick off the next batch before inference so both overlap
+        with profiler.stage("capture"):
+            frames, rights = read_batch(cap, batch_size, cap_right)
+        pending = fill_pool.submit(prep.batch, frames, (k + 1) % 2) if frames else None
+
+        with profiler.stage("midas_inference"):
+            depths = runner.run(blob)
+        k += 1
+        n_frames += len(batch_frames)
+
+        metric = None
+        if anchors is not None:
+            with profiler.stage("metric_scale"):
+                for i, frame in enumerate(batch_frames):
+                    rel = cv2.resize(depths[i], (frame.shape[1], frame.shape[0]))
+                    frame_anchors = anchors(frame, batch_rights[i]) if callable(anchors) else anchors
+                    scaler.update(rel, frame_anchors)
+                    # Frames without enough anchors keep the smoothed fit of the earlier ones
+                    metric = scaler.apply(rel)
+                    n_scaled += metric is not None
+            if metric is not None and np.any(metric > 0):
+                print(f"\rmedian depth {np.median(metric[metric > 0]):.2f} m", end="")
+
+        if not show:
+            continue
+        with profiler.stage("postprocess"):
+            frame = batch_frames[-1]
+            rel = cv2.resize(depths[-1], (frame.shape[1], frame.shape[0]))
+            cv2.imshow("Frame", frame)
+            cv2.imshow("MiDaS Depth", colorize(rel))
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+    elapsed = time.perf_counter() - start
+    print(f"\n{n_frames} frames in {elapsed:.1f} s ({n_frames / max(elapsed, 1e-6):.1f} FPS, batch {batch_size})"
+          + (f", {n_scaled} scaled to metric depth" if anchors is not None else ""))
+    if pending is not None:
+        pending.result()
+    cap.release()
+    fill_pool.shutdown()
+    prep.close()
+    if show:
+        cv2.destroyAllWindows()
+    profiler.report()
+    profiler.export_chrome_trace("trace_midas_stream.json")
+
+def benchmark(batch_sizes=(1, 2, 4, 8), n_frames=64, frame_size=(640, 360)):
+    '''
+    Frames per second of preprocessing + inference on synthetic frames for each
+    batch size, with the same double-buffered pipeline as stream()
+    '''
+    download_model()
+    runner = MidasRunner(MODEL_PATH)
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (frame_size[1], frame_size[0], 3), dtype=np.uint8) for _ in range(8)]
+
+    print(f"{'batch':>6}{'FPS':>10}{'ms/frame':>10}")
+    for b in batch_sizes:
+        prep = MidasPreprocessor(b)
+        fill_pool = ThreadPoolExecutor(max_workers=1)
+        batches = [[frames[(i + j) % len(frames)] for j in range(b)] for i in range(0, n_frames, b)]
+        # Warm-up so session allocation isn't timed
+        runner.run(prep.batch(batches[0], 0))
+
+        start = time.perf_counter()
+        pending = fill_pool.submit(prep.batch, batches[0], 0)
+        for k in range(len(batches)):
+            blob = pending.result()
+            if k + 1 < len(batches):
+                pending = fill_pool.submit(prep.batch, batches[k + 1], (k + 1) % 2)
+            runner.run(blob)
+        elapsed = time.perf_counter() - start
+        done = len(batches) * b
+        print(f"{b:>6}{done / elapsed:>10.1f}{1000 * elapsed / done:>10.2f}")
+        fill_pool.shutdown()
+        prep.close()
+
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) < 2:
-        print("Usage: python run_midas.py image.jpg")
+    parser = argparse.ArgumentParser(description="MiDaS monocular depth")
+    parser.add_argument("image", nargs="?", help="single image to process")
+    parser.add_argument("--stream", help="camera index, video file, image sequence pattern or 'bus' (frame_bus.py)")
+    parser.add_argument("--batch", type=int, default=4, help="frames per session.run call when streaming")
+    parser.add_argument("--anchors", help=".npy file with (u, v, depth_m) rows for metric scaling")
+    parser.add_argument("--headless", action="store_true", help="stream without display windows")
+    parser.add_argument("--benchmark", action="store_true", help="measure throughput for batch sizes 1-8")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+    elif args.stream is not None:
+        anchors = np.load(args.anchors) if args.anchors else None
+        if anchors is None and args.stream == "bus":
+            # Per-frame anchors from stereo on the rectified pairs the bus carries
+            from frame_bus import FrameBusReader
+            from governor import RectifyMaps
+            reader = FrameBusReader()
+            _, h, w, _ = reader.shape
+            reader.close()
+            data = np.load(CALIB_FILE)
+            rectify = RectifyMaps(data['mtxL'], data['distL'], data['mtxR'], data['distR'], data['R'], data['T'], (w, h))
+            anchors = StereoAnchors(rectify, (w, h))
+        stream(args.stream, args.batch, anchors, show=not args.headless)
+    elif args.image:
+        main(args.image)
     else:
-        main(sys.argv[1])
\ No newline at end of file
+        parser.print_usage()
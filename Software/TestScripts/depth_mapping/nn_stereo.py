@@ -1,6 +1,10 @@
 import cv2
 import numpy as np
+import os
 import onnxruntime as ort
+from profiler import profiler
+from governor import DepthGovernor, rescale_disparity
+from frame_bus import BusCapture
 
 # === CONFIGURATION ===
 # Model Path: Download CREStereo or RAFT-Stereo ONNX model
@@ -10,6 +14,17 @@ MODEL_PATH = "models/crestereo_combined_iter2_120x160.onnx"
 CALIB_FILE = "stereo_calibration.npz"
 WIDTH, HEIGHT = 640, 360
 INPUT_WIDTH, INPUT_HEIGHT = 480, 320 # Model input size (smaller = faster)
+# Time slice for the matcher, the governor steps through the variants below to stay inside it
+DEPTH_BUDGET_MS = 80
+# Best quality first. Variants whose model file is missing are skipped
+MODEL_VARIANTS = [
+    {"model": MODEL_PATH, "input": (INPUT_WIDTH, INPUT_HEIGHT)},
+    {"model": MODEL_PATH, "input": (320, 240)},
+    {"model": MODEL_PATH, "input": (160, 120)},
+]
+# Read rectified pairs from the shared-memory frame bus (frame_bus.py capture) instead of
+# opening the cameras, e.g. "orion_stereo". None = own the cameras
+FRAME_BUS = None
 
 def gstreamer_pipeline(sensor_id=0, width=WIDTH, height=HEIGHT, framerate=30):
     return (
@@ -20,7 +35,8 @@ def gstreamer_pipeline(sensor_id=0, width=WIDTH, height=HEIGHT, framerate=30):
     )
 
 class NeuralStereoMatcher:
-    def __init__(self, model_path):
+    def __init__(self, model_path, input_size=(INPUT_WIDTH, INPUT_HEIGHT)):
+        self.input_size = input_size # (w, h) the images are resized to before inference
         # Initialize ONNX Runtime with CUDA (GPU)
         providers = [
             ('CUDAExecutionProvider', {
@@ -41,8 +57,8 @@ class NeuralStereoMatcher:
         # 1. Preprocess
         # Resize to model input size
         h, w = left_img.shape[:2]
-        l_resized = cv2.resize(left_img, (INPUT_WIDTH, INPUT_HEIGHT))
-        r_resized = cv2.resize(right_img, (INPUT_WIDTH, INPUT_HEIGHT))
+        l_resized = cv2.resize(left_img, self.input_size)
+        r_resized = cv2.resize(right_img, self.input_size)
         
         # Normalize and Transpose (HWC -> CHW)
         # CREStereo/RAFT usually expect normalization specific to their training
@@ -58,15 +74,17 @@ class NeuralStereoMatcher:
             # Concatenate along channel dimension if model expects single input
             inputs = {self.input_names[0]: np.concatenate((l_blob, r_blob), axis=1)}
             
-        output = self.session.run(self.output_names, inputs)
+        with profiler.stage("nn_inference"):
+            output = self.session.run(self.output_names, inputs)
         
         # 3. Post-process
         # Disparity is usually the first output
         disp = output[0]
         
         # Squeeze batch/channel dims and resize back to original resolution
+        # Disparity is in model-input pixels, so it is rescaled along with the image
         disp = np.squeeze(disp)
-        disp_resized = cv2.resize(disp, (w, h))
+        disp_resized = rescale_disparity(disp, (w, h), cv2.INTER_LINEAR)
         
         return disp_resized
 
@@ -109,30 +127,53 @@ def run_depth_sensing():
         print(f"Failed to load ONNX model: {e}")
         return
 
-    cap_left = cv2.VideoCapture(gstreamer_pipeline(sensor_id=0), cv2.CAP_GSTREAMER)
-    cap_right = cv2.VideoCapture(gstreamer_pipeline(sensor_id=1), cv2.CAP_GSTREAMER)
+    # One session per model file, variants sharing a file only change the input size
+    sessions = {MODEL_PATH: matcher}
+    variants = [v for v in MODEL_VARIANTS if os.path.exists(v["model"])] or MODEL_VARIANTS[:1]
+    governor = DepthGovernor(variants, DEPTH_BUDGET_MS)
+
+    if FRAME_BUS:
+        # Rectified pairs from frame_bus.py capture, which owns the cameras
+        cap_left, cap_right = BusCapture.pair(FRAME_BUS)
+    else:
+        cap_left = cv2.VideoCapture(gstreamer_pipeline(sensor_id=0), cv2.CAP_GSTREAMER)
+        cap_right = cv2.VideoCapture(gstreamer_pipeline(sensor_id=1), cv2.CAP_GSTREAMER)
 
     while True:
-        retL, frameL = cap_left.read()
-        retR, frameR = cap_right.read()
+        with profiler.stage("capture"):
+            retL, frameL = cap_left.read()
+            retR, frameR = cap_right.read()
 
         if not retL or not retR: break
 
         # 1. Rectify images
-        rectified_L = cv2.remap(frameL, map1_L, map2_L, cv2.INTER_LINEAR)
-        rectified_R = cv2.remap(frameR, map1_R, map2_R, cv2.INTER_LINEAR)
+        with profiler.stage("rectify"):
+            if FRAME_BUS:
+                rectified_L, rectified_R = frameL, frameR
+            else:
+                rectified_L = cv2.remap(frameL, map1_L, map2_L, cv2.INTER_LINEAR)
+                rectified_R = cv2.remap(frameR, map1_R, map2_R, cv2.INTER_LINEAR)
 
         # 2. Neural Disparity Inference
         # Unlike SGBM, we feed color images usually
-        disparity = matcher.compute(rectified_L, rectified_R)
+        with profiler.stage("nn_matcher"), governor.measure() as measured:
+            disparity = matcher.compute(rectified_L, rectified_R)
+
+        if measured.changed:
+            variant = governor.level
+            if variant["model"] not in sessions:
+                sessions[variant["model"]] = NeuralStereoMatcher(variant["model"])
+            matcher = sessions[variant["model"]]
+            matcher.input_size = variant["input"]
 
         # 3. Visualization
         # Normalize disparity to 0-255 for colormap
-        disp_vis = cv2.normalize(disparity, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-        disp_color = cv2.applyColorMap(disp_vis, cv2.COLORMAP_MAGMA)
+        with profiler.stage("visualize"):
+            disp_vis = cv2.normalize(disparity, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+            disp_color = cv2.applyColorMap(disp_vis, cv2.COLORMAP_MAGMA)
 
-        cv2.imshow("Left Rectified", rectified_L)
-        cv2.imshow("Neural Disparity", disp_color)
+            cv2.imshow("Left Rectified", rectified_L)
+            cv2.imshow("Neural Disparity", disp_color)
 
         if cv2.waitKey(1) == ord('q'):
             break
@@ -141,5 +182,8 @@ def run_depth_sensing():
     cap_right.release()
     cv2.destroyAllWindows()
 
+    profiler.report()
+    profiler.export_chrome_trace("trace_nn_stereo.json")
+
 if __name__ == "__main__":
     run_depth_sensing()
\ No newline at end of file
@@ -0,0 +1,187 @@
+'''
+Lightweight stage timers for the depth and vision loops
+
+Usage:
+    from profiler import profiler
+
+    with profiler.stage("rectify"):
+        ...
+
+    @profiler.timed("sgbm")
+    def compute(...):
+        ...
+
+Profiling is off unless ORION_PROFILE=1 is set (or profiler.enabled = True).
+When off, stage() hands back a shared no-op context manager so the hooks can
+stay in the frame loops permanently.
+
+When on, every stage feeds a latency histogram and a ring buffer of trace
+events. Call profiler.report() for a text summary and
+profiler.export_chrome_trace("trace.json") to open the timeline in
+chrome://tracing or https://ui.perfetto.dev
+'''
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# === CONFIGURATION ===
+ENABLED = os.environ.get("ORION_PROFILE", "0") == "1"
+TRACE_CAPACITY = 8192  # Trace events kept in the ring buffer (oldest dropped first)
+# Histogram bucket upper edges in milliseconds, the last bucket catches everything above
+BUCKETS_MS = (0.5, 1, 2, 4, 8, 16, 33, 66, 133, 266, 533)
+
+
+class _NullStage:
+    # Shared no-op context manager returned while profiling is disabled
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = float("inf")
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.last_ms = ms
+        if ms < self.min_ms: self.min_ms = ms
+        if ms > self.max_ms: self.max_ms = ms
+        for i, edge in enumerate(BUCKETS_MS):
+            if ms <= edge:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    @property
+    def mean_ms(self):
+        return self.total_ms / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """Approximate percentile (0-100) from the histogram, returns the bucket upper edge (capped at max)"""
+        if self.count == 0:
+            return 0.0
+        target = self.count * p / 100.0
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return min(BUCKETS_MS[i], self.max_ms) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.profiler._record(self.name, self.start, end)
+        return False
+
+
+class Profiler:
+    def __init__(self, enabled=ENABLED, capacity=TRACE_CAPACITY):
+        self.enabled = enabled
+        self.stats = {}
+        self.trace = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._pid = os.getpid()
+
+    def stage(self, name):
+        """Context manager timing one stage of a frame loop"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def timed(self, name=None):
+        """Decorator version of stage(), defaults to the function's qualified name"""
+        def decorator(func):
+            stage_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._record(stage_name, start, time.perf_counter())
+            return wrapper
+        return decorator
+
+    def _record(self, name, start, end):
+        ms = (end - start) * 1000.0
+        tid = threading.get_ident()
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = StageStats(name)
+            stats.add(ms)
+            # Chrome trace timestamps are in microseconds
+            self.trace.append((name, (start - self._t0) * 1e6, ms * 1000.0, tid))
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self.trace.clear()
+            self._t0 = time.perf_counter()
+
+    def summary(self):
+        if not self.stats:
+            return "No profiling data (set ORION_PROFILE=1 to enable)"
+        lines = [f"{'stage':<24}{'count':>8}{'mean ms':>10}{'p50':>8}{'p95':>8}{'max ms':>10}"]
+        with self._lock:
+            rows = sorted(self.stats.values(), key=lambda s: s.total_ms, reverse=True)
+            for s in rows:
+                lines.append(
+                    f"{s.name:<24}{s.count:>8}{s.mean_ms:>10.2f}"
+                    f"{s.percentile(50):>8.1f}{s.percentile(95):>8.1f}{s.max_ms:>10.2f}"
+                )
+        return "\n".join(lines)
+
+    def report(self):
+        if self.enabled:
+            print(self.summary())
+
+    def export_chrome_trace(self, path):
+        """Write the ring buffer as Chrome trace event JSON"""
+        if not self.enabled:
+            return
+        with self._lock:
+            events = [
+                {"name": name, "ph": "X", "ts": ts, "dur": dur, "pid": self._pid, "tid": tid}
+                for name, ts, dur, tid in self.trace
+            ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        print(f"Trace with {len(events)} events saved to {path}")
+
+
+# Shared instance used by all the scripts
+profiler = Profiler()
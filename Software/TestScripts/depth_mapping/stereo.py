@@ -1,10 +1,31 @@
 import cv2
 import numpy as np
+from profiler import profiler
+from governor import DepthGovernor, RectifyMaps, rescale_disparity
+from disparity_filter import DisparityPostProcessor
+from frame_bus import BusCapture
 
 # === CONFIGURATION ===
 CALIB_FILE = "stereo_calibration.npz"
-# Lower resolution for SGBM performance
+# Capture (and calibration) resolution, disparity is always reported at this size
 WIDTH, HEIGHT = 640, 360
+# Time slice for the matcher, the governor steps the levels below to stay inside it
+DEPTH_BUDGET_MS = 40
+# Best quality first. numDisparities must be divisible by 16
+GOVERNOR_LEVELS = [
+    {"size": (640, 360), "num_disp": 16 * 6},
+    {"size": (640, 360), "num_disp": 16 * 4},
+    {"size": (480, 270), "num_disp": 16 * 4},
+    {"size": (320, 180), "num_disp": 16 * 3},
+    {"size": (320, 180), "num_disp": 16 * 2},
+]
+# Disparity post-processing (left/right check, filtering, confidence) time slice
+POSTPROCESS_BUDGET_MS = 15
+# Pixels below this confidence are treated as invalid
+MIN_CONFIDENCE = 0.5
+# Read rectified pairs from the shared-memory frame bus (frame_bus.py capture) instead of
+# opening the cameras, e.g. "orion_stereo". None = own the cameras
+FRAME_BUS = None
 
 def gstreamer_pipeline(sensor_id=0, width=WIDTH, height=HEIGHT, framerate=30):
     return (
@@ -27,17 +48,16 @@ def run_depth_sensing():
         return
 
     # Stereo Rectification
-    R1, R2, P1, P2, Q, roi1, roi2 = cv2.stereoRectify(
-        mtxL, distL, mtxR, distR, (WIDTH, HEIGHT), R, T, alpha=0
-    )
-
-    map1_L, map2_L = cv2.initUndistortRectifyMap(mtxL, distL, R1, P1, (WIDTH, HEIGHT), cv2.CV_16SC2)
-    map1_R, map2_R = cv2.initUndistortRectifyMap(mtxR, distR, R2, P2, (WIDTH, HEIGHT), cv2.CV_16SC2)
+    # Maps are rebuilt (and cached) per governor level, each one rectifies and downscales in one remap
+    rectify = RectifyMaps(mtxL, distL, mtxR, distR, R, T, (WIDTH, HEIGHT), cv2.CV_16SC2)
+    governor = DepthGovernor(GOVERNOR_LEVELS, DEPTH_BUDGET_MS)
+    level = governor.level
+    map1_L, map2_L, map1_R, map2_R = rectify.get(level["size"])
 
     # Setup Stereo SGBM
     # Tuning these parameters is key for your specific environment
     min_disp = 0
-    num_disp = 16 * 6  # Must be divisible by 16
+    num_disp = level["num_disp"]  # Must be divisible by 16
     stereo = cv2.StereoSGBM_create(
         minDisparity=min_disp,
         numDisparities=num_disp,
@@ -50,36 +70,68 @@ def run_depth_sensing():
         speckleRange=32
     )
 
-    cap_left = cv2.VideoCapture(gstreamer_pipeline(sensor_id=0, width=WIDTH, height=HEIGHT), cv2.CAP_GSTREAMER)
-    cap_right = cv2.VideoCapture(gstreamer_pipeline(sensor_id=1, width=WIDTH, height=HEIGHT), cv2.CAP_GSTREAMER)
+    post = DisparityPostProcessor(stereo, budget_ms=POSTPROCESS_BUDGET_MS)
+
+    if FRAME_BUS:
+        # Rectified pairs from frame_bus.py capture, which owns the cameras
+        cap_left, cap_right = BusCapture.pair(FRAME_BUS)
+    else:
+        cap_left = cv2.VideoCapture(gstreamer_pipeline(sensor_id=0, width=WIDTH, height=HEIGHT), cv2.CAP_GSTREAMER)
+        cap_right = cv2.VideoCapture(gstreamer_pipeline(sensor_id=1, width=WIDTH, height=HEIGHT), cv2.CAP_GSTREAMER)
 
     print("Press 'q' to quit")
 
     while True:
-        retL, frameL = cap_left.read()
-        retR, frameR = cap_right.read()
+        with profiler.stage("capture"):
+            retL, frameL = cap_left.read()
+            retR, frameR = cap_right.read()
 
         if not retL or not retR:
             break
 
         # 1. Rectify images
-        rectified_L = cv2.remap(frameL, map1_L, map2_L, cv2.INTER_LINEAR)
-        rectified_R = cv2.remap(frameR, map1_R, map2_R, cv2.INTER_LINEAR)
+        with profiler.stage("rectify"):
+            if FRAME_BUS:
+                # Already rectified at capture size, only scale down to the governor level
+                size = level["size"]
+                rectified_L = frameL if size == (WIDTH, HEIGHT) else cv2.resize(frameL, size, interpolation=cv2.INTER_AREA)
+                rectified_R = frameR if size == (WIDTH, HEIGHT) else cv2.resize(frameR, size, interpolation=cv2.INTER_AREA)
+            else:
+                rectified_L = cv2.remap(frameL, map1_L, map2_L, cv2.INTER_LINEAR)
+                rectified_R = cv2.remap(frameR, map1_R, map2_R, cv2.INTER_LINEAR)
 
         # 2. Compute Disparity
         # SGBM works on grayscale
-        grayL = cv2.cvtColor(rectified_L, cv2.COLOR_BGR2GRAY)
-        grayR = cv2.cvtColor(rectified_R, cv2.COLOR_BGR2GRAY)
+        with profiler.stage("sgbm"), governor.measure() as measured:
+            grayL = cv2.cvtColor(rectified_L, cv2.COLOR_BGR2GRAY)
+            grayR = cv2.cvtColor(rectified_R, cv2.COLOR_BGR2GRAY)
+
+            disparity = stereo.compute(grayL, grayR).astype(np.float32) / 16.0
 
-        disparity = stereo.compute(grayL, grayR).astype(np.float32) / 16.0
+        # Report disparity at capture resolution regardless of the matcher's level
+        disparity = rescale_disparity(disparity, (WIDTH, HEIGHT), min_valid=min_disp - 1)
 
-        # 3. Normalize for visualization (Scale to 0-255)
-        disp_visual = cv2.normalize(disparity, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-        disp_color = cv2.applyColorMap(disp_visual, cv2.COLORMAP_JET)
+        # 3. Left/right check, filtering and per-pixel confidence
+        with profiler.stage("postprocess"):
+            disparity, confidence = post.process(disparity, grayL, grayR)
+        reliable = confidence >= MIN_CONFIDENCE
 
-        # Show results
-        cv2.imshow("Left Rectified", rectified_L)
-        cv2.imshow("Depth (Disparity)", disp_color)
+        if measured.changed:
+            level = governor.level
+            map1_L, map2_L, map1_R, map2_R = rectify.get(level["size"])
+            stereo.setNumDisparities(level["num_disp"])
+
+        # 4. Normalize for visualization (Scale to 0-255)
+        with profiler.stage("visualize"):
+            disp_visual = cv2.normalize(disparity, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+            disp_color = cv2.applyColorMap(disp_visual, cv2.COLORMAP_JET)
+            # Low-confidence pixels are blacked out
+            disp_color[~reliable] = 0
+
+            # Show results
+            cv2.imshow("Left Rectified", rectified_L)
+            cv2.imshow("Depth (Disparity)", disp_color)
+            cv2.imshow("Confidence", (confidence * 255).astype(np.uint8))
 
         key =cv2.waitKey(1)
         # Hit "q" or "ESC" to close the window
@@ -93,5 +145,8 @@ def run_depth_sensing():
     cap_right.release()
     cv2.destroyAllWindows()
 
+    profiler.report()
+    profiler.export_chrome_trace("trace_stereo.json")
+
 if __name__ == "__main__":
     run_depth_sensing()
\ No newline at end of file
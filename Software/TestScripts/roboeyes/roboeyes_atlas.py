@@ -0,0 +1,390 @@
+'''
+Pre-rendered RoboEyes animation atlas for embedded displays
+
+Renders every mood x blink phase x gaze offset of roboeyes_desktop.RoboEyes
+offline into one compact file, so a microcontroller or small display controller
+can play expressions by lookup instead of rasterizing.
+
+Each frame is cropped to the bounding box of the eye pixels (the rest is
+background), run-length encoded, and identical crops are stored once. Frames
+whose gaze only translates the eyes therefore share the same tile.
+
+Pixel formats:
+- "1bit":    background / eye, runs alternate starting with background (lengths only)
+- "palette": up to 256 colors, runs of (length, index)
+- "rgb565":  runs of (length, RGB565 value), lossy vs BGR888
+
+File layout (little-endian):
+    header   "REYA" u8 version, u8 format, u16 width, u16 height, u16 palette size,
+             u32 tiles, u32 frames, u8 moods, u8 blink phases, u8 gaze columns, u8 gaze rows
+    moods    per mood: u8 length + ascii name
+    palette  palette size x (B, G, R)
+    tiles    per tile:  u32 data offset, u32 data length, u16 w, u16 h
+    frames   per frame: u8 mood, u8 blink, u8 gaze col, u8 gaze row, u32 tile, i16 x, i16 y
+    data     RLE streams, run lengths are LEB128 varints
+Frames are stored in (mood, blink, gaze row, gaze col) order, so frame lookup
+is plain index arithmetic on the device.
+
+python roboeyes_atlas.py --format 1bit --out eyes.atlas --header eyes_atlas.h
+python roboeyes_atlas.py --verify eyes.atlas
+'''
+
+import argparse
+import struct
+
+import cv2
+import numpy as np
+
+from roboeyes_desktop import RoboEyes
+from roboeyes_display import rgb565
+
+# === CONFIGURATION ===
+MOODS = ("default", "happy", "angry", "tired")
+BLINK_PHASES = 8  # blink_val from 0 (open) to 1 (closed)
+GAZE_STEPS = (5, 3)  # Gaze grid columns x rows over the idle range
+# Idle range per screen size, matches RoboEyes.update
+GAZE_RANGE = {(640, 480): (40, 30), (1920, 1080): (250, 200)}
+
+MAGIC = b"REYA"
+VERSION = 1
+FORMATS = ("1bit", "palette", "rgb565")
+HEADER = struct.Struct("<4sBBHHHIIBBBB")
+TILE = struct.Struct("<IIHH")
+FRAME = struct.Struct("<BBBBIhh")
+
+
+def gaze_grid(width, height, steps=GAZE_STEPS):
+    """Gaze x and y offsets of the atlas grid"""
+    gx, gy = GAZE_RANGE[(width, height)]
+    return (np.linspace(-gx, gx, steps[0]).round().astype(int).tolist(),
+            np.linspace(-gy, gy, steps[1]).round().astype(int).tolist())
+
+
+def blink_values(phases=BLINK_PHASES):
+    return np.linspace(0.0, 1.0, phases).tolist()
+
+
+def render(eyes, canvas, mood, blink_val, x, y):
+    """Live RoboEyes frame for one grid cell"""
+    eyes.mood = mood
+    eyes.blink_val = blink_val
+    eyes.x, eyes.y = x, y
+    eyes.draw(canvas)
+    return canvas
+
+
+def quantize(frame, fmt):
+    """What the atlas can represent of a BGR frame (only rgb565 is lossy)"""
+    if fmt != "rgb565":
+        return frame
+    return expand565(rgb565(frame))
+
+
+def expand565(v):
+    """RGB565 -> BGR uint8, low bits replicated like most display controllers"""
+    r = (v >> 11) & 0x1F
+    g = (v >> 5) & 0x3F
+    b = v & 0x1F
+    out = np.empty(v.shape + (3,), dtype=np.uint8)
+    out[..., 0] = (b << 3) | (b >> 2)
+    out[..., 1] = (g << 2) | (g >> 4)
+    out[..., 2] = (r << 3) | (r >> 2)
+    return out
+
+
+def content_bbox(frame, bg_color):
+    """Bounding box (x0, y0, x1, y1) of non-background pixels, None if the frame is empty"""
+    diff = cv2.absdiff(frame, tuple(bg_color) + (0,)).reshape(frame.shape[0], -1)
+    bx, by, bw, bh = cv2.boundingRect(diff)
+    if bw == 0:
+        return None
+    return bx // 3, by, (bx + bw + 2) // 3, by + bh
+
+
+def _pack_color(color):
+    return color[0] | (color[1] << 8) | (color[2] << 16)
+
+
+def _pack_bgr(img):
+    """BGR image -> uint32 0x00RRGGBB per pixel, one comparable value per color"""
+    img = img.astype(np.uint32)
+    return img[..., 0] | (img[..., 1] << 8) | (img[..., 2] << 16)
+
+
+def _varint(n, out):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buf, pos):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def rle_encode(symbols, fmt):
+    """Row-major symbol image -> RLE bytes (runs may wrap across rows)"""
+    flat = symbols.ravel()
+    starts = np.concatenate(([0], np.flatnonzero(flat[1:] != flat[:-1]) + 1))
+    lengths = np.diff(np.append(starts, flat.size))
+    values = flat[starts]
+    out = bytearray()
+    if fmt == "1bit":
+        # Alternating runs starting with background, a zero-length first run if needed
+        if values[0] != 0:
+            out.append(0)
+        for n in lengths.tolist():
+            _varint(n, out)
+    elif fmt == "palette":
+        for n, v in zip(lengths.tolist(), values.tolist()):
+            _varint(n, out)
+            out.append(v)
+    else:
+        for n, v in zip(lengths.tolist(), values.tolist()):
+            _varint(n, out)
+            out += struct.pack("<H", v)
+    return bytes(out)
+
+
+def rle_decode(data, fmt, count):
+    """RLE bytes -> flat symbol array of `count` entries"""
+    lengths, values = [], []
+    pos, bit = 0, 0
+    while pos < len(data):
+        n, pos = _read_varint(data, pos)
+        if fmt == "1bit":
+            v, bit = bit, bit ^ 1
+        elif fmt == "palette":
+            v = data[pos]
+            pos += 1
+        else:
+            v = data[pos] | (data[pos + 1] << 8)
+            pos += 2
+        lengths.append(n)
+        values.append(v)
+    flat = np.repeat(np.array(values, dtype=np.uint16), lengths)
+    if flat.size != count:
+        raise ValueError(f"Corrupt tile: {flat.size} pixels decoded, expected {count}")
+    return flat
+
+
+class AtlasBuilder:
+    def __init__(self, width=640, height=480, fmt="1bit", moods=MOODS,
+                 blink_phases=BLINK_PHASES, gaze_steps=GAZE_STEPS):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown atlas format: {fmt}")
+        self.width = width
+        self.height = height
+        self.fmt = fmt
+        self.moods = moods
+        self.blinks = blink_values(blink_phases)
+        self.gaze_x, self.gaze_y = gaze_grid(width, height, gaze_steps)
+        self.eyes = RoboEyes(width, height)
+
+    def cells(self):
+        for m, mood in enumerate(self.moods):
+            for b, blink_val in enumerate(self.blinks):
+                for r, y in enumerate(self.gaze_y):
+                    for c, x in enumerate(self.gaze_x):
+                        yield (m, b, c, r), mood, blink_val, x, y
+
+    def build(self):
+        canvas = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        bg = tuple(self.eyes.bg_color)
+        # Identical crops (gaze often only translates the eyes) are kept once
+        unique, unique_ids, frames = [], {}, []
+        for key, mood, blink_val, x, y in self.cells():
+            frame = render(self.eyes, canvas, mood, blink_val, x, y)
+            box = content_bbox(frame, bg)
+            x0, y0, x1, y1 = box if box is not None else (0, 0, 0, 0)
+            tile = frame[y0:y1, x0:x1]
+            tkey = (tile.shape, tile.tobytes())
+            tid = unique_ids.get(tkey)
+            if tid is None:
+                tid = unique_ids[tkey] = len(unique)
+                unique.append(_pack_bgr(tile))
+            frames.append(key + (tid, x0, y0))
+
+        # Palette: background is always index 0
+        palette = []
+        if self.fmt != "rgb565":
+            colors = set(np.unique(np.concatenate([t.ravel() for t in unique])).tolist()) if unique else set()
+            colors.discard(_pack_color(bg))
+            palette = [_pack_color(bg)] + sorted(colors)
+            if self.fmt == "1bit" and len(palette) > 2:
+                raise ValueError(f"1bit atlas needs two colors, the frames have {len(palette)}")
+            if len(palette) > 256:
+                raise ValueError(f"palette atlas supports 256 colors, the frames have {len(palette)}")
+
+        tiles, data = [], bytearray()
+        for packed in unique:
+            h, w = packed.shape
+            blob = self._encode(packed, palette) if w and h else b""
+            tiles.append((len(data), len(blob), w, h))
+            data += blob
+        palette = [(c & 0xFF, (c >> 8) & 0xFF, c >> 16) for c in palette]
+        return self._pack(palette, tiles, frames, bytes(data))
+
+    def _encode(self, packed, palette):
+        if self.fmt == "rgb565":
+            bgr = np.stack([packed & 0xFF, (packed >> 8) & 0xFF, packed >> 16], axis=-1).astype(np.uint8)
+            return rle_encode(rgb565(bgr), self.fmt)
+        index = np.searchsorted(np.array(palette[1:], np.uint32), packed) + 1
+        index[packed == palette[0]] = 0
+        return rle_encode(index.astype(np.uint8), self.fmt)
+
+    def _pack(self, palette, tiles, frames, data):
+        out = bytearray(HEADER.pack(MAGIC, VERSION, FORMATS.index(self.fmt), self.width, self.height,
+                                    len(palette), len(tiles), len(frames), len(self.moods),
+                                    len(self.blinks), len(self.gaze_x), len(self.gaze_y)))
+        for mood in self.moods:
+            name = mood.encode("ascii")
+            out.append(len(name))
+            out += name
+        for color in palette:
+            out += bytes(color)
+        for tile in tiles:
+            out += TILE.pack(*tile)
+        for frame in frames:
+            out += FRAME.pack(*frame)
+        return bytes(out + data)
+
+
+class Atlas:
+    """Python decoder, mirrors what the device would do"""
+    def __init__(self, blob):
+        (magic, version, fmt, self.width, self.height, n_palette, n_tiles, n_frames,
+         n_moods, self.blink_phases, self.gaze_cols, self.gaze_rows) = HEADER.unpack_from(blob, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a RoboEyes atlas (or unsupported version)")
+        self.fmt = FORMATS[fmt]
+        pos = HEADER.size
+        self.moods = []
+        for _ in range(n_moods):
+            n = blob[pos]
+            self.moods.append(blob[pos + 1:pos + 1 + n].decode("ascii"))
+            pos += 1 + n
+        self.palette = np.frombuffer(blob, np.uint8, n_palette * 3, pos).reshape(-1, 3)
+        pos += n_palette * 3
+        self.tiles = [TILE.unpack_from(blob, pos + i * TILE.size) for i in range(n_tiles)]
+        pos += n_tiles * TILE.size
+        self.frames = [FRAME.unpack_from(blob, pos + i * FRAME.size) for i in range(n_frames)]
+        pos += n_frames * FRAME.size
+        self.data = blob[pos:]
+        self.header_bytes = pos
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def frame_index(self, mood, blink, col, row):
+        m = self.moods.index(mood) if isinstance(mood, str) else mood
+        return ((m * self.blink_phases + blink) * self.gaze_rows + row) * self.gaze_cols + col
+
+    def decode_tile(self, tid):
+        offset, length, w, h = self.tiles[tid]
+        if w == 0 or h == 0:
+            return np.empty((0, 0, 3), np.uint8)
+        symbols = rle_decode(self.data[offset:offset + length], self.fmt, w * h).reshape(h, w)
+        if self.fmt == "rgb565":
+            return expand565(symbols)
+        return self.palette[symbols]
+
+    def frame(self, mood, blink, col, row):
+        """Full BGR frame for one grid cell"""
+        _, _, _, _, tid, x, y = self.frames[self.frame_index(mood, blink, col, row)]
+        bg = self.palette[0] if len(self.palette) else np.zeros(3, np.uint8)
+        out = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        out[:] = bg
+        tile = self.decode_tile(tid)
+        out[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+        return out
+
+
+def report(atlas, blob):
+    bpp = {"1bit": 1, "palette": 8, "rgb565": 16}[atlas.fmt]
+    raw = len(atlas.frames) * atlas.width * atlas.height * bpp // 8
+    per_mood = {}
+    seen = set()
+    for m, _, _, _, tid, _, _ in atlas.frames:
+        if tid not in seen:
+            seen.add(tid)
+            per_mood[atlas.moods[m]] = per_mood.get(atlas.moods[m], 0) + atlas.tiles[tid][1]
+    print(f"Atlas {atlas.width}x{atlas.height} {atlas.fmt}: {len(atlas.frames)} frames "
+          f"({len(atlas.moods)} moods x {atlas.blink_phases} blink x {atlas.gaze_cols}x{atlas.gaze_rows} gaze), "
+          f"{len(atlas.tiles)} unique tiles")
+    print(f"  size: {len(blob) / 1024:.1f} KiB (index {atlas.header_bytes / 1024:.1f} KiB, "
+          f"data {len(atlas.data) / 1024:.1f} KiB), raw frames {raw / 1024:.0f} KiB, "
+          f"{raw / len(blob):.0f}x smaller")
+    for mood, size in per_mood.items():
+        print(f"  {mood:8s} {size / 1024:7.1f} KiB")
+
+
+def verify(atlas):
+    '''Decode every frame and compare with the live renderer pixel for pixel'''
+    eyes = RoboEyes(atlas.width, atlas.height)
+    canvas = np.zeros((atlas.height, atlas.width, 3), dtype=np.uint8)
+    gaze_x, gaze_y = gaze_grid(atlas.width, atlas.height, (atlas.gaze_cols, atlas.gaze_rows))
+    blinks = blink_values(atlas.blink_phases)
+    bad = 0
+    for m, mood in enumerate(atlas.moods):
+        for b, blink_val in enumerate(blinks):
+            for r, y in enumerate(gaze_y):
+                for c, x in enumerate(gaze_x):
+                    live = quantize(render(eyes, canvas, mood, blink_val, x, y), atlas.fmt)
+                    if not np.array_equal(atlas.frame(m, b, c, r), live):
+                        bad += 1
+                        print(f"  mismatch: {mood} blink {b} gaze ({c}, {r})")
+    print(f"Verified {len(atlas.frames)} frames, {bad} mismatches")
+    return bad == 0
+
+
+def write_c_header(blob, path, name="roboeyes_atlas"):
+    lines = [
+        "// Generated by roboeyes_atlas.py, do not edit",
+        "#pragma once",
+        "#include <stdint.h>",
+        "",
+        f"#define {name.upper()}_SIZE {len(blob)}",
+        f"static const uint8_t {name}[{len(blob)}] = {{",
+    ]
+    for i in range(0, len(blob), 16):
+        lines.append("    " + ", ".join(f"0x{b:02x}" for b in blob[i:i + 16]) + ",")
+    lines.append("};")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export / verify a pre-rendered RoboEyes atlas")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--format", choices=FORMATS, default="1bit")
+    parser.add_argument("--out", default="roboeyes.atlas")
+    parser.add_argument("--header", help="Also write the atlas as a C array header")
+    parser.add_argument("--verify", help="Verify an existing atlas instead of building one")
+    args = parser.parse_args()
+
+    if args.verify:
+        with open(args.verify, "rb") as f:
+            blob = f.read()
+        atlas = Atlas(blob)
+        report(atlas, blob)
+        verify(atlas)
+    else:
+        blob = AtlasBuilder(args.width, args.height, args.format).build()
+        with open(args.out, "wb") as f:
+            f.write(blob)
+        if args.header:
+            write_c_header(blob, args.header)
+        atlas = Atlas(blob)
+        report(atlas, blob)
+        verify(atlas)
@@ -2,6 +2,18 @@ import cv2
 import numpy as np
 import time
 import random
+import os
+import sys
+
+# Shared profiling hooks live with the depth scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "depth_mapping"))
+from profiler import profiler
+
+from roboeyes_display import DamageTracker, make_display
+
+# Display backend: "imshow", "fb" (/dev/fb0) or "spi", see roboeyes_display.py
+# Keys are only read from the imshow window
+DISPLAY = "imshow"
 
 # Blink animation is nice
 # Best and most robust version
@@ -101,6 +113,12 @@ class RoboEyes:
         # Clear background
         frame[:] = self.bg_color
         
+        lx, ly, rx, ry, cur_h = self.eye_layout()
+        self._draw_eye(frame, lx, ly, cur_h, is_left=True)
+        self._draw_eye(frame, rx, ry, cur_h, is_left=False)
+
+    def eye_layout(self):
+        """Top-left corners of both (blinked) eyes and the current eye height"""
         cx, cy = self.width // 2, self.height // 2
         
         # Calculate blink height
@@ -121,48 +139,48 @@ class RoboEyes:
         
         rx = cx + self.eye_spacing + cur_x
         ry = cy - (self.eye_h // 2) + cur_y + y_offset_blink
-        
-        # 1. Draw Base Eyes (White)
+        return lx, ly, rx, ry, cur_h
+
+    def _draw_eye(self, frame, x, y, cur_h, is_left):
+        # 1. Draw Base Eye (White)
         if cur_h > 2:
-            self._draw_eye_shape(frame, lx, ly, self.eye_w, cur_h)
-            self._draw_eye_shape(frame, rx, ry, self.eye_w, cur_h)
+            self._draw_eye_shape(frame, x, y, self.eye_w, cur_h)
         else:
             # Draw a thin line when fully blinked
-            cv2.line(frame, (lx, ly+cur_h//2), (lx+self.eye_w, ly+cur_h//2), self.eye_color, 2)
-            cv2.line(frame, (rx, ry+cur_h//2), (rx+self.eye_w, ry+cur_h//2), self.eye_color, 2)
+            cv2.line(frame, (x, y+cur_h//2), (x+self.eye_w, y+cur_h//2), self.eye_color, 2)
 
-        # 2. Draw Mood Overlays (Black Masks)
-        # We draw black polygons *over* the eyes to shape them.
+        # 2. Draw Mood Overlay (Black Mask)
+        # We draw black polygons *over* the eye to shape it.
         
         if self.mood == 'angry':
             offset = 45 # How steep the angle is
             
-            # --- Left Eye Mask (\ slope) ---
-            # We want to keep the Top-Left, but cut the Top-Right.
-            # Mask Polygon: (Top-Left-ish), (Top-Right-Low), (Top-Right-Up), (Top-Left-Up)
-            
-            # Start the cut at the top-left corner (lx, ly)
-            # End the cut at the right side, lower down (lx + w, ly + offset)
-            pts_left = np.array([
-                [lx - 10, ly - 50],             # Top-Left (Outside)
-                [lx + self.eye_w + 10, ly - 50], # Top-Right (Outside)
-                [lx + self.eye_w + 10, ly + offset], # Cut point (Low Right)
-                [lx, ly]                        # Pivot point (Top Left)
-            ], np.int32)
-            cv2.fillPoly(frame, [pts_left], self.bg_color)
-
-            # --- Right Eye Mask (/ slope) ---
-            # We want to keep the Top-Right, but cut the Top-Left.
-            
-            # Start the cut at the left side, lower down (rx, ry + offset)
-            # End the cut at the top-right corner (rx + w, ry)
-            pts_right = np.array([
-                [rx - 10, ry - 50],             # Top-Left (Outside)
-                [rx + self.eye_w + 10, ry - 50], # Top-Right (Outside)
-                [rx + self.eye_w, ry],          # Pivot point (Top Right)
-                [rx - 10, ry + offset]          # Cut point (Low Left)
-            ], np.int32)
-            cv2.fillPoly(frame, [pts_right], self.bg_color)
+            if is_left:
+                # --- Left Eye Mask (\ slope) ---
+                # We want to keep the Top-Left, but cut the Top-Right.
+                # Mask Polygon: (Top-Left-ish), (Top-Right-Low), (Top-Right-Up), (Top-Left-Up)
+
+                # Start the cut at the top-left corner (x, y)
+                # End the cut at the right side, lower down (x + w, y + offset)
+                pts = np.array([
+                    [x - 10, y - 50],             # Top-Left (Outside)
+                    [x + self.eye_w + 10, y - 50], # Top-Right (Outside)
+                    [x + self.eye_w + 10, y + offset], # Cut point (Low Right)
+                    [x, y]                        # Pivot point (Top Left)
+                ], np.int32)
+            else:
+                # --- Right Eye Mask (/ slope) ---
+                # We want to keep the Top-Right, but cut the Top-Left.
+
+                # Start the cut at the left side, lower down (x, y + offset)
+                # End the cut at the top-right corner (x + w, y)
+                pts = np.array([
+                    [x - 10, y - 50],             # Top-Left (Outside)
+                    [x + self.eye_w + 10, y - 50], # Top-Right (Outside)
+                    [x + self.eye_w, y],          # Pivot point (Top Right)
+                    [x - 10, y + offset]          # Cut point (Low Left)
+                ], np.int32)
+            cv2.fillPoly(frame, [pts], self.bg_color)
             
         elif self.mood == 'happy':
             # Happy eyes usually look like inverted crescents (cheek pushing up)
@@ -170,19 +188,13 @@ class RoboEyes:
             circle_r = self.eye_w 
             offset_up = 20 # Push the cheek up
             
-            # Left Eye Mask
-            center_l = (lx + self.eye_w // 2, ly + cur_h + int(circle_r/2) - offset_up)
-            cv2.circle(frame, center_l, circle_r, self.bg_color, -1)
-            
-            # Right Eye Mask
-            center_r = (rx + self.eye_w // 2, ry + cur_h + int(circle_r/2) - offset_up)
-            cv2.circle(frame, center_r, circle_r, self.bg_color, -1)
+            center = (x + self.eye_w // 2, y + cur_h + int(circle_r/2) - offset_up)
+            cv2.circle(frame, center, circle_r, self.bg_color, -1)
             
         elif self.mood == 'tired':
             # Eyelids drooping (cut top half straight)
             droop = int(cur_h * 0.4)
-            cv2.rectangle(frame, (lx, ly-10), (lx+self.eye_w, ly+droop), self.bg_color, -1)
-            cv2.rectangle(frame, (rx, ry-10), (rx+self.eye_w, ry+droop), self.bg_color, -1)
+            cv2.rectangle(frame, (x, y-10), (x+self.eye_w, y+droop), self.bg_color, -1)
 
     def _draw_eye_shape(self, img, x, y, w, h):
         color = self.eye_color
@@ -223,14 +235,23 @@ def main():
     eyes = RoboEyes(WIDTH, HEIGHT)
     
     canvas = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    # Only changed regions are pushed, unchanged frames are skipped
+    damage = DamageTracker(WIDTH, HEIGHT)
+    display = make_display(DISPLAY, WIDTH, HEIGHT, win_name=WIN_NAME)
     
     print("Keys: [q]uit, [h]appy, [a]ngry, [t]ired, [d]efault")
     
     while True:
-        eyes.update()
-        eyes.draw(canvas)
+        with profiler.stage("eyes_update"):
+            eyes.update()
+        with profiler.stage("eyes_draw"):
+            eyes.draw(canvas)
         
-        cv2.imshow(WIN_NAME, canvas)
+        with profiler.stage("eyes_damage"):
+            rects = damage.update(canvas)
+        if rects:
+            with profiler.stage("eyes_show"):
+                display.write(canvas, rects)
         
         key = cv2.waitKey(16) & 0xFF
         if key == ord('q'): break
@@ -240,7 +261,11 @@ def main():
         elif key == ord('s'): eyes.toggle_animation()
         elif key == ord('d'): eyes.set_mood('default')
 
+    display.close()
     cv2.destroyAllWindows()
+    print(damage.report())
+    profiler.report()
+    profiler.export_chrome_trace("trace_roboeyes.json")
 
 if __name__ == "__main__":
     main()
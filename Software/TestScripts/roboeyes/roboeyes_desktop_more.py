@@ -2,6 +2,18 @@ import cv2
 import numpy as np
 import time
 import random
+import os
+import sys
+
+# Shared profiling hooks live with the depth scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "depth_mapping"))
+from profiler import profiler
+
+from roboeyes_display import DamageTracker, make_display
+
+# Display backend: "imshow", "fb" (/dev/fb0) or "spi", see roboeyes_display.py
+# Keys are only read from the imshow window
+DISPLAY = "imshow"
 
 # blink animation seems slower
 # Some states (curious) are glitchy
@@ -132,13 +144,22 @@ def main():
     WIDTH, HEIGHT = 640, 480
     eyes = RoboEyes(WIDTH, HEIGHT)
     canvas = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    # Only changed regions are pushed, unchanged frames are skipped
+    damage = DamageTracker(WIDTH, HEIGHT)
+    display = make_display(DISPLAY, WIDTH, HEIGHT, win_name="RoboEyes Port")
     
     print("Commands: [a]ngry, [h]appy, [s]cary, [c]urious, [d]efault, [w]ink, [y]cyclops")
 
     while True:
-        eyes.update()
-        eyes.draw(canvas)
-        cv2.imshow("RoboEyes Port", canvas)
+        with profiler.stage("eyes_update"):
+            eyes.update()
+        with profiler.stage("eyes_draw"):
+            eyes.draw(canvas)
+        with profiler.stage("eyes_damage"):
+            rects = damage.update(canvas)
+        if rects:
+            with profiler.stage("eyes_show"):
+                display.write(canvas, rects)
         
         key = cv2.waitKey(30) & 0xFF
         if key == ord('q'): break
@@ -150,7 +171,11 @@ def main():
         elif key == ord('w'): eyes.wink(True)
         elif key == ord('y'): eyes.cyclops = not eyes.cyclops
 
+    display.close()
     cv2.destroyAllWindows()
+    print(damage.report())
+    profiler.report()
+    profiler.export_chrome_trace("trace_roboeyes_more.json")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
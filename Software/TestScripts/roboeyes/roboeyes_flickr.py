@@ -2,6 +2,18 @@ import cv2
 import numpy as np
 import time
 import random
+import os
+import sys
+
+# Shared profiling hooks live with the depth scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "depth_mapping"))
+from profiler import profiler
+
+from roboeyes_display import DamageTracker, make_display
+
+# Display backend: "imshow", "fb" (/dev/fb0) or "spi", see roboeyes_display.py
+# Keys are only read from the imshow window
+DISPLAY = "imshow"
 
 # eyes are wider, 
 # option for shaking eyes horizontally/vertically - only want this functionality
@@ -148,6 +160,9 @@ def main():
     WIDTH, HEIGHT = 800, 600
     eyes = RoboEyes(WIDTH, HEIGHT)
     canvas = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    # Only changed regions are pushed, unchanged frames are skipped
+    damage = DamageTracker(WIDTH, HEIGHT)
+    display = make_display(DISPLAY, WIDTH, HEIGHT, win_name="RoboEyes Full Port")
     
     print("--- Controls ---")
     print("Moods: [a]ngry, [h]appy, [s]cary, [c]urious, [t]ired, [f]rozen, [d]efault")
@@ -155,9 +170,15 @@ def main():
     print("Toggles: [1] H-Flicker, [2] V-Flicker, [y] Cyclops")
 
     while True:
-        eyes.update()
-        eyes.draw(canvas)
-        cv2.imshow("RoboEyes Full Port", canvas)
+        with profiler.stage("eyes_update"):
+            eyes.update()
+        with profiler.stage("eyes_draw"):
+            eyes.draw(canvas)
+        with profiler.stage("eyes_damage"):
+            rects = damage.update(canvas)
+        if rects:
+            with profiler.stage("eyes_show"):
+                display.write(canvas, rects)
         
         key = cv2.waitKey(20) & 0xFF
         if key == ord('q'): break
@@ -175,7 +196,11 @@ def main():
         elif key == ord('1'): eyes.hflicker = not eyes.hflicker
         elif key == ord('2'): eyes.vflicker = not eyes.vflicker
 
+    display.close()
     cv2.destroyAllWindows()
+    print(damage.report())
+    profiler.report()
+    profiler.export_chrome_trace("trace_roboeyes_flickr.json")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
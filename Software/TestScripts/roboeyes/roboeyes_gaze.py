@@ -0,0 +1,378 @@
+'''
+Gaze-tracking RoboEyes driven by the stereo disparity
+
+Instead of random idle saccades the eyes look at the nearest obstacle (largest
+disparity) or at the region that moved the most between disparity frames.
+
+- GazeTracker: cheap reduction of one disparity frame to a gaze target.
+  The disparity is area-downsampled to a GRID_W x GRID_H grid (invalid pixels
+  count as 0, so sparse speckles lose against solid surfaces), blurred 3x3 and
+  reduced with an argmax. Well under 1 ms per 640x360 frame.
+- GazeSource: runs the tracker in a background thread on whatever produces
+  disparity (camera + SGBM, or a replay) and publishes the latest target.
+  latest() is a plain attribute read, the renderer never waits for depth.
+- GazeRoboEyes: RoboEyes whose idle targets come from the GazeSource while it is
+  fresh, falling back to the random saccades when depth stops.
+
+python roboeyes_gaze.py --camera            live, SGBM from the stereo cameras
+python roboeyes_gaze.py --replay recording  .npy frames in a folder (or a stacked .npy)
+python roboeyes_gaze.py --check             replay latency/budget check, headless
+'''
+
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Shared profiling hooks live with the depth scripts
+DEPTH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "depth_mapping")
+sys.path.append(DEPTH_DIR)
+from profiler import profiler
+
+from roboeyes_desktop import RoboEyes
+from roboeyes_display import DamageTracker, make_display
+
+# === CONFIGURATION ===
+GRID_W, GRID_H = 32, 18  # Reduction grid, 16:9 like the cameras
+MODE = "nearest"  # "nearest", "motion" or "both" (motion wins when strong enough)
+MIN_DISPARITY = 8.0  # Ignore obstacles further away than this (pixels at capture size)
+MOTION_THRESHOLD = 2.0  # Mean disparity change of a grid cell to count as motion
+GAZE_TIMEOUT = 0.5  # Seconds without a fresh target before falling back to idle saccades
+REDUCE_BUDGET_MS = 1.0
+# The monitor faces the cameras' scene, so the robot's right is the viewer's left
+MIRROR = True
+DISPLAY = "imshow"
+
+
+class GazeTracker:
+    def __init__(self, mode=MODE, grid=(GRID_W, GRID_H), min_disparity=MIN_DISPARITY,
+                 motion_threshold=MOTION_THRESHOLD, ignore_left=0):
+        self.mode = mode
+        self.grid = grid
+        self.min_disparity = min_disparity
+        self.motion_threshold = motion_threshold
+        # Left band without stereo matches (minDisparity + numDisparities of the matcher)
+        self.ignore_left = ignore_left
+        self._prev = None
+
+    def update(self, disparity):
+        '''
+        disparity: float32 (or SGBM int16 * 16) disparity image
+        Returns (nx, ny, strength) with nx, ny in -1..1 (image right / down positive) or None
+        '''
+        if disparity.dtype == np.int16:
+            disparity = disparity.astype(np.float32) / 16.0
+        disp = disparity[:, self.ignore_left:] if self.ignore_left else disparity
+        small = cv2.resize(np.maximum(disp, 0.0), self.grid, interpolation=cv2.INTER_AREA)
+        small = cv2.blur(small, (3, 3))
+
+        target = None
+        if self.mode in ("motion", "both") and self._prev is not None:
+            motion = cv2.absdiff(small, self._prev)
+            target = self._peak(motion, self.motion_threshold, disp.shape[1], disparity.shape[1])
+        self._prev = small
+        if target is None and self.mode in ("nearest", "both"):
+            target = self._peak(small, self.min_disparity, disp.shape[1], disparity.shape[1])
+        return target
+
+    def _peak(self, grid, threshold, band_w, full_w):
+        _, peak, _, (gx, gy) = cv2.minMaxLoc(grid)
+        if peak < threshold:
+            return None
+        gw, gh = self.grid
+        # Cell centre back to full-image coordinates (the ignored band shifts x)
+        x = self.ignore_left + (gx + 0.5) * band_w / gw
+        nx = 2.0 * x / full_w - 1.0
+        ny = 2.0 * (gy + 0.5) / gh - 1.0
+        return nx, ny, peak
+
+
+class GazeSource:
+    '''
+    Background thread: read() -> disparity (or None when finished), reduced by a
+    GazeTracker. The newest target is published as one tuple
+    (nx, ny, strength, produced_at, frame_time) so readers never see a torn update.
+    '''
+    def __init__(self, read, tracker=None):
+        self.read = read
+        self.tracker = tracker or GazeTracker()
+        self.target = None
+        self.reduce_ms = []  # Per-frame reduction time
+        self.frames = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+
+    def latest(self):
+        """Newest target or None, never blocks"""
+        return self.target
+
+    def _run(self):
+        while not self._stop.is_set():
+            item = self.read()
+            if item is None:
+                break
+            disparity, frame_time = item
+            start = time.perf_counter()
+            target = self.tracker.update(disparity)
+            now = time.perf_counter()
+            self.reduce_ms.append((now - start) * 1000.0)
+            self.frames += 1
+            if target is not None:
+                self.target = target + (now, frame_time)
+
+
+class GazeRoboEyes(RoboEyes):
+    def __init__(self, width, height, source, bg_color=(0, 0, 0), eye_color=(255, 190, 0),
+                 timeout=GAZE_TIMEOUT):
+        super().__init__(width, height, bg_color, eye_color)
+        self.source = source
+        self.timeout = timeout
+        # Same range as the random saccades in RoboEyes.update
+        self.gaze_range = (250, 200) if width == 1920 else (40, 30)
+        self.tracking = False
+        self.applied = None  # The target tuple last turned into target_x/target_y
+
+    def update(self):
+        target = self.source.latest()
+        self.tracking = target is not None and time.perf_counter() - target[3] < self.timeout
+        # Random saccades only while depth is stale
+        self.auto_idle = not self.tracking
+        if self.tracking:
+            nx, ny = target[0], target[1]
+            if MIRROR:
+                nx = -nx
+            self.target_x = nx * self.gaze_range[0]
+            self.target_y = ny * self.gaze_range[1]
+            self.applied = target
+        super().update()
+
+
+def replay_reader(frames, fps, loop=False):
+    """read() for GazeSource that plays disparity frames at a fixed rate"""
+    state = {"i": 0, "next": time.perf_counter()}
+
+    def read():
+        i = state["i"]
+        if i >= len(frames):
+            if not loop:
+                return None
+            i = 0
+        delay = state["next"] - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        state["next"] += 1.0 / fps
+        state["i"] = i + 1
+        return frames[i], time.perf_counter()
+    return read
+
+
+def load_recording(path):
+    """Disparity frames from a folder of .npy files or one stacked (N, H, W) .npy"""
+    if os.path.isdir(path):
+        return [np.load(p) for p in sorted(glob.glob(os.path.join(path, "*.npy")))]
+    stack = np.load(path)
+    return list(stack) if stack.ndim == 3 else [stack]
+
+
+def synthetic_recording(n=300, num_disp=96):
+    '''
+    Disparity of the depth_mapping sample pair with a near obstacle (disk of high
+    disparity) sweeping across, so the expected gaze is known for every frame.
+    Returns (frames, obstacle centres in pixels)
+    '''
+    left = cv2.imread(os.path.join(DEPTH_DIR, "left.jpeg"), cv2.IMREAD_GRAYSCALE)
+    right = cv2.imread(os.path.join(DEPTH_DIR, "right.jpeg"), cv2.IMREAD_GRAYSCALE)
+    sgbm = cv2.StereoSGBM_create(minDisparity=0, numDisparities=num_disp, blockSize=5,
+                                 P1=8 * 3 * 5**2, P2=32 * 3 * 5**2, disp12MaxDiff=1,
+                                 uniquenessRatio=10, speckleWindowSize=100, speckleRange=32)
+    base = np.clip(sgbm.compute(left, right).astype(np.float32) / 16.0, 0, None)
+    # Keep the scene further away than the obstacle
+    base = np.minimum(base, num_disp * 0.4)
+    h, w = base.shape
+    frames, centres = [], []
+    for i in range(n):
+        t = i / n
+        cx = int(num_disp + (w - num_disp - 60) * (0.5 + 0.5 * np.sin(2 * np.pi * t)))
+        cy = int(h * (0.5 + 0.3 * np.cos(2 * np.pi * t)))
+        frame = base.copy()
+        cv2.circle(frame, (cx, cy), 40, float(num_disp * 0.8), -1)
+        frames.append(frame)
+        centres.append((cx, cy))
+    return frames, centres
+
+
+def check(path=None, fps=30, width=640, height=480):
+    '''
+    Replay disparity through GazeSource while the eye loop runs headless:
+    - reduction time per disparity frame must stay under REDUCE_BUDGET_MS
+    - eye update() must not be slowed by depth (compared with plain RoboEyes)
+    - latency from a disparity frame being available to the eyes using it
+    '''
+    if path:
+        frames, centres = load_recording(path), None
+    else:
+        frames, centres = synthetic_recording()
+    h, w = frames[0].shape[:2]
+    tracker = GazeTracker(ignore_left=96 if path is None else 0)
+
+    # 1. Reduction cost and accuracy on its own
+    times = []
+    errors = []
+    for i, disp in enumerate(frames):
+        start = time.perf_counter()
+        target = tracker.update(disp)
+        times.append((time.perf_counter() - start) * 1000.0)
+        if centres is not None and target is not None:
+            px = (target[0] + 1.0) * 0.5 * w
+            py = (target[1] + 1.0) * 0.5 * h
+            errors.append(np.hypot(px - centres[i][0], py - centres[i][1]))
+    times = np.array(times)
+    print(f"Reduction on {w}x{h}: mean {times.mean():.3f} ms, p99 {np.percentile(times, 99):.3f} ms, "
+          f"max {times.max():.3f} ms (budget {REDUCE_BUDGET_MS} ms)")
+    if errors:
+        print(f"Gaze vs obstacle centre: median {np.median(errors):.1f} px, max {np.max(errors):.1f} px "
+              f"(grid cell {w / GRID_W:.0f}x{h / GRID_H:.0f} px)")
+
+    # 2. Asynchronous replay with the eye loop at ~60 FPS
+    source = GazeSource(replay_reader(frames, fps), GazeTracker(ignore_left=tracker.ignore_left)).start()
+    eyes = GazeRoboEyes(width, height, source)
+    plain = RoboEyes(width, height)
+    canvas = np.zeros((height, width, 3), np.uint8)
+    update_ms, plain_ms, latency_ms = [], [], []
+    last = None
+    while source._thread.is_alive():
+        start = time.perf_counter()
+        eyes.update()
+        update_ms.append((time.perf_counter() - start) * 1000.0)
+        start = time.perf_counter()
+        plain.update()
+        plain_ms.append((time.perf_counter() - start) * 1000.0)
+        if eyes.applied is not None and eyes.applied is not last:
+            last = eyes.applied
+            latency_ms.append((time.perf_counter() - last[4]) * 1000.0)
+        eyes.draw(canvas)
+        time.sleep(1.0 / 60)
+    source.stop()
+
+    reduce_ms = np.array(source.reduce_ms)
+    print(f"Replayed {source.frames} frames at {fps} FPS, eyes tracked {len(latency_ms)} new targets")
+    print(f"  eye update(): {np.mean(update_ms):.4f} ms with gaze, {np.mean(plain_ms):.4f} ms without")
+    print(f"  frame -> eyes latency: median {np.median(latency_ms):.1f} ms, max {np.max(latency_ms):.1f} ms "
+          f"(eye loop at ~60 FPS)")
+    ok = np.percentile(reduce_ms, 99) < REDUCE_BUDGET_MS
+    print(f"  reduction in thread: p99 {np.percentile(reduce_ms, 99):.3f} ms -> {'OK' if ok else 'OVER BUDGET'}")
+    return ok
+
+
+def camera_reader():
+    """read() for GazeSource: rectified stereo cameras + SGBM, same settings as stereo.py"""
+    from stereo import gstreamer_pipeline, WIDTH, HEIGHT, CALIB_FILE
+    from governor import RectifyMaps
+
+    data = np.load(os.path.join(DEPTH_DIR, CALIB_FILE))
+    rectify = RectifyMaps(data['mtxL'], data['distL'], data['mtxR'], data['distR'], data['R'], data['T'],
+                          (WIDTH, HEIGHT), cv2.CV_16SC2)
+    map1_L, map2_L, map1_R, map2_R = rectify.get((WIDTH, HEIGHT))
+    sgbm = cv2.StereoSGBM_create(minDisparity=0, numDisparities=16 * 6, blockSize=5,
+                                 P1=8 * 3 * 5**2, P2=32 * 3 * 5**2, disp12MaxDiff=1,
+                                 uniquenessRatio=10, speckleWindowSize=100, speckleRange=32)
+    cap_left = cv2.VideoCapture(gstreamer_pipeline(sensor_id=0, width=WIDTH, height=HEIGHT), cv2.CAP_GSTREAMER)
+    cap_right = cv2.VideoCapture(gstreamer_pipeline(sensor_id=1, width=WIDTH, height=HEIGHT), cv2.CAP_GSTREAMER)
+
+    def read():
+        retL, frameL = cap_left.read()
+        retR, frameR = cap_right.read()
+        if not retL or not retR:
+            cap_left.release()
+            cap_right.release()
+            return None
+        stamp = time.perf_counter()
+        grayL = cv2.cvtColor(cv2.remap(frameL, map1_L, map2_L, cv2.INTER_LINEAR), cv2.COLOR_BGR2GRAY)
+        grayR = cv2.cvtColor(cv2.remap(frameR, map1_R, map2_R, cv2.INTER_LINEAR), cv2.COLOR_BGR2GRAY)
+        return sgbm.compute(grayL, grayR), stamp
+    return read
+
+
+# --- Main Application Loop ---
+def main(read, ignore_left):
+    WIN_NAME = "RoboEyes Gaze"
+    # WIDTH, HEIGHT = 640, 480
+    WIDTH, HEIGHT = 1920, 1080
+
+    cv2.namedWindow(WIN_NAME, cv2.WINDOW_NORMAL)
+    if WIDTH==640 and HEIGHT==480:
+        cv2.resizeWindow(WIN_NAME, WIDTH, HEIGHT)
+    elif WIDTH==1920 and HEIGHT==1080:
+        cv2.setWindowProperty(WIN_NAME, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+
+    source = GazeSource(read, GazeTracker(ignore_left=ignore_left)).start()
+    eyes = GazeRoboEyes(WIDTH, HEIGHT, source)
+    canvas = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    damage = DamageTracker(WIDTH, HEIGHT)
+    display = make_display(DISPLAY, WIDTH, HEIGHT, win_name=WIN_NAME)
+
+    print("Keys: [q]uit, [h]appy, [a]ngry, [t]ired, [d]efault, [m]ode nearest/motion/both")
+
+    while True:
+        with profiler.stage("eyes_update"):
+            eyes.update()
+        with profiler.stage("eyes_draw"):
+            eyes.draw(canvas)
+        with profiler.stage("eyes_damage"):
+            rects = damage.update(canvas)
+        if rects:
+            with profiler.stage("eyes_show"):
+                display.write(canvas, rects)
+
+        key = cv2.waitKey(16) & 0xFF
+        if key == ord('q'): break
+        elif key == ord('h'): eyes.set_mood('happy')
+        elif key == ord('a'): eyes.set_mood('angry')
+        elif key == ord('t'): eyes.set_mood('tired')
+        elif key == ord('d'): eyes.set_mood('default')
+        elif key == ord('m'):
+            modes = ("nearest", "motion", "both")
+            source.tracker.mode = modes[(modes.index(source.tracker.mode) + 1) % len(modes)]
+            print(f"Gaze mode: {source.tracker.mode}")
+
+    source.stop()
+    display.close()
+    cv2.destroyAllWindows()
+    if source.reduce_ms:
+        print(f"Gaze reduction: {np.mean(source.reduce_ms):.3f} ms mean over {source.frames} frames")
+    profiler.report()
+    profiler.export_chrome_trace("trace_roboeyes_gaze.json")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RoboEyes looking at the nearest obstacle / motion")
+    parser.add_argument("--camera", action="store_true", help="Live disparity from the stereo cameras")
+    parser.add_argument("--replay", help="Folder of disparity .npy frames or one stacked .npy")
+    parser.add_argument("--fps", type=float, default=30, help="Replay rate")
+    parser.add_argument("--check", action="store_true", help="Headless replay latency check")
+    args = parser.parse_args()
+
+    if args.check:
+        ok = check(args.replay, args.fps)
+        sys.exit(0 if ok else 1)
+    elif args.camera:
+        main(camera_reader(), ignore_left=96)
+    else:
+        if args.replay:
+            frames = load_recording(args.replay)
+        else:
+            frames, _ = synthetic_recording()
+        main(replay_reader(frames, args.fps, loop=True), ignore_left=0 if args.replay else 96)
@@ -0,0 +1,267 @@
+'''
+Signed-distance-field eye rasterizer for RoboEyes
+
+RoboEyes._draw_eye builds each eye from four cv2.circle calls and two
+rectangles, then draws the mood mask (polygon, circle or rectangle) on top.
+Here the eye shape and its mood mask are one signed distance function
+evaluated together in NumPy over the eye's bounding box only:
+
+    d_eye  = rounded box
+    d_mask = mood shape (angry: brow half-plane, happy: cheek circle, tired: eyelid half-plane)
+    d      = max(d_eye, -d_mask)       (mask subtracted from the eye)
+
+Coverage is then either a hard edge (d <= 0), analytic antialiasing
+(clip(0.5 - d, 0, 1), exact for straight edges at one-pixel footprint) or
+4x4 supersampling as the reference.
+
+The shape only depends on the mood, the (blinked) eye height and the side,
+not on where the eye is, so each shape is rendered once into a BGR patch of
+its bounding box and kept in a small LRU cache (CACHE_SHAPES). Drawing an
+eye is then one copy of its patch into the frame, clipped at the borders.
+
+A patch is rendered by evaluating the distance at BLOCK x BLOCK block centres
+first. Blocks far enough inside are filled as solid runs, blocks far outside
+are skipped, and only blocks on the edge are evaluated per pixel.
+
+Numbers on a desktop CPU at 1920x1080, both eyes: ~0.15-0.2 ms from the cache
+(antialiased or not) vs ~0.3-0.5 ms for the cv2 primitives without AA. A shape
+that is not cached yet (blink frames) costs ~1.3-2.3 ms per eye to render with
+analytic AA.
+
+python roboeyes_sdf.py                 benchmark vs the cv2 draw path at 640x480 and 1920x1080
+python roboeyes_sdf.py --show          side by side window
+'''
+
+import argparse
+import collections
+import time
+
+import cv2
+import numpy as np
+
+from roboeyes_desktop import RoboEyes
+
+# === CONFIGURATION ===
+ANTIALIAS = "analytic"  # None, "analytic" or "ssaa"
+SSAA_FACTOR = 4  # Samples per axis for "ssaa"
+BLOCK = 8  # Block size for culling, only blocks on the edge are evaluated per pixel
+CACHE_SHAPES = 32  # Rendered eye patches kept, one per mood / eye height / side
+
+
+def sd_round_box(px, py, cx, cy, hw, hh, r):
+    """Distance to a rounded box centred at (cx, cy) with half sizes hw, hh and corner radius r"""
+    qx = np.abs(px - cx) - (hw - r)
+    qy = np.abs(py - cy) - (hh - r)
+    outside = np.sqrt(np.maximum(qx, 0.0) ** 2 + np.maximum(qy, 0.0) ** 2)
+    inside = np.minimum(np.maximum(qx, qy), 0.0)
+    return outside + inside - r
+
+
+def sd_half_plane(px, py, x0, y0, x1, y1):
+    """Signed distance to the line (x0, y0) -> (x1, y1), negative on its left side (above for left-to-right lines)"""
+    dx, dy = x1 - x0, y1 - y0
+    n = np.hypot(dx, dy)
+    # Normal (-dy, dx) / n points to the right side of the direction of travel
+    return ((px - x0) * -dy + (py - y0) * dx) / n
+
+
+class SdfRoboEyes(RoboEyes):
+    def __init__(self, width, height, bg_color=(0, 0, 0), eye_color=(255, 190, 0), antialias=ANTIALIAS):
+        super().__init__(width, height, bg_color, eye_color)
+        self.antialias = antialias
+        self._bg = np.array(bg_color, np.float32)
+        self._fg = np.array(eye_color, np.float32)
+        self._patches = collections.OrderedDict()  # Shape key -> BGR patch, least recently used first
+
+    def draw(self, frame):
+        # cv2 fill instead of frame[:] = color, numpy broadcasting a 3-tuple is ~40x slower at 1080p
+        cv2.rectangle(frame, (0, 0), (self.width, self.height), self.bg_color, -1)
+        lx, ly, rx, ry, cur_h = self.eye_layout()
+        self._draw_eye(frame, lx, ly, cur_h, is_left=True)
+        self._draw_eye(frame, rx, ry, cur_h, is_left=False)
+
+    def distance(self, px, py, x, y, cur_h, is_left):
+        '''
+        Signed distance of pixel centres (px, py) to the masked eye, negative inside.
+        The eye occupies pixels x..x+w and y..y+h inclusive like the cv2 version,
+        so the edges sit half a pixel outside those centres.
+        '''
+        w = self.eye_w
+        r = min(self.eye_r, w // 2, cur_h // 2)
+        d = sd_round_box(px, py, x + w / 2.0, y + cur_h / 2.0, (w + 1) / 2.0, (cur_h + 1) / 2.0, r)
+
+        if self.mood == 'angry':
+            offset = 45
+            if is_left:
+                # Brow from the top-left corner down to the right
+                mask = sd_half_plane(px, py, x - 0.5, y - 0.5, x + w + 10.5, y + offset - 0.5)
+            else:
+                mask = sd_half_plane(px, py, x - 10.5, y + offset - 0.5, x + w + 0.5, y - 0.5)
+            d = np.maximum(d, -mask)
+        elif self.mood == 'happy':
+            circle_r = self.eye_w
+            cx = x + self.eye_w // 2
+            cy = y + cur_h + int(circle_r / 2) - 20
+            mask = np.sqrt((px - cx) ** 2 + (py - cy) ** 2) - (circle_r + 0.5)
+            d = np.maximum(d, -mask)
+        elif self.mood == 'tired':
+            droop = int(cur_h * 0.4)
+            mask = py - (y + droop + 0.5)
+            d = np.maximum(d, -mask)
+        return d
+
+    def _draw_eye(self, frame, x, y, cur_h, is_left):
+        if cur_h <= 2:
+            # Blink line, nothing to gain from a distance field here
+            cv2.line(frame, (x, y + cur_h // 2), (x + self.eye_w, y + cur_h // 2), self.eye_color, 2)
+            return
+
+        patch = self._patch(cur_h, is_left)
+        # The patch starts one pixel above and left of the eye, clip it to the frame
+        px0, py0 = x - 1, y - 1
+        x0, y0 = max(px0, 0), max(py0, 0)
+        x1, y1 = min(px0 + patch.shape[1], self.width), min(py0 + patch.shape[0], self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        frame[y0:y1, x0:x1] = patch[y0 - py0:y1 - py0, x0 - px0:x1 - px0]
+
+    def _patch(self, cur_h, is_left):
+        """Eye over the background in its bounding box plus a one pixel margin, cached per shape"""
+        key = (self.mood, cur_h, is_left, self.antialias, self.eye_w, self.eye_r)
+        patch = self._patches.get(key)
+        if patch is not None:
+            self._patches.move_to_end(key)
+            return patch
+        patch = self._render(cur_h, is_left)
+        self._patches[key] = patch
+        if len(self._patches) > CACHE_SHAPES:
+            self._patches.popitem(last=False)
+        return patch
+
+    def _render(self, cur_h, is_left):
+        # Eye at (1, 1) in patch coordinates, the margin holds the antialiased edge
+        x, y = 1, 1
+        x1, y1 = self.eye_w + 3, cur_h + 3
+        patch = np.empty((y1, x1, 3), np.uint8)
+        cv2.rectangle(patch, (0, 0), (x1, y1), self.bg_color, -1)
+
+        # 1. Distance at block centres. The distance is 1-Lipschitz, so a block whose centre is
+        #    further than its radius (+1px for the AA footprint) from the edge is uniform
+        B = BLOCK
+        ext = (B - 1) / 2.0
+        radius = ext * 1.4143 + 1.0
+        bcx = np.arange(0, x1, B, dtype=np.float32)[None, :] + ext
+        bcy = np.arange(0, y1, B, dtype=np.float32)[:, None] + ext
+        d_block = self.distance(bcx, bcy, x, y, cur_h, is_left)
+        inside = d_block < -radius
+        edge = np.abs(d_block) <= radius
+
+        # 2. Solid blocks: one rectangle per horizontal run of inside blocks
+        for i in np.flatnonzero(inside.any(axis=1)):
+            row = np.concatenate(([False], inside[i], [False]))
+            changes = np.flatnonzero(row[1:] != row[:-1])
+            by = i * B
+            for a, b in zip(changes[::2], changes[1::2]):
+                cv2.rectangle(patch, (a * B, by), (min(b * B, x1) - 1, min(by + B, y1) - 1),
+                              self.eye_color, -1)
+
+        # 3. Edge blocks at pixel resolution
+        bi, bj = np.nonzero(edge)
+        if bi.size == 0:
+            return patch
+        offs = np.arange(B, dtype=np.float32)
+        px = (bj * B).astype(np.float32)[:, None, None] + offs[None, None, :]
+        py = (bi * B).astype(np.float32)[:, None, None] + offs[None, :, None]
+        if self.antialias == "ssaa":
+            n = SSAA_FACTOR
+            alpha = np.zeros((bi.size, B, B), np.float32)
+            for oy in (np.arange(n) + 0.5) / n - 0.5:
+                for ox in (np.arange(n) + 0.5) / n - 0.5:
+                    alpha += self.distance(px + ox, py + oy, x, y, cur_h, is_left) <= 0.0
+            alpha /= n * n
+        else:
+            d = self.distance(px, py, x, y, cur_h, is_left)
+            if self.antialias == "analytic":
+                alpha = np.clip(0.5 - d, 0.0, 1.0)
+            else:
+                alpha = (d <= 0.0).astype(np.float32)
+
+        xs = np.broadcast_to(px, alpha.shape).astype(np.intp)
+        ys = np.broadcast_to(py, alpha.shape).astype(np.intp)
+        keep = (xs < x1) & (ys < y1)
+        # Masked areas are background anyway, so a plain lerp against bg is exact
+        colors = self._bg + alpha[keep][:, None] * (self._fg - self._bg)
+        patch[ys[keep], xs[keep]] = (colors + 0.5).astype(np.uint8)
+        return patch
+
+
+def _time_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000.0 / repeat
+
+
+def benchmark(repeat=30):
+    moods = ('default', 'happy', 'angry', 'tired')
+    for w, h in ((640, 480), (1920, 1080)):
+        ref = RoboEyes(w, h)
+        canvas_ref = np.zeros((h, w, 3), np.uint8)
+        canvas = np.zeros((h, w, 3), np.uint8)
+        print(f"--- {w}x{h}, ms per frame (eyes only = both _draw_eye calls, no clear; "
+              f"render = both patches when not cached) ---")
+        print(f"{'mood':8s} {'cv2 draw':>9s} {'cv2 eyes':>9s} | " +
+              " | ".join(f"{str(aa):>8s} draw  eyes render  diff%" for aa in (None, "analytic", "ssaa")))
+        for mood in moods:
+            ref.mood = mood
+            lx, ly, rx, ry, cur_h = ref.eye_layout()
+            t_ref = _time_ms(lambda: ref.draw(canvas_ref), repeat)
+            t_ref_eyes = _time_ms(lambda: (ref._draw_eye(canvas_ref, lx, ly, cur_h, True),
+                                           ref._draw_eye(canvas_ref, rx, ry, cur_h, False)), repeat)
+            ref.draw(canvas_ref)
+            cols = []
+            for aa in (None, "analytic", "ssaa"):
+                eyes = SdfRoboEyes(w, h, antialias=aa)
+                eyes.mood = mood
+                n = repeat if aa != "ssaa" else max(3, repeat // 10)
+                t_render = _time_ms(lambda: (eyes._render(cur_h, True), eyes._render(cur_h, False)), n)
+                eyes.draw(canvas)  # Fills the cache
+                t = _time_ms(lambda: eyes.draw(canvas), repeat)
+                t_eyes = _time_ms(lambda: (eyes._draw_eye(canvas, lx, ly, cur_h, True),
+                                           eyes._draw_eye(canvas, rx, ry, cur_h, False)), repeat)
+                # Pixels that differ by more than half the color range from the cv2 render
+                diff = np.abs(canvas.astype(np.int16) - canvas_ref).max(axis=2) > 127
+                cols.append(f"{t:13.2f} {t_eyes:5.2f} {t_render:6.2f} {100 * diff.mean():6.3f}")
+            print(f"{mood:8s} {t_ref:9.2f} {t_ref_eyes:9.2f} | " + " | ".join(cols))
+
+
+def show():
+    w, h = 640, 480
+    ref, eyes = RoboEyes(w, h), SdfRoboEyes(w, h)
+    a = np.zeros((h, w, 3), np.uint8)
+    b = np.zeros_like(a)
+    print("Keys: [q]uit, [h]appy, [a]ngry, [t]ired, [d]efault")
+    while True:
+        ref.update()
+        eyes.x, eyes.y, eyes.blink_val, eyes.mood = ref.x, ref.y, ref.blink_val, ref.mood
+        ref.draw(a)
+        eyes.draw(b)
+        cv2.imshow("cv2 | SDF", np.hstack([a, b]))
+        key = cv2.waitKey(16) & 0xFF
+        if key == ord('q'): break
+        elif key == ord('h'): ref.set_mood('happy')
+        elif key == ord('a'): ref.set_mood('angry')
+        elif key == ord('t'): ref.set_mood('tired')
+        elif key == ord('d'): ref.set_mood('default')
+    cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SDF eye rasterizer benchmark")
+    parser.add_argument("--show", action="store_true", help="Side by side window instead of the benchmark")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+    if args.show:
+        show()
+    else:
+        benchmark(args.repeat)
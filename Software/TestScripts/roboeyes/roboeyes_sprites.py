@@ -0,0 +1,156 @@
+import cv2
+import numpy as np
+import os
+import sys
+from collections import OrderedDict
+
+from roboeyes_desktop import RoboEyes
+
+# Shared profiling hooks live with the depth scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "depth_mapping"))
+from profiler import profiler
+
+from roboeyes_display import DamageTracker, make_display
+
+# Display backend: "imshow", "fb" (/dev/fb0) or "spi", see roboeyes_display.py
+# Keys are only read from the imshow window
+DISPLAY = "imshow"
+
+# Sprite-cached version of roboeyes_desktop.RoboEyes
+# Each eye (base shape + mood mask) is rasterized once per (mood, blink height, side)
+# into a small sprite. Frames are then built by clearing last frame's eye rectangles
+# and blitting the new sprites, instead of clearing and redrawing the whole canvas.
+class SpriteRoboEyes(RoboEyes):
+    def __init__(self, width, height, bg_color=(0, 0, 0), eye_color=(255, 190, 0),
+                 cache_size=128, blink_step=4):
+        super().__init__(width, height, bg_color, eye_color)
+        self.cache_size = cache_size
+        # Blink heights are rounded to this many pixels so a blink reuses a handful of sprites
+        self.blink_step = blink_step
+        # Thin blink line is 2px thick, keep a margin around the eye box
+        self.pad = 2
+        self.render_margin = 64
+        self.sprites = OrderedDict() # LRU: (mood, cur_h, is_left) -> sprite
+        self.hits = 0
+        self.misses = 0
+        self._prev_rects = None # None = canvas not initialised yet
+        self.dirty_rects = [] # Rectangles (x0, y0, x1, y1) touched by the last draw()
+
+    def _sprite(self, cur_h, is_left):
+        key = (self.mood, cur_h, is_left)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return sprite
+
+        self.misses += 1
+        # Same drawing code as the full-frame renderer, just shifted into a scratch canvas.
+        # The scratch margin keeps the mood polygons unclipped (they reach 50px above the eye),
+        # clipped polygons rasterize slightly differently than on the full canvas
+        m = self.render_margin
+        scratch = np.empty((cur_h + 1 + 2 * m, self.eye_w + 1 + 2 * m, 3), dtype=np.uint8)
+        scratch[:] = self.bg_color
+        self._draw_eye(scratch, m, m, cur_h, is_left)
+        p = self.pad
+        sprite = scratch[m - p:m + cur_h + 1 + p, m - p:m + self.eye_w + 1 + p].copy()
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.cache_size:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def _quantize(self, cur_h):
+        if cur_h <= 2 or cur_h >= self.eye_h:
+            return cur_h
+        return max(3, int(round(cur_h / self.blink_step)) * self.blink_step)
+
+    def draw(self, frame):
+        lx, ly, rx, ry, cur_h = self.eye_layout()
+        q_h = self._quantize(cur_h)
+        # Keep the eye centred when the quantized height differs from the real one
+        dy = (cur_h - q_h) // 2
+
+        new_rects = []
+        if self._prev_rects is None:
+            frame[:] = self.bg_color
+            dirty = [(0, 0, self.width, self.height)]
+        else:
+            # Only last frame's eye boxes need clearing
+            for x0, y0, x1, y1 in self._prev_rects:
+                frame[y0:y1, x0:x1] = self.bg_color
+            dirty = list(self._prev_rects)
+
+        for ex, ey, is_left in ((lx, ly + dy, True), (rx, ry + dy, False)):
+            rect = self._blit(frame, self._sprite(q_h, is_left), ex - self.pad, ey - self.pad)
+            if rect is not None:
+                new_rects.append(rect)
+
+        self._prev_rects = new_rects
+        self.dirty_rects = dirty + new_rects
+        return self.dirty_rects
+
+    def _blit(self, frame, sprite, x, y):
+        # Clip against the canvas, returns the written rectangle or None if fully off-screen
+        sh, sw = sprite.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + sw, self.width), min(y + sh, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        frame[y0:y1, x0:x1] = sprite[y0 - y:y1 - y, x0 - x:x1 - x]
+        return (x0, y0, x1, y1)
+
+    def invalidate(self):
+        """Forget cached sprites, call after changing colors or eye dimensions"""
+        self.sprites.clear()
+        self._prev_rects = None
+
+# --- Main Application Loop ---
+def main():
+    WIN_NAME = "RoboEyes Sprites"
+    # WIDTH, HEIGHT = 640, 480
+    WIDTH, HEIGHT = 1920, 1080
+
+    cv2.namedWindow(WIN_NAME, cv2.WINDOW_NORMAL)
+    if WIDTH==640 and HEIGHT==480:
+        cv2.resizeWindow(WIN_NAME, WIDTH, HEIGHT)
+    elif WIDTH==1920 and HEIGHT==1080:
+        cv2.setWindowProperty(WIN_NAME, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+
+    eyes = SpriteRoboEyes(WIDTH, HEIGHT)
+
+    canvas = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    # Only changed regions are pushed, unchanged frames are skipped
+    damage = DamageTracker(WIDTH, HEIGHT)
+    display = make_display(DISPLAY, WIDTH, HEIGHT, win_name=WIN_NAME)
+
+    print("Keys: [q]uit, [h]appy, [a]ngry, [t]ired, [d]efault")
+
+    while True:
+        with profiler.stage("eyes_update"):
+            eyes.update()
+        with profiler.stage("eyes_draw"):
+            hints = eyes.draw(canvas)
+
+        with profiler.stage("eyes_damage"):
+            rects = damage.update(canvas, hints)
+        if rects:
+            with profiler.stage("eyes_show"):
+                display.write(canvas, rects)
+
+        key = cv2.waitKey(16) & 0xFF
+        if key == ord('q'): break
+        elif key == ord('h'): eyes.set_mood('happy')
+        elif key == ord('a'): eyes.set_mood('angry')
+        elif key == ord('t'): eyes.set_mood('tired')
+        elif key == ord('s'): eyes.toggle_animation()
+        elif key == ord('d'): eyes.set_mood('default')
+
+    display.close()
+    cv2.destroyAllWindows()
+    print(damage.report())
+    print(f"Sprite cache: {len(eyes.sprites)} sprites, {eyes.hits} hits, {eyes.misses} misses")
+    profiler.report()
+    profiler.export_chrome_trace("trace_roboeyes_sprites.json")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+'''
+Fixed-point reference of LegIK::calculate (Orion-Controls) and generator for its C tables
+
+The firmware IK uses float sqrt/acos/asin/atan2. This version uses integers and
+one 257 entry atan lookup table only, so the MCU can run it for all 12 joints
+without the float trig calls, and Python and C give bit-identical results.
+
+Units: positions in Q6 millimeters (1/64 mm), squared lengths in Q12,
+ratios in Q15, angles in millidegrees (mdeg).
+
+The leg-plane solve is rewritten so no acos/asin and no division by lengths is needed.
+With G^2 = x^2 + z^2, A = G^2 - (L2 - L3)^2 and B = (L2 + L3)^2 - G^2 (A + B = 4 L2 L3):
+    theta3 = acos((G^2 - L2^2 - L3^2) / (-2 L2 L3)) = 2 atan2(sqrt(A), sqrt(B))
+    beta   = asin(L3 sin(theta3) / G)                = atan2(2 sqrt(A) sqrt(B), |4 L2^2 - B + A|)
+(the abs() reproduces asin's [-90, 90] range). The half-angle form stays well
+conditioned near a straight knee, where acos of a quantized cosine does not.
+
+atan2 reduces to one octant, takes min / max as a Q15 ratio and interpolates
+the table linearly (interpolation error < 0.0001 deg).
+
+    python fixed_ik.py --generate     # write src/IKTables.h from the constants in src/LegIK.h
+    python fixed_ik.py                # exhaustive 1 mm sweep vs the float64 solver, and C vs Python if g++ exists
+'''
+
+import argparse
+import math
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+
+# === CONFIGURATION ===
+FIRMWARE_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "STM32Firmware", "Orion-Controls", "src")
+TABLES_HEADER = os.path.join(FIRMWARE_SRC, "IKTables.h")
+POS_SHIFT = 6  # Q6 mm
+LUT_BITS = 8  # 2^8 segments over atan(0..1)
+# PCA9685 at 50 Hz: 4096 ticks per 20 ms; setServoAngle maps 0-270 deg to 500-2500 us
+SERVO_DEG_PER_TICK = 270.0 / 2000.0 * (20000.0 / 4096.0)
+ERROR_BOUND_DEG = SERVO_DEG_PER_TICK / 2  # Anything below half a PWM tick can't reach the servo
+SWEEP_STEP_MM = 1.0
+SWEEP_LIMIT_MM = 235
+
+
+def read_leg_constants(path=os.path.join(FIRMWARE_SRC, "LegIK.h")):
+    """L1_HIP, L2_FEMUR, L3_TIBIA, THETA_TIBIA_OFFSET as floats, straight from the firmware header"""
+    with open(path) as f:
+        text = f.read()
+    consts = {name: float(value) for name, value in re.findall(r"const float (\w+) = ([-\d.]+);", text)}
+    for name in ("L1_HIP", "L2_FEMUR", "L3_TIBIA", "THETA_TIBIA_OFFSET"):
+        if name not in consts:
+            raise ValueError(f"{name} not found in {path}")
+    return consts
+
+
+def make_tables(consts):
+    """Everything IKTables.h holds, as Python ints"""
+    q = 1 << POS_SHIFT
+    l1, l2, l3 = consts["L1_HIP"] * q, consts["L2_FEMUR"] * q, consts["L3_TIBIA"] * q
+    n = 1 << LUT_BITS
+    return {
+        "ATAN_LUT": [int(round(math.degrees(math.atan(i / n)) * 1000)) for i in range(n + 1)],
+        "IK_L1_SQ": int(round(l1 * l1)),
+        "IK_SUM_SQ": int(round((l2 + l3) ** 2)),
+        "IK_DIFF_SQ": int(round((l2 - l3) ** 2)),
+        "IK_4_L2_SQ": int(round(4 * l2 * l2)),
+        "IK_TIBIA_OFFSET_MDEG": int(round(consts["THETA_TIBIA_OFFSET"] * 1000)),
+    }
+
+
+def write_header(tables, path=TABLES_HEADER):
+    lut = tables["ATAN_LUT"]
+    rows = ",\n".join("  " + ", ".join(f"{v:5d}" for v in lut[i:i + 12]) for i in range(0, len(lut), 12))
+    with open(path, "w") as f:
+        f.write("// Generated by Software/host_control/fixed_ik.py --generate from the constants in LegIK.h, do not edit\n")
+        f.write("#ifndef IK_TABLES_H\n#define IK_TABLES_H\n\n#include <stdint.h>\n\n")
+        f.write(f"#define IK_POS_SHIFT {POS_SHIFT} // Positions in 1/{1 << POS_SHIFT} mm\n")
+        f.write(f"#define IK_LUT_BITS {LUT_BITS}\n\n")
+        f.write("// Squared lengths, Q12 mm^2\n")
+        for name in ("IK_L1_SQ", "IK_SUM_SQ", "IK_DIFF_SQ", "IK_4_L2_SQ"):
+            f.write(f"static const int64_t {name} = {tables[name]}LL;\n")
+        f.write(f"static const int32_t IK_TIBIA_OFFSET_MDEG = {tables['IK_TIBIA_OFFSET_MDEG']};\n\n")
+        f.write(f"// atan(i / {1 << LUT_BITS}) in millidegrees, i = 0 .. {1 << LUT_BITS}\n")
+        f.write(f"static const uint16_t ATAN_LUT[{len(lut)}] = {{\n{rows}\n}};\n\n#endif\n")
+
+
+# --- Fixed-point solver, mirrors LegIKFixed.h line by line ---
+def isqrt32(v):
+    """floor(sqrt(v)) for 0 <= v < 2^32, same result as the bitwise loop in C"""
+    return math.isqrt(v)
+
+
+def atan2_mdeg(y, x, lut):
+    ay, ax = abs(y), abs(x)
+    if ax == 0 and ay == 0:
+        return 0
+    # Normalize so min << 15 fits in 32 bits
+    while ax >= 1 << 16 or ay >= 1 << 16:
+        ax >>= 1
+        ay >>= 1
+    if ay <= ax:
+        a = _lut(lut, (ay << 15) // ax)
+    else:
+        a = 90000 - _lut(lut, (ax << 15) // ay)
+    if x < 0:
+        a = 180000 - a
+    return -a if y < 0 else a
+
+
+def _lut(lut, r):
+    """atan of a Q15 ratio 0..1 in mdeg, linear interpolation"""
+    seg = 15 - LUT_BITS
+    i = r >> seg
+    if i >= len(lut) - 1:
+        return lut[-1]
+    frac = r & ((1 << seg) - 1)
+    return lut[i] + (((lut[i + 1] - lut[i]) * frac + (1 << (seg - 1))) >> seg)
+
+
+def to_q(v):
+    return int(math.floor(v * (1 << POS_SHIFT) + 0.5))
+
+
+def solve_fixed(xq, yq, zq, t):
+    '''
+    Joint angles in mdeg from Q6 inputs: (theta1, theta2, theta3) like LegIK::calculate,
+    or None when the firmware would return false (or produce NaN).
+    '''
+    lut = t["ATAN_LUT"]
+    if yq * yq + zq * zq - t["IK_L1_SQ"] < 0:
+        return None
+    theta1 = atan2_mdeg(yq, zq, lut)
+
+    g_sq = xq * xq + zq * zq
+    if g_sq > t["IK_SUM_SQ"]:
+        return None
+    a = g_sq - t["IK_DIFF_SQ"]
+    b = t["IK_SUM_SQ"] - g_sq
+    if a < 0:
+        return None  # Closer than |L2 - L3|, acos() would be NaN on the firmware
+    # Both < 2^28, 4 extra bits of sqrt precision still fit in 32 bits
+    sa = isqrt32(a << 4)
+    sb = isqrt32(b << 4)
+    theta3 = 2 * atan2_mdeg(sa, sb, lut)
+    alpha = atan2_mdeg(xq, zq, lut)
+    beta = atan2_mdeg(2 * sa * sb, abs(t["IK_4_L2_SQ"] - b + a) << 4, lut)
+    theta2 = 90000 - (beta - alpha)
+    return theta1, theta2, theta3
+
+
+def servo_angles_fixed(angles, center_femur, center_tibia, is_left, t):
+    """Femur and tibia servo angles in mdeg, same mapping as LegIK::calculate"""
+    theta1, theta2, theta3 = angles
+    theta_s = 90000 - (theta3 - t["IK_TIBIA_OFFSET_MDEG"]) + theta2
+    if is_left:
+        return center_femur * 1000 - theta2, center_tibia * 1000 - theta_s
+    return center_femur * 1000 + theta2, center_tibia * 1000 + theta_s
+
+
+# --- Float reference, LegIK::calculate vectorized ---
+def solve_float(x, y, z, consts, dtype=np.float64):
+    '''
+    theta1, theta2, theta3 in degrees, NaN where the firmware returns false.
+    dtype=np.float32 is what the MCU computes today.
+    '''
+    x, y, z = (np.asarray(v, dtype) for v in (x, y, z))
+    l1, l2, l3 = (dtype(consts[k]) for k in ("L1_HIP", "L2_FEMUR", "L3_TIBIA"))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        theta1 = np.arctan2(y, z)
+        d = z
+        g = np.sqrt(d * d + x * x)
+        theta3 = np.arccos((g * g - l2 * l2 - l3 * l3) / (dtype(-2.0) * l2 * l3))
+        alpha = np.arctan2(x, d)
+        beta = np.arcsin((l3 * np.sin(theta3)) / g)
+        theta2 = dtype(np.pi / 2) - (beta - alpha)
+    bad = (y * y + z * z - l1 * l1 < 0) | (g > l2 + l3)
+    out = [np.degrees(v) for v in (theta1, theta2, theta3)]
+    for v in out:
+        v[bad] = np.nan
+    return out
+
+
+def sweep(consts, t, step=SWEEP_STEP_MM, limit=SWEEP_LIMIT_MM):
+    '''
+    Every point of the x/z leg plane (and y/z for the hip) on a step mm grid.
+    Returns max errors in degrees vs the float64 solver, for fixed point and float32.
+    '''
+    xs = np.arange(-limit, limit + step / 2, step)
+    zs = np.arange(step, limit + step / 2, step)
+    X, Z = np.meshgrid(xs, zs)
+    X, Z = X.ravel(), Z.ravel()
+    Y = np.full_like(X, consts["L1_HIP"])
+    ref = solve_float(X, Y, Z, consts)
+    f32 = solve_float(X, Y, Z, consts, np.float32)
+    valid = ~np.isnan(ref[1]) & ~np.isnan(ref[2])
+
+    err = np.zeros((X.size, 3))
+    mismatched = 0
+    yq = to_q(consts["L1_HIP"])
+    for i in range(X.size):
+        got = solve_fixed(to_q(X[i]), yq, to_q(Z[i]), t)
+        if (got is None) != (not valid[i]):
+            mismatched += 1
+            continue
+        if got is None:
+            continue
+        theta2, theta3 = got[1] / 1000.0, got[2] / 1000.0
+        # Servo angles are linear in theta2 and theta3 (tibia moves with theta2 - theta3)
+        err[i] = (abs(theta2 - ref[1][i]), abs(theta3 - ref[2][i]), abs((theta2 - theta3) - (ref[1][i] - ref[2][i])))
+
+    e32 = np.abs(np.stack([f32[1] - ref[1], f32[2] - ref[2], (f32[1] - f32[2]) - (ref[1] - ref[2])], axis=1))[valid]
+
+    # Hip angle over the y/z plane
+    ys = np.arange(-limit, limit + step / 2, step)
+    Yh, Zh = np.meshgrid(ys, zs)
+    Yh, Zh = Yh.ravel(), Zh.ravel()
+    href = solve_float(np.zeros_like(Yh), Yh, Zh, consts)[0]
+    hvalid = ~np.isnan(href)
+    herr = 0.0
+    for i in np.flatnonzero(hvalid):
+        theta1 = atan2_mdeg(to_q(Yh[i]), to_q(Zh[i]), t["ATAN_LUT"]) / 1000.0
+        herr = max(herr, abs(theta1 - href[i]))
+
+    return {
+        "points": int(valid.sum()) + int(hvalid.sum()),
+        "reach_mismatches": mismatched,
+        "fixed_max": (err[valid].max(axis=0).tolist(), herr),
+        "float32_max": e32.max(axis=0).tolist(),
+    }
+
+
+C_HARNESS = r'''
+#include <stdio.h>
+#include "LegIKFixed.h"
+int main() {
+  long x, y, z;
+  while (scanf("%ld %ld %ld", &x, &y, &z) == 3) {
+    int32_t a[3];
+    if (ikSolveFixed((int32_t)x, (int32_t)y, (int32_t)z, a)) printf("%d %d %d\n", a[0], a[1], a[2]);
+    else printf("x\n");
+  }
+  return 0;
+}
+'''
+
+
+def check_c(t, step=3.0, limit=SWEEP_LIMIT_MM):
+    """Compile LegIKFixed.h on the host and compare it with solve_fixed bit for bit"""
+    cxx = shutil.which("g++") or shutil.which("c++")
+    if cxx is None:
+        print("C check skipped, no C++ compiler")
+        return None
+    points = [(to_q(x), to_q(y), to_q(z))
+              for x in np.arange(-limit, limit, step)
+              for y in (-60.0, 0.0, 39.3)
+              for z in np.arange(1.0, limit, step)]
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "harness.cpp")
+        exe = os.path.join(tmp, "harness")
+        with open(src, "w") as f:
+            f.write(C_HARNESS)
+        subprocess.run([cxx, "-O2", "-I", FIRMWARE_SRC, src, "-o", exe], check=True)
+        out = subprocess.run([exe], input="\n".join(f"{x} {y} {z}" for x, y, z in points),
+                             capture_output=True, text=True, check=True).stdout.split("\n")
+    diff = 0
+    for p, line in zip(points, out):
+        py = solve_fixed(*p, t)
+        expected = "x" if py is None else " ".join(str(v) for v in py)
+        diff += line != expected
+    print(f"C vs Python: {len(points)} points, {diff} differences")
+    return diff == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed-point LegIK reference, C table generator and workspace sweep")
+    parser.add_argument("--generate", action="store_true", help=f"Write {os.path.relpath(TABLES_HEADER)}")
+    parser.add_argument("--step", type=float, default=SWEEP_STEP_MM, help="Sweep grid in mm")
+    args = parser.parse_args()
+
+    consts = read_leg_constants()
+    t = make_tables(consts)
+    if args.generate:
+        write_header(t)
+        print(f"Wrote {TABLES_HEADER}")
+        return
+
+    res = sweep(consts, t, args.step)
+    (e2, e3, es), eh = res["fixed_max"]
+    f2, f3, fs = res["float32_max"]
+    print(f"{res['points']} reachable points on a {args.step} mm grid, {res['reach_mismatches']} reach decisions differ")
+    print(f"max error vs float64, deg   theta1 {eh:.4f}  theta2 {e2:.4f}  theta3 {e3:.4f}  tibia servo {es:.4f}")
+    print(f"float32 (current firmware)  theta2 {f2:.4f}  theta3 {f3:.4f}  tibia servo {fs:.4f}")
+    print(f"servo resolution {SERVO_DEG_PER_TICK:.3f} deg/tick, bound {ERROR_BOUND_DEG:.3f} deg")
+    ok = max(e2, e3, es, eh) <= ERROR_BOUND_DEG and res["reach_mismatches"] == 0
+    c_ok = check_c(t)
+    print("OK" if ok and c_ok is not False else "FAILED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+'''
+Foothold planner: picks where each swing leg lands from K candidates around the nominal step
+
+For every swing leg, N_CANDIDATES points on a disc of SEARCH_RADIUS around the nominal
+foothold (the TrotGait target) are scored on
+- terrain slope, from the heightmap (TestScripts/depth_mapping/heightmap.py, or anything
+  with a vectorized height_at(x, y)); unknown cells are rejected
+- reachability, how far the leg is from fully stretched or fully folded
+- joint-limit margin, distance of the IK angles to JOINT_LIMITS_DEG
+- stability margin, distance of the COM to the edges of the support polygon after touchdown
+Candidates that are out of reach, past a joint limit, too steep or outside the support
+polygon are rejected, the rest are ranked by a weighted cost (WEIGHTS).
+
+IK for all candidates of all legs is one kinematics.leg_IK_batch call, so the planner takes
+about a millisecond, well inside one gait phase (GAIT_PERIOD / 2). K x 4 calls to the scalar
+leg_IK take tens of milliseconds.
+
+    python foothold_planner.py               # synthetic terrain check
+    python foothold_planner.py --benchmark   # planner time vs scalar leg_IK, per gait phase
+'''
+
+import argparse
+import os
+import sys
+import time
+from math import cos, pi, radians, sin
+
+import numpy as np
+
+from joint_streamer import GAIT_PERIOD, Z_BASE, TrotGait
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "kinematics_sim", "matplotlib_simple_sim"))
+from kinematics import kinematics
+
+# === CONFIGURATION ===
+N_CANDIDATES = 64  # Per swing leg, the first one is the nominal foothold
+SEARCH_RADIUS = 0.04  # Meters around the nominal foothold
+SLOPE_STEP = 0.02  # Meters between the height samples for the slope, one heightmap cell
+MAX_SLOPE = 0.5  # rise / run, steeper footholds are rejected (~27 deg)
+# Joint limits of the left legs in kinematics angles (degrees, offsets from SERVO_CENTER_*).
+# angle_corrector mirrors hip and femur for the right legs, the limits are mirrored the same way.
+# Placeholders around the nominal stance, set these from the real mechanical stops
+JOINT_LIMITS_DEG = ((-45.0, 30.0), (-45.0, 90.0), (-130.0, 20.0))
+JOINT_MARGIN_REF = radians(20)  # Margins at or above these count as fully safe
+REACH_MARGIN_REF = 0.02  # Meters of leg length
+STABILITY_MARGIN_REF = 0.03  # Meters
+MIN_STABILITY_MARGIN = 0.0  # COM has to be inside the support polygon
+COM_OFFSET = (0.0, 0.0)  # COM in the body frame (x, y), relative to the body center
+WEIGHTS = {"slope": 1.0, "reach": 1.0, "joint": 1.0, "stability": 1.0, "distance": 0.5}
+
+
+def disc_pattern(n, radius):
+    """n offsets filling a disc evenly (sunflower pattern), the first one at the center"""
+    i = np.arange(n)
+    r = radius * np.sqrt(i / max(n - 1, 1))
+    a = i * pi * (3.0 - np.sqrt(5.0))
+    return np.stack([r * np.cos(a), r * np.sin(a)], axis=1)
+
+
+class FlatTerrain:
+    """Ground at a fixed height, used when there is no heightmap"""
+
+    def __init__(self, z=0.0):
+        self.z = z
+
+    def height_at(self, x, y):
+        return np.full(np.shape(x), self.z)
+
+
+class FootholdPlanner:
+    def __init__(self, terrain=None, k=None, n_candidates=N_CANDIDATES, radius=SEARCH_RADIUS,
+                 joint_limits_deg=JOINT_LIMITS_DEG, weights=WEIGHTS, com_offset=COM_OFFSET):
+        self.terrain = terrain or FlatTerrain(Z_BASE)
+        self.k = k or kinematics()
+        self.radius = radius
+        self.offsets = disc_pattern(n_candidates, radius)
+        self.weights = dict(WEIGHTS, **weights)
+        self.com = np.asarray(com_offset, dtype=float)
+        self.origins = self.k.leg_ID_origins
+        # Support polygon vertex order: legs sorted counterclockwise by their hip position
+        self.polygon_order = np.argsort(np.arctan2(self.origins[:, 1], self.origins[:, 0]))
+        # Joint limits per leg ID (4, 3, 2), hip and femur mirrored on the right side
+        left = np.radians(np.asarray(joint_limits_deg, dtype=float))
+        right = left.copy()
+        right[:2] = -left[:2, ::-1]
+        self.limits = np.stack([right if leg in self.k.right_legs else left for leg in range(4)])
+        self.last = None  # Per-candidate scores of the last plan, for plotting and tuning
+
+    def plan(self, body_pose, nominal, swing_legs):
+        """
+        Footholds for the swing legs
+
+        body_pose: (x, y, z, yaw) of the body center in the terrain frame
+        nominal: (4, 3) foot targets per leg ID relative to the leg origin, as TrotGait gives them
+        swing_legs: leg IDs to plan, the other legs stay at their nominal targets
+        Returns ((4, 3) foot targets in the same frame as nominal, (len(swing_legs),) found a valid candidate)
+        """
+        bx, by, bz, yaw = body_pose
+        c, s = cos(yaw), sin(yaw)
+        swing = np.asarray(swing_legs)
+        nominal = np.asarray(nominal, dtype=float)
+        feet_body = nominal + self.origins  # (4, 3) body frame
+
+        # Candidates in the body frame (S, K, 2) and in the terrain frame
+        cand = feet_body[swing, None, :2] + self.offsets[None]
+        wx = bx + c * cand[..., 0] - s * cand[..., 1]
+        wy = by + s * cand[..., 0] + c * cand[..., 1]
+
+        # One height_at call for the foothold and its four neighbours
+        h = SLOPE_STEP
+        qx = wx[..., None] + np.array([0.0, h, -h, 0.0, 0.0])
+        qy = wy[..., None] + np.array([0.0, 0.0, 0.0, h, -h])
+        z = np.asarray(self.terrain.height_at(qx, qy), dtype=float)
+        slope = np.hypot(z[..., 1] - z[..., 2], z[..., 3] - z[..., 4]) / (2 * h)
+        known = np.isfinite(z).all(axis=-1)
+
+        # Candidate foot targets relative to the leg origins, z from the terrain
+        targets = np.empty(cand.shape[:2] + (3,))
+        targets[..., :2] = cand - self.origins[swing, None, :2]
+        targets[..., 2] = np.where(known, z[..., 0] - bz - self.origins[swing, None, 2], nominal[swing, None, 2])
+
+        # All candidates of all swing legs in one IK call
+        angles, reachable = self.k.leg_IK_batch(targets, swing[:, None])
+
+        # Leg length in the femur/tibia plane, link_1 is perpendicular to it
+        l1, l2, l3 = self.k.link_1, self.k.link_2, self.k.link_3
+        len_B = np.sqrt(np.maximum((targets ** 2).sum(axis=-1) - l1 ** 2, 0.0))
+        reach = np.minimum(l2 + l3 - len_B, len_B - abs(l2 - l3))
+
+        lim = self.limits[swing][:, None]  # (S, 1, 3, 2)
+        joint = np.minimum(angles - lim[..., 0], lim[..., 1] - angles).min(axis=-1)
+
+        stability = self._stability(feet_body, swing, cand)
+
+        valid = known & reachable & (joint >= 0) & (slope <= MAX_SLOPE) & (stability >= MIN_STABILITY_MARGIN)
+        w = self.weights
+        cost = (w["slope"] * slope / MAX_SLOPE
+                + w["reach"] * (1 - np.clip(reach / REACH_MARGIN_REF, 0, 1))
+                + w["joint"] * (1 - np.clip(joint / JOINT_MARGIN_REF, 0, 1))
+                + w["stability"] * (1 - np.clip(stability / STABILITY_MARGIN_REF, 0, 1))
+                + w["distance"] * np.hypot(self.offsets[:, 0], self.offsets[:, 1]) / self.radius)
+        cost = np.where(valid, cost, np.inf)
+
+        best = np.argmin(cost, axis=1)
+        found = np.isfinite(cost[np.arange(len(swing)), best])
+        out = nominal.copy()
+        out[swing[found]] = targets[found, best[found]]
+        self.last = {"targets": targets, "cost": cost, "slope": slope, "reach": reach, "joint": joint,
+                     "stability": stability, "valid": valid, "best": best}
+        return out, found
+
+    def _stability(self, feet_body, swing, cand):
+        """Signed distance of the COM to the support polygon with each candidate in place of its leg, (S, K)"""
+        n_swing, n_cand = cand.shape[:2]
+        feet = np.broadcast_to(feet_body[:, :2], (n_swing, n_cand, 4, 2)).copy()
+        feet[np.arange(n_swing), :, swing] = cand
+        poly = feet[:, :, self.polygon_order]
+        edge = np.roll(poly, -1, axis=2) - poly
+        rel = self.com - poly
+        # Counterclockwise polygon: positive cross product = COM on the inner side of the edge
+        cross = edge[..., 0] * rel[..., 1] - edge[..., 1] * rel[..., 0]
+        return (cross / np.maximum(np.hypot(edge[..., 0], edge[..., 1]), 1e-9)).min(axis=-1)
+
+
+class StepTerrain:
+    """Flat ground at z0 with a raised block, a hole (unknown cells) and a ramp, for testing"""
+
+    def __init__(self, z0=Z_BASE):
+        self.z0 = z0
+
+    def height_at(self, x, y):
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        z = np.full(x.shape, self.z0)
+        z = np.where((x > 0.12) & (x < 0.16) & (y > 0.0), self.z0 + 0.03, z)  # Step edge under the left front foot
+        z = np.where((x < -0.12) & (x > -0.16) & (y < 0.0), np.nan, z)  # Unseen patch under the right back foot
+        return z
+
+
+def check():
+    """Planned footholds avoid the step edge and unknown cells and stay reachable"""
+    k = kinematics()
+    planner = FootholdPlanner(StepTerrain(), k)
+    gait = TrotGait(k)
+    nominal = np.array(gait.feet_at_phase(0.5))
+    nominal[:, 2] = Z_BASE
+    body = (0.0, 0.0, 0.0, 0.0)
+    feet, found = planner.plan(body, nominal, [0, 1, 2, 3])
+    ok = bool(found.all())
+    # No chosen foothold straddles the block edge or sits on unknown ground
+    world = feet + planner.origins
+    for x in (world[:, 0] - SLOPE_STEP, world[:, 0], world[:, 0] + SLOPE_STEP):
+        z = planner.terrain.height_at(x, world[:, 1])
+        ok &= bool(np.isfinite(z).all())
+    last = planner.last
+    ok &= bool((last["slope"][np.arange(4), last["best"]] <= MAX_SLOPE).all())
+    # Same angles as the scalar IK for the chosen footholds
+    batch, reachable = k.leg_IK_batch(feet, np.arange(4))
+    scalar = np.array([k.leg_IK(list(feet[leg]), legID=leg)[:3] for leg in range(4)])
+    err = np.abs(batch - scalar).max()
+    ok &= bool(reachable.all()) and err < 1e-9
+    moved = np.hypot(*(feet - nominal)[:, :2].T)
+    print("moved from nominal (mm):", np.round(moved * 1000, 1), f"  batch vs scalar IK {err:.1e} rad")
+    print("foothold check:", "OK" if ok else "FAILED")
+    return ok
+
+
+def benchmark(repeats=50):
+    k = kinematics()
+    planner = FootholdPlanner(StepTerrain(), k)
+    nominal = np.array(TrotGait(k).feet_at_phase(0.5))
+    phase_ms = GAIT_PERIOD / 2 * 1000
+    for swing in ([0, 3], [0, 1, 2, 3]):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            planner.plan((0.0, 0.0, 0.0, 0.0), nominal, swing)
+        dt = (time.perf_counter() - start) / repeats * 1000
+        print(f"plan {len(swing)} legs x {N_CANDIDATES} candidates: {dt:.2f} ms ({dt / phase_ms:.1%} of a {phase_ms:.0f} ms gait phase)")
+
+    targets = planner.last["targets"]
+    start = time.perf_counter()
+    for leg in range(4):
+        for p in targets[leg]:
+            k.leg_IK(list(p), legID=leg)
+    dt_scalar = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for _ in range(repeats):
+        k.leg_IK_batch(targets, np.arange(4)[:, None])
+    dt_batch = (time.perf_counter() - start) / repeats * 1000
+    print(f"IK for {targets.shape[0] * targets.shape[1]} targets: scalar leg_IK {dt_scalar:.1f} ms, "
+          f"leg_IK_batch {dt_batch:.2f} ms ({dt_scalar / dt_batch:.0f}x)")
+
+
+# --- Main Application Loop ---
+def main():
+    parser = argparse.ArgumentParser(description="Foothold planner check and benchmark")
+    parser.add_argument("--benchmark", action="store_true")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark()
+    else:
+        check()
+
+
+if __name__ == "__main__":
+    main()
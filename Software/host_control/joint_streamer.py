@@ -0,0 +1,334 @@
+'''
+Stream joint targets from the Python kinematics to the Orion-Controls firmware
+
+A fixed rate loop takes foot targets for all four legs in the kinematics frame,
+maps them into the firmware leg frame and solves them the way LegIK::calculate does
+(fixed_ik.solve_float, same link lengths, femur/tibia coupling and per-leg servo
+directions), packs the 12 servo offsets into a JOINTS frame (orion_protocol.py) and
+writes it to the serial port. Deadlines are absolute (start + k / rate), so a slow
+tick doesn't shift the ones after it; the loop reports how late each frame went out.
+
+STATUS frames coming back from the MCU are decoded on the same port.
+
+    python joint_streamer.py --port /dev/ttyACM0           # Nucleo ST-Link virtual COM port
+    python joint_streamer.py --loopback --seconds 5        # pty stand-in for the MCU, no hardware
+
+Needs pyserial (pip install pyserial).
+'''
+
+import argparse
+import os
+import sys
+import threading
+import time
+import tty
+from math import acos, asin, atan2, degrees, pi, radians, sin, sqrt
+
+import numpy as np
+import serial
+
+import fixed_ik
+import orion_protocol as proto
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "kinematics_sim", "matplotlib_simple_sim"))
+from kinematics import kinematics
+from util import RotMatrix3D
+
+# === CONFIGURATION ===
+PORT = "/dev/ttyACM0"
+BAUD = 115200  # 36 byte frames -> ~320 frames/s max at 115200
+RATE_HZ = 100
+# Gait, same trot as stepGait() in main.cpp but in the kinematics frame (meters, z down is negative)
+Z_BASE = -0.15
+STEP_HEIGHT = 0.03
+GAIT_X = 0.02  # Stride is -GAIT_X .. +GAIT_X
+GAIT_PERIOD = 1.0  # Seconds per full cycle (both half cycles)
+# Servo direction per joint in frame order (hip, femur, tibia for FL, FR, BL, BR).
+# The LegIK mapping already mirrors left/right legs, flip here if a servo is mounted reversed
+JOINT_SIGNS = [1] * proto.NUM_JOINTS
+# LegIK::getHipServoAngle returns SERVO_CENTER_HIP + 4 (front) / - 4 (back), the hip IK angle isn't used yet
+HIP_OFFSET = 4.0
+
+
+class TrotGait:
+    """Diagonal pair trot, FL+BR swing while FR+BL stance, then swap"""
+
+    def __init__(self, k=None, period=GAIT_PERIOD, z_base=Z_BASE, step_height=STEP_HEIGHT, stride=GAIT_X):
+        self.k = k or kinematics()
+        self.period = period
+        self.z_base = z_base
+        self.step_height = step_height
+        self.stride = stride
+        # Firmware leg model, read from LegIK.h
+        self.consts = fixed_ik.read_leg_constants()
+        self.tables = fixed_ik.make_tables(self.consts)
+        self.is_front = np.isin(np.arange(4), [0, 2])
+        self.is_left = np.isin(np.arange(4), [0, 1])
+        self.last = [0.0] * proto.NUM_JOINTS  # Unreachable legs keep these, like LegIK::calculate returning false
+        self.unreachable = 0
+
+    def foot(self, phase):
+        """Foot target for a leg at phase 0..1, swing in the first half, stance in the second"""
+        if phase < 0.5:
+            p = phase * 2.0
+            return [-self.stride + 2.0 * self.stride * p, 0.0, self.z_base + sin(p * pi) * self.step_height]
+        p = (phase - 0.5) * 2.0
+        return [self.stride - 2.0 * self.stride * p, 0.0, self.z_base]
+
+    def feet(self, t):
+        """Foot targets per kinematics leg ID at time t"""
+        return self.feet_at_phase((t / self.period) % 1.0)
+
+    def feet_at_phase(self, phase):
+        """Foot targets per kinematics leg ID at gait phase 0..1"""
+        a = self.foot(phase)
+        b = self.foot((phase + 0.5) % 1.0)
+        # Leg IDs: 0 left front, 1 left back, 2 right front, 3 right back
+        return [a, b, b, a]
+
+    def firmware_feet(self, feet, rot=(0, 0, 0)):
+        """
+        Foot targets per leg ID (kinematics frame, meters, relative to j1) -> LegIK::calculate inputs, (4, 3)
+        mm, x forward, y out from the body (L1_HIP at the nominal stance, like currentY in main.cpp), z down
+        """
+        feet = np.asarray(feet, dtype=float)
+        # Body rotation about the center like kinematics.leg_IK, inv(R) * v for rows is v * R
+        origins = self.k.leg_ID_origins
+        feet = (feet + origins) @ np.asarray(RotMatrix3D(list(rot), True)) - origins
+        out = feet * 1000.0
+        out[:, 1] = self.consts["L1_HIP"] + np.where(self.is_left, out[:, 1], -out[:, 1])
+        out[:, 2] = -out[:, 2]
+        return out
+
+    def joint_offsets(self, feet, rot=(0, 0, 0)):
+        """Foot targets per leg ID -> 12 servo offsets from SERVO_CENTER_* in degrees, frame order"""
+        x, y, z = self.firmware_feet(feet, rot).T
+        theta1, theta2, theta3 = fixed_ik.solve_float(x, y, z, self.consts)
+        out = list(self.last)
+        for i, leg in enumerate(proto.FRAME_LEGS):
+            if np.isnan(theta2[leg]) or np.isnan(theta3[leg]):
+                self.unreachable += 1
+                continue
+            # servo_angles_fixed works in mdeg; with zero centers it gives the offsets
+            angles = (theta1[leg] * 1000.0, theta2[leg] * 1000.0, theta3[leg] * 1000.0)
+            femur, tibia = fixed_ik.servo_angles_fixed(angles, 0, 0, self.is_left[leg], self.tables)
+            hip = HIP_OFFSET if self.is_front[leg] else -HIP_OFFSET
+            out[3 * i:3 * i + 3] = [hip, float(femur) / 1000.0, float(tibia) / 1000.0]
+        self.last = out
+        return [s * a for s, a in zip(JOINT_SIGNS, out)]
+
+    def __call__(self, t):
+        return self.joint_offsets(self.feet(t))
+
+
+class JointStreamer:
+    def __init__(self, port, source, rate_hz=RATE_HZ):
+        self.port = port
+        self.source = source
+        self.rate_hz = rate_hz
+        self.decoder = proto.FrameDecoder()
+        self.seq = 0
+        self.lateness = []  # Send time - deadline per frame, seconds
+        self.compute = []  # Time spent in source() per frame, seconds
+        self.status = None
+        self.last_status_at = None
+        self.bytes_sent = 0
+
+    def poll(self):
+        """Read whatever the MCU sent and keep the latest STATUS"""
+        waiting = self.port.in_waiting
+        if not waiting:
+            return
+        for frame in self.decoder.feed(self.port.read(waiting)):
+            if frame.type == proto.TYPE_STATUS:
+                self.status = proto.unpack_status(frame.payload)
+                self.last_status_at = time.monotonic()
+
+    def run(self, seconds=None):
+        period = 1.0 / self.rate_hz
+        start = time.monotonic()
+        k = 0
+        try:
+            while seconds is None or k * period < seconds:
+                deadline = start + k * period
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                t0 = time.monotonic()
+                offsets = self.source(deadline - start)
+                t1 = time.monotonic()
+                frame = proto.pack_joints(self.seq, offsets, int(deadline * 1e6))
+                self.port.write(frame)
+                self.lateness.append(time.monotonic() - deadline)
+                self.compute.append(t1 - t0)
+                self.bytes_sent += len(frame)
+                self.seq = (self.seq + 1) & 0xFFFF
+                self.poll()
+                # Skip deadlines we already missed instead of bursting to catch up
+                k = max(k + 1, int((time.monotonic() - start) / period))
+        except KeyboardInterrupt:
+            pass
+        self.poll()
+
+    def report(self):
+        if not self.lateness:
+            return "no frames sent"
+        late = np.array(self.lateness) * 1000.0
+        comp = np.array(self.compute) * 1000.0
+        lines = [
+            f"frames {len(late)} at {self.rate_hz} Hz, {self.bytes_sent} bytes",
+            f"send lateness ms  p50 {np.percentile(late, 50):.3f}  p99 {np.percentile(late, 99):.3f}  max {late.max():.3f}",
+            f"IK ms             p50 {np.percentile(comp, 50):.3f}  p99 {np.percentile(comp, 99):.3f}  max {comp.max():.3f}",
+        ]
+        if self.status:
+            age = time.monotonic() - self.last_status_at
+            lines.append("MCU status " + ", ".join(f"{k} {v}" for k, v in self.status.items()) + f" ({age:.2f} s ago)")
+        else:
+            lines.append("no STATUS from the MCU")
+        return "\n".join(lines)
+
+
+class PtyController:
+    '''
+    Stand-in for the MCU on a pseudo terminal. Decodes JOINTS frames like the firmware
+    does, keeps the received offsets and arrival times, and answers with a STATUS frame
+    every status_every frames. Open self.path with serial.Serial like a real port.
+    '''
+
+    def __init__(self, status_every=10):
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.path = os.ttyname(slave)
+        self._slave = slave
+        self.status_every = status_every
+        self.decoder = proto.FrameDecoder()
+        self.received = []  # (arrival monotonic, seq, offsets)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        seq = 0
+        while not self._stop.is_set():
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                break
+            now = time.monotonic()
+            for frame in self.decoder.feed(data):
+                if frame.type != proto.TYPE_JOINTS:
+                    continue
+                self.received.append((now, frame.seq, proto.unpack_joints(frame.payload)))
+                if len(self.received) % self.status_every == 0:
+                    os.write(self.master, proto.pack_status(seq, frame.seq, self.decoder.crc_errors, self.decoder.dropped))
+                    seq += 1
+
+    def close(self):
+        self._stop.set()
+        os.close(self._slave)
+        os.close(self.master)
+
+
+def open_port(path, baud=BAUD):
+    # timeout=0: reads never block the send loop
+    return serial.Serial(path, baud, timeout=0, write_timeout=1.0)
+
+
+def legik_reference(x, y, z, is_front, is_left, consts):
+    """LegIK::calculate + getters line by line for one leg (mm in), servo offsets in degrees, None if unreachable"""
+    l1, l2, l3 = consts["L1_HIP"], consts["L2_FEMUR"], consts["L3_TIBIA"]
+    if y * y + z * z - l1 * l1 < 0:
+        return None
+    g = sqrt(z * z + x * x)
+    c = ((g * g) - l2 * l2 - l3 * l3) / (-2.0 * l2 * l3)
+    if g > l2 + l3 or abs(c) > 1:
+        return None
+    theta3 = acos(c)
+    theta2 = radians(90) - (asin(l3 * sin(theta3) / g) - atan2(x, z))
+    theta_s = 90 - (degrees(theta3) - consts["THETA_TIBIA_OFFSET"]) + degrees(theta2)
+    hip = HIP_OFFSET if is_front else -HIP_OFFSET
+    if is_left:
+        return [hip, -degrees(theta2), -theta_s]
+    return [hip, degrees(theta2), theta_s]
+
+
+def check_mapping(gait, phases=200):
+    """joint_offsets vs legik_reference over a gait cycle with a body rotation, max difference in degrees"""
+    worst = 0.0
+    for phase in np.linspace(0.0, 1.0, phases, endpoint=False):
+        for rot in ((0, 0, 0), (0.05, -0.08, 0.1)):
+            feet = gait.feet_at_phase(phase)
+            got = gait.joint_offsets(feet, rot)
+            fw = gait.firmware_feet(feet, rot)
+            expected = []
+            for leg in proto.FRAME_LEGS:
+                expected += legik_reference(*fw[leg], gait.is_front[leg], gait.is_left[leg], gait.consts)
+            worst = max(worst, max(abs(a - b) for a, b in zip(got, expected)))
+    return worst
+
+
+def check(seconds=2.0, rate_hz=200):
+    """Stream the trot over a pty loopback and verify every frame arrives intact"""
+    mcu = PtyController()
+    port = open_port(mcu.path)
+    gait = TrotGait()
+    streamer = JointStreamer(port, gait, rate_hz)
+    streamer.run(seconds)
+    time.sleep(0.1)
+    port.close()
+    mcu.close()
+
+    print(streamer.report())
+    seqs = [s for _, s, _ in mcu.received]
+    ok = seqs == list(range(len(seqs))) and len(seqs) == len(streamer.lateness)
+    # Angles survive the centidegree quantization
+    expected = gait(0.0)
+    err = max(abs(a - b) for a, b in zip(mcu.received[0][2], expected))
+    arrivals = np.diff([t for t, _, _ in mcu.received]) * 1000.0
+    print(f"received {len(seqs)}/{len(streamer.lateness)} in order, CRC errors {mcu.decoder.crc_errors}, "
+          f"max quantization error {err:.4f} deg")
+    # Received offsets are what LegIK::calculate would command for the same feet
+    fw = gait.firmware_feet(gait.feet(0.0))
+    ref = []
+    for leg in proto.FRAME_LEGS:
+        ref += legik_reference(*fw[leg], gait.is_front[leg], gait.is_left[leg], gait.consts)
+    fw_err = max(abs(a - b) for a, b in zip(mcu.received[0][2], ref))
+    map_err = check_mapping(TrotGait())
+    standing = TrotGait().joint_offsets([[0.0, 0.0, Z_BASE]] * 4)[:3]
+    print(f"first frame vs LegIK reference {fw_err:.4f} deg, gait cycle with body rotation {map_err:.1e} deg, "
+          f"FL at z {Z_BASE} m: " + "/".join(f"{a:+.1f}" for a in standing) + " deg")
+    ok &= fw_err <= 0.005 and map_err < 1e-9
+    print(f"arrival interval ms  p50 {np.median(arrivals):.3f}  p1 {np.percentile(arrivals, 1):.3f}  "
+          f"p99 {np.percentile(arrivals, 99):.3f}  (target {1000.0 / rate_hz:.3f})")
+    print("OK" if ok and err <= 0.005 else "FAILED")
+    return ok
+
+
+# --- Main Application Loop ---
+def main():
+    parser = argparse.ArgumentParser(description="Stream kinematics joint targets to Orion-Controls")
+    parser.add_argument("--port", default=PORT)
+    parser.add_argument("--baud", type=int, default=BAUD)
+    parser.add_argument("--rate", type=float, default=RATE_HZ, help="Frames per second")
+    parser.add_argument("--seconds", type=float, default=None, help="Stop after this long, default run until Ctrl+C")
+    parser.add_argument("--loopback", action="store_true", help="Run against a pty stand-in instead of --port")
+    args = parser.parse_args()
+
+    if args.loopback:
+        check(args.seconds or 2.0, args.rate)
+        return
+
+    # Frame time on the wire, 10 bits per byte with start/stop bits
+    wire_hz = args.baud / 10.0 / proto.JOINTS_FRAME_SIZE
+    if args.rate > wire_hz:
+        print(f"Warning: {args.rate} Hz is more than {args.baud} baud can carry (~{wire_hz:.0f} Hz)")
+    port = open_port(args.port, args.baud)
+    streamer = JointStreamer(port, TrotGait(), args.rate)
+    print("Streaming, Ctrl+C to stop")
+    streamer.run(args.seconds)
+    port.close()
+    print(streamer.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+'''
+Asynchronous motion scheduler: body pose / gait commands -> time-stamped joint trajectory
+
+stepGait() in main.cpp runs each half cycle as a blocking for-loop, so nothing
+can change until the cycle ends. Here a producer task generates samples ahead
+of time into a buffer (one sample per 1 / RATE_HZ, each with its own timestamp)
+and a writer task sends each sample when its time comes, so IK time never
+delays a frame as long as the buffer holds LOOKAHEAD_MS of samples.
+
+Commands (set_gait, set_pose, stop) can arrive at any time. Samples later than
+now + COMMIT_MS are dropped and regenerated from the generator state stored
+with the first dropped sample, so the gait phase stays continuous: changing the
+period changes how fast the phase advances, stride/height/pose ease towards the
+new targets with time constant EASE_TAU.
+
+IK runs in a worker thread so the event loop (and the writer) stays responsive.
+
+    python motion_scheduler.py --loopback                # scripted commands against the pty stand-in
+    python motion_scheduler.py --loopback --spike-ms 20  # plus a 20 ms stall in every 25th IK call
+    python motion_scheduler.py --port /dev/ttyACM0
+'''
+
+import argparse
+import asyncio
+import collections
+import time
+from math import radians
+
+import numpy as np
+
+import orion_protocol as proto
+from joint_streamer import BAUD, GAIT_PERIOD, GAIT_X, PORT, RATE_HZ, STEP_HEIGHT, JointStreamer, PtyController, TrotGait, open_port
+
+# === CONFIGURATION ===
+LOOKAHEAD_MS = 100  # Producer keeps this much trajectory buffered
+COMMIT_MS = 30  # Samples closer than this are never regenerated, i.e. the worst case command latency
+SEND_AHEAD_MS = 0  # Send each sample this early; 0 for firmware that applies frames on arrival
+EASE_TAU = 0.15  # Seconds, stride / step height / pose approach new targets with this time constant
+SPIN_S = 0.0015  # Writer blocks the loop for at most this long right before a deadline
+
+
+class Sample:
+    __slots__ = ("k", "t", "state", "offsets", "command_id")
+
+    def __init__(self, k, t, state, offsets, command_id):
+        self.k = k
+        self.t = t
+        self.state = state  # Generator state this sample was produced from
+        self.offsets = offsets
+        self.command_id = command_id
+
+
+class MotionScheduler:
+    def __init__(self, port, gait=None, rate_hz=RATE_HZ, lookahead_ms=LOOKAHEAD_MS,
+                 commit_ms=COMMIT_MS, send_ahead_ms=SEND_AHEAD_MS):
+        self.port = port
+        self.gait = gait or TrotGait()
+        self.dt = 1.0 / rate_hz
+        self.rate_hz = rate_hz
+        self.lookahead = lookahead_ms / 1000.0
+        self.commit = commit_ms / 1000.0
+        self.send_ahead = send_ahead_ms / 1000.0
+        self._alpha = self.dt / (EASE_TAU + self.dt)
+
+        # Targets the generator eases towards; pose is x, y, z (m), roll, pitch, yaw (deg)
+        self._target = {"period": GAIT_PERIOD, "stride": GAIT_X, "step_height": STEP_HEIGHT,
+                        "pose": (0.0, 0.0, 0.0, 0.0, 0.0, 0.0)}
+        # Generator state for sample _next_k: phase, period, stride, step height, pose
+        self._state = (0.0, GAIT_PERIOD, GAIT_X, STEP_HEIGHT, self._target["pose"])
+        self._next_k = 0
+        self._start = None
+        self._buffer = collections.deque()
+        self._ready = asyncio.Event()
+        self._stopping = False
+        self._command_id = 0
+        self._commands = {}  # Command id -> time it was issued
+        self.decoder = proto.FrameDecoder()
+        self.seq = 0
+        self.status = None
+
+        # Metrics
+        self.lateness = []  # Send time - (sample time - send ahead), seconds
+        self.depth = []  # Buffered trajectory ahead of now at each send, seconds
+        self.command_latency = []  # Command -> first frame generated from it leaving, seconds
+        self.underruns = 0
+        self.regenerated = 0
+        self.sent = []  # (sample index, offsets) for checks
+
+    # --- Commands ---
+    def set_gait(self, period=None, stride=None, step_height=None):
+        """Change gait parameters, None keeps the current target"""
+        for key, value in (("period", period), ("stride", stride), ("step_height", step_height)):
+            if value is not None:
+                self._target[key] = value
+        self._replan()
+
+    def stop(self):
+        """Ease into standing, the phase keeps running with zero stride and lift"""
+        self.set_gait(stride=0.0, step_height=0.0)
+
+    def set_pose(self, x=0.0, y=0.0, z=0.0, roll=0.0, pitch=0.0, yaw=0.0):
+        """Body offset in meters and orientation in degrees relative to the neutral stance"""
+        self._target["pose"] = (x, y, z, roll, pitch, yaw)
+        self._replan()
+
+    def _replan(self):
+        now = time.monotonic()
+        self._command_id += 1
+        self._commands[self._command_id] = now
+        # Keep the committed part of the buffer, regenerate the rest from its first sample's state
+        cut = now + self.commit
+        while self._buffer and self._buffer[-1].t >= cut:
+            sample = self._buffer.pop()
+            self._state = sample.state
+            self._next_k = sample.k
+            self.regenerated += 1
+
+    # --- Generator ---
+    def _step(self, state):
+        """Joint offsets for one generator state and the state of the next sample"""
+        phase, period, stride, height, pose = state
+        self.gait.stride = stride
+        self.gait.step_height = height
+        x, y, z, roll, pitch, yaw = pose
+        # Moving the body by +x is moving every foot by -x relative to its hip
+        feet = [[f[0] - x, f[1] - y, f[2] - z] for f in self.gait.feet_at_phase(phase)]
+        offsets = self.gait.joint_offsets(feet, rot=(radians(roll), radians(pitch), radians(yaw)))
+
+        tgt = self._target
+        a = self._alpha
+        next_state = ((phase + self.dt / period) % 1.0,
+                      tgt["period"],
+                      stride + a * (tgt["stride"] - stride),
+                      height + a * (tgt["step_height"] - height),
+                      tuple(p + a * (q - p) for p, q in zip(pose, tgt["pose"])))
+        return offsets, next_state
+
+    async def producer(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            now = time.monotonic()
+            t = self._start + self._next_k * self.dt
+            if t > now + self.lookahead:
+                await asyncio.sleep(min(t - now - self.lookahead, self.dt))
+                continue
+            k, state, command_id = self._next_k, self._state, self._command_id
+            offsets, next_state = await loop.run_in_executor(None, self._step, state)
+            if self._next_k != k or self._command_id != command_id:
+                # A command replanned while IK was running, this sample is stale
+                continue
+            self._buffer.append(Sample(k, t, state, offsets, command_id))
+            self._state = next_state
+            self._next_k = k + 1
+            self._ready.set()
+
+    async def writer(self):
+        while not self._stopping:
+            if not self._buffer:
+                # Producer fell behind: the next sample is due and not generated yet
+                if time.monotonic() >= self._start + self._last_k * self.dt + self.dt - self.send_ahead:
+                    self.underruns += 1
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            sample = self._buffer[0]
+            send_at = sample.t - self.send_ahead
+            delay = send_at - time.monotonic()
+            if delay > SPIN_S:
+                # Event loop timers overshoot by ~1 ms, wake early and finish with a short blocking sleep
+                await asyncio.sleep(delay - SPIN_S)
+                continue  # The buffer head may have been replanned while sleeping
+            if delay > 0:
+                time.sleep(delay)
+            self._buffer.popleft()
+            now = time.monotonic()
+            self._last_k = sample.k
+            self.port.write(proto.pack_joints(self.seq, sample.offsets, int(sample.t * 1e6)))
+            self.seq = (self.seq + 1) & 0xFFFF
+            self.sent.append((sample.k, sample.offsets))
+            self.lateness.append(now - send_at)
+            self.depth.append((self._buffer[-1].t - now) if self._buffer else 0.0)
+            issued = self._commands.pop(sample.command_id, None)
+            if issued is not None:
+                self.command_latency.append(now - issued)
+            self._poll()
+
+    def _poll(self):
+        waiting = self.port.in_waiting
+        if waiting:
+            for frame in self.decoder.feed(self.port.read(waiting)):
+                if frame.type == proto.TYPE_STATUS:
+                    self.status = proto.unpack_status(frame.payload)
+
+    async def run(self, seconds=None, script=()):
+        '''
+        Stream until seconds have passed (or forever). script is a list of
+        (seconds after start, callable) to issue commands at fixed times.
+        '''
+        self._start = time.monotonic() + self.lookahead  # First sample is due once the buffer is full
+        self._last_k = -1
+
+        async def run_script():
+            for at, command in script:
+                await asyncio.sleep(max(0.0, self._start + at - time.monotonic()))
+                command()
+
+        tasks = [asyncio.create_task(c) for c in (self.producer(), self.writer(), run_script())]
+        try:
+            if seconds is None:
+                await asyncio.gather(*tasks)
+            else:
+                await asyncio.sleep(self._start + seconds - time.monotonic())
+        finally:
+            self._stopping = True
+            self._ready.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._poll()
+
+    def report(self):
+        if not self.lateness:
+            return "no frames sent"
+        late = np.array(self.lateness) * 1000.0
+        depth = np.array(self.depth) * 1000.0
+        intervals = np.diff([k for k, _ in self.sent])
+        lines = [
+            f"frames {len(late)} at {self.rate_hz} Hz, lookahead {self.lookahead * 1000:.0f} ms, "
+            f"commit {self.commit * 1000:.0f} ms",
+            f"send lateness ms  p50 {np.percentile(late, 50):.3f}  p99 {np.percentile(late, 99):.3f}  max {late.max():.3f}",
+            f"buffer depth ms   min {depth.min():.1f}  p1 {np.percentile(depth, 1):.1f}  mean {depth.mean():.1f}",
+            f"underruns {self.underruns} (buffer empty when a sample was due), "
+            f"gaps {int((intervals > 1).sum())}, regenerated {self.regenerated}",
+        ]
+        if self.command_latency:
+            lat = np.array(self.command_latency) * 1000.0
+            lines.append(f"command latency ms  mean {lat.mean():.1f}  max {lat.max():.1f}")
+        if self.status:
+            lines.append("MCU status " + ", ".join(f"{k} {v}" for k, v in self.status.items()))
+        return "\n".join(lines)
+
+
+class SpikyGait(TrotGait):
+    """TrotGait with a stall every n-th IK call, stands in for GC pauses or other work on the host"""
+
+    def __init__(self, spike_ms, every=25):
+        super().__init__()
+        self.spike = spike_ms / 1000.0
+        self.every = every
+        self.calls = 0
+
+    def joint_offsets(self, feet, rot=(0, 0, 0)):
+        self.calls += 1
+        if self.spike and self.calls % self.every == 0:
+            time.sleep(self.spike)
+        return super().joint_offsets(feet, rot)
+
+
+def check(seconds=3.0, rate_hz=RATE_HZ, spike_ms=0.0):
+    script = [
+        (1.0, lambda: sched.set_gait(period=0.6, stride=0.03)),
+        (1.5, lambda: sched.set_pose(z=0.01, pitch=5.0)),
+        (2.2, lambda: sched.stop()),
+    ]
+    mcu = PtyController()
+    port = open_port(mcu.path)
+    sched = MotionScheduler(port, SpikyGait(spike_ms), rate_hz)
+    asyncio.run(sched.run(seconds, script))
+    time.sleep(0.1)
+    port.close()
+    mcu.close()
+    print("--- scheduler ---")
+    print(sched.report())
+
+    seqs = [s for _, s, _ in mcu.received]
+    in_order = seqs == list(range(len(seqs)))
+    # Continuity: largest joint change between consecutive frames, including across commands
+    angles = np.array([o for _, _, o in mcu.received])
+    step = np.abs(np.diff(angles, axis=0)).max()
+    print(f"received {len(seqs)}/{len(sched.sent)} in order: {in_order}, largest joint step {step:.2f} deg/frame")
+
+    # Same gait computed inline in the send loop, for comparison
+    mcu = PtyController()
+    port = open_port(mcu.path)
+    inline = JointStreamer(port, SpikyGait(spike_ms), rate_hz)
+    inline.run(seconds)
+    port.close()
+    mcu.close()
+    late = np.array(inline.lateness) * 1000.0
+    print(f"--- inline IK (joint_streamer) ---\nsend lateness ms  p50 {np.percentile(late, 50):.3f}  "
+          f"p99 {np.percentile(late, 99):.3f}  max {late.max():.3f}")
+
+    ok = in_order and len(seqs) == len(sched.sent) and sched.underruns == 0
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+# --- Main Application Loop ---
+def main():
+    parser = argparse.ArgumentParser(description="Buffered gait/pose scheduler streaming to Orion-Controls")
+    parser.add_argument("--port", default=PORT)
+    parser.add_argument("--baud", type=int, default=BAUD)
+    parser.add_argument("--rate", type=float, default=RATE_HZ)
+    parser.add_argument("--seconds", type=float, default=None)
+    parser.add_argument("--loopback", action="store_true", help="Scripted check against a pty stand-in")
+    parser.add_argument("--spike-ms", type=float, default=0.0, help="Loopback only: stall every 25th IK call")
+    args = parser.parse_args()
+
+    if args.loopback:
+        check(args.seconds or 3.0, args.rate, args.spike_ms)
+        return
+
+    port = open_port(args.port, args.baud)
+    sched = MotionScheduler(port, rate_hz=args.rate)
+    print("Streaming trot, Ctrl+C to stop")
+    try:
+        asyncio.run(sched.run(args.seconds))
+    except KeyboardInterrupt:
+        pass
+    port.close()
+    print(sched.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+'''
+Binary command protocol between the host (Jetson / laptop) and the Orion-Controls firmware
+
+Every frame is little endian and fixed size per type, so the STM32 can memcpy
+the payload straight into a struct:
+
+    offset  size  field
+    0       2     sync 0xA5 0x5A
+    2       1     type
+    3       1     payload length
+    4       2     sequence number (wraps at 65536)
+    6       4     host timestamp, microseconds (wraps after ~71 minutes)
+    10      n     payload
+    10+n    2     CRC-16/CCITT-FALSE over type .. end of payload
+
+Frame types:
+    JOINTS  host -> MCU  12 x int16 servo offsets from SERVO_CENTER_*, centidegrees,
+                         legs in main.cpp order (FL, FR, BL, BR), joints hip, femur, tibia
+    STATUS  MCU -> host  last applied seq, CRC errors, dropped frames (seq gaps), rx overflows
+
+A JOINTS frame is 36 bytes, ~3.1 ms on the wire at 115200 baud, vs one float per
+ASCII line with a 2 ms delay per character in the old parser.
+The C side of this is src/HostProtocol.h in Orion-Controls; keep the two in sync.
+'''
+
+import binascii
+import struct
+
+# === CONFIGURATION ===
+SYNC = b"\xa5\x5a"
+TYPE_JOINTS = 0x01
+TYPE_STATUS = 0x81
+NUM_JOINTS = 12
+# Legs in frame order, as kinematics leg IDs (0 left front, 1 left back, 2 right front, 3 right back)
+FRAME_LEGS = [0, 2, 1, 3]
+LEG_NAMES = ["FL", "FR", "BL", "BR"]
+JOINT_NAMES = ["hip", "femur", "tibia"]
+MAX_PAYLOAD = 64
+
+HEADER = struct.Struct("<2sBBHI")
+CRC = struct.Struct("<H")
+JOINTS = struct.Struct("<12h")
+STATUS = struct.Struct("<HHHH")
+JOINTS_FRAME_SIZE = HEADER.size + JOINTS.size + CRC.size
+
+
+def crc16(data):
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), same as crc16() in HostProtocol.h"""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def pack_frame(frame_type, seq, payload, timestamp_us=0):
+    body = HEADER.pack(SYNC, frame_type, len(payload), seq & 0xFFFF, timestamp_us & 0xFFFFFFFF) + payload
+    return body + CRC.pack(crc16(body[2:]))
+
+
+def pack_joints(seq, offsets_deg, timestamp_us=0):
+    """12 servo offsets in degrees -> JOINTS frame (centidegrees, saturated to int16)"""
+    if len(offsets_deg) != NUM_JOINTS:
+        raise ValueError(f"expected {NUM_JOINTS} joint offsets, got {len(offsets_deg)}")
+    centi = [max(-32768, min(32767, int(round(a * 100.0)))) for a in offsets_deg]
+    return pack_frame(TYPE_JOINTS, seq, JOINTS.pack(*centi), timestamp_us)
+
+
+def pack_status(seq, last_seq, crc_errors, dropped, overflows=0):
+    return pack_frame(TYPE_STATUS, seq, STATUS.pack(last_seq & 0xFFFF, crc_errors & 0xFFFF,
+                                                    dropped & 0xFFFF, overflows & 0xFFFF))
+
+
+def unpack_joints(payload):
+    """JOINTS payload -> list of 12 offsets in degrees"""
+    return [c / 100.0 for c in JOINTS.unpack(payload)]
+
+
+def unpack_status(payload):
+    last_seq, crc_errors, dropped, overflows = STATUS.unpack(payload)
+    return {"last_seq": last_seq, "crc_errors": crc_errors, "dropped": dropped, "overflows": overflows}
+
+
+class Frame:
+    __slots__ = ("type", "seq", "timestamp_us", "payload")
+
+    def __init__(self, frame_type, seq, timestamp_us, payload):
+        self.type = frame_type
+        self.seq = seq
+        self.timestamp_us = timestamp_us
+        self.payload = payload
+
+
+class FrameDecoder:
+    '''
+    Incremental decoder, feed() it whatever the port returned and iterate the frames.
+    Bytes before a sync pattern are skipped, a frame with a bad CRC or length drops
+    one byte and the search restarts, so a corrupted or cut frame costs at most itself.
+    '''
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._last_seq = None
+        self.frames = 0
+        self.crc_errors = 0
+        self.dropped = 0
+        self.skipped_bytes = 0
+
+    def feed(self, data):
+        self._buf += data
+        out = []
+        buf = self._buf
+        start = 0
+        while True:
+            i = buf.find(SYNC, start)
+            if i < 0:
+                # Keep a trailing 0xA5, it may be the first half of the next sync
+                keep = 1 if buf.endswith(SYNC[:1]) else 0
+                self.skipped_bytes += len(buf) - start - keep
+                start = len(buf) - keep
+                break
+            self.skipped_bytes += i - start
+            if len(buf) - i < HEADER.size:
+                start = i
+                break
+            _, frame_type, length, seq, timestamp_us = HEADER.unpack_from(buf, i)
+            if length > MAX_PAYLOAD:
+                start = i + 1
+                continue
+            end = i + HEADER.size + length + CRC.size
+            if len(buf) < end:
+                start = i
+                break
+            (crc,) = CRC.unpack_from(buf, end - CRC.size)
+            if crc != crc16(bytes(buf[i + 2:end - CRC.size])):
+                self.crc_errors += 1
+                start = i + 1
+                continue
+            if self._last_seq is not None:
+                self.dropped += (seq - self._last_seq - 1) & 0xFFFF
+            self._last_seq = seq
+            self.frames += 1
+            out.append(Frame(frame_type, seq, timestamp_us, bytes(buf[i + HEADER.size:end - CRC.size])))
+            start = end
+        del buf[:start]
+        return out
+
+
+if __name__ == "__main__":
+    # Round trip, resync after garbage and corruption
+    frames = [pack_joints(s, [s * 0.01 * j for j in range(NUM_JOINTS)], s * 1000) for s in range(100)]
+    stream = bytearray(b"\x00\xa5garbage" + b"".join(frames))
+    stream[len(frames[0]) * 10 + 20] ^= 0xFF  # Corrupt frame 10
+    dec = FrameDecoder()
+    got = []
+    for k in range(0, len(stream), 7):  # Odd chunk size to split frames across reads
+        got += dec.feed(bytes(stream[k:k + 7]))
+    assert [f.seq for f in got] == [s for s in range(100) if s != 10], [f.seq for f in got]
+    assert unpack_joints(got[5].payload)[3] == 0.15
+    print(f"JOINTS frame: {len(frames[0])} bytes, decoded {dec.frames}, CRC errors {dec.crc_errors}, "
+          f"dropped {dec.dropped}, skipped bytes {dec.skipped_bytes}")
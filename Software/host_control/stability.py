@@ -0,0 +1,262 @@
+'''
+Whole-body forward kinematics, center of mass and support-polygon stability, vectorized over trajectories
+
+- robot_joints: joint coordinates j1-j4 of all four legs in the level body frame, for
+  any batch of joint angles (..., 4, 3) and body orientations, from kinematics.leg_joints_batch
+- center_of_mass: body plus per-link masses (MASSES), each link at its midpoint
+- support_margin: signed distance of a point to the support polygon of the feet in contact,
+  positive inside. With two feet in contact (trot) it is minus the distance to the support
+  line, with fewer than two -inf
+- trajectory_margin: all of the above for whole trajectories at once, with the static COM
+  or the ZMP (COM acceleration from finite differences)
+
+Gait parameters can then be screened in bulk: trot_trajectories builds the TrotGait foot
+trajectories for a whole grid of parameter sets, and one call scores all of them.
+
+    python stability.py               # checks against the scalar kinematics code and simple polygons
+    python stability.py --benchmark   # trot parameter grid screened in one call
+'''
+
+import argparse
+import os
+import sys
+import time
+from itertools import product
+
+import numpy as np
+
+from joint_streamer import GAIT_PERIOD, GAIT_X, STEP_HEIGHT, Z_BASE
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "kinematics_sim", "matplotlib_simple_sim"))
+from kinematics import kinematics
+
+# === CONFIGURATION ===
+# Masses in kg. Placeholders, weigh the parts. The femur servo sits on the hip link and the
+# knee servo on the femur, so those links carry the servo mass
+MASSES = {"body": 1.2, "hip": 0.07, "femur": 0.08, "tibia": 0.02}
+BODY_COM = (0.0, 0.0, 0.0)  # Body COM in the body frame, relative to the body center
+G = 9.81
+MIN_MARGIN = 0.01  # Meters, with three or more feet down
+TWO_LEG_TOLERANCE = 0.01  # Meters, COM / ZMP distance from the support line accepted in a trot
+SAMPLES_PER_CYCLE = 100
+
+
+def rotation_matrices(rot):
+    """Vectorized RotMatrix3D (order 'xyz', radians): (..., 3) roll, pitch, yaw -> (..., 3, 3)"""
+    rot = np.asarray(rot, dtype=float)
+    cr, sr = np.cos(rot[..., 0]), np.sin(rot[..., 0])
+    cp, sp = np.cos(rot[..., 1]), np.sin(rot[..., 1])
+    cy, sy = np.cos(rot[..., 2]), np.sin(rot[..., 2])
+    # Rz * Ry * Rx
+    return np.stack([
+        np.stack([cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr], axis=-1),
+        np.stack([sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr], axis=-1),
+        np.stack([-sp, cp * sr, cp * cr], axis=-1)], axis=-2)
+
+
+def robot_joints(k, angles, rot=None, center_offset=(0.0, 0.0, 0.0)):
+    """
+    Joint coordinates of all legs in the level body frame
+
+    angles: (..., 4, 3) robot joint angles per leg ID, rot: (..., 3) body roll, pitch, yaw or None
+    Returns (..., 4, 4, 3): leg ID, joint j1-j4, xyz. Same as kinematics.base_pose + leg_pose
+    """
+    angles = np.asarray(angles, dtype=float)
+    is_right = np.isin(np.arange(4), k.right_legs)
+    # Leg frame -> body frame, then rotated about the center of rotation like leg_IK / base_pose
+    p = k.leg_joints_batch(angles, is_right) + k.leg_ID_origins[:, None, :]
+    if rot is None:
+        return p
+    c = np.asarray(center_offset, dtype=float)
+    R = rotation_matrices(rot)[..., None, None, :, :]
+    return (R @ (p - c)[..., None])[..., 0] + c
+
+
+def center_of_mass(joints, rot=None, masses=MASSES, body_com=BODY_COM, center_offset=(0.0, 0.0, 0.0)):
+    """COM (..., 3) from robot_joints output, links at their midpoints, body_com broadcasts against (..., 3)"""
+    body = np.broadcast_to(np.asarray(body_com, dtype=float), joints.shape[:-3] + (3,))
+    if rot is not None:
+        c = np.asarray(center_offset, dtype=float)
+        body = (rotation_matrices(rot) @ (body - c)[..., None])[..., 0] + c
+    links = 0.5 * (joints[..., :-1, :] + joints[..., 1:, :])  # (..., 4, 3 links, 3)
+    m = np.array([masses["hip"], masses["femur"], masses["tibia"]])
+    total = masses["body"] + 4 * m.sum()
+    return (masses["body"] * body + (links * m[:, None]).sum(axis=(-3, -2))) / total
+
+
+def polygon_order(k):
+    """Leg IDs sorted counterclockwise by hip position, the vertex order of the support polygon"""
+    origins = k.leg_ID_origins
+    return np.argsort(np.arctan2(origins[:, 1], origins[:, 0]))
+
+
+def _next_contact_table():
+    """NEXT[mask, i]: next polygon slot in contact after slot i (counterclockwise), i itself if none"""
+    table = np.zeros((16, 4), dtype=int)
+    for mask, i in product(range(16), range(4)):
+        table[mask, i] = next(((i + s) % 4 for s in range(1, 5) if mask >> ((i + s) % 4) & 1), i)
+    return table
+
+
+NEXT_CONTACT = _next_contact_table()
+
+
+def support_margin(point, feet, contacts, order):
+    """
+    Signed distance of point (..., 2) to the support polygon, positive inside
+
+    feet: (..., 4, 2) foot xy per leg ID, contacts: (..., 4) bool, order: polygon_order()
+    Two feet down gives minus the distance to the line through them, fewer than two -inf
+    """
+    feet = np.asarray(feet)[..., order, :]
+    contacts = np.asarray(contacts, dtype=bool)[..., order]
+    mask = (contacts * np.array([1, 2, 4, 8])).sum(axis=-1)
+    nxt = NEXT_CONTACT[mask]  # (..., 4)
+    a = feet
+    b = np.take_along_axis(feet, nxt[..., None], axis=-2)
+    edge = b - a
+    rel = np.asarray(point)[..., None, :] - a
+    length = np.hypot(edge[..., 0], edge[..., 1])
+    # Counterclockwise polygon: positive cross product = point on the inner side of the edge
+    d = (edge[..., 0] * rel[..., 1] - edge[..., 1] * rel[..., 0]) / np.maximum(length, 1e-12)
+    d = np.where(contacts, d, np.inf)
+    return np.where(contacts.sum(axis=-1) >= 2, d.min(axis=-1), -np.inf)
+
+
+def trajectory_margin(k, angles, contacts, dt=None, rot=None, masses=MASSES, body_com=BODY_COM):
+    """
+    Stability margin over trajectories: angles (..., T, 4, 3), contacts (..., T, 4)
+
+    With dt the ZMP (cart-table model, height above the feet in contact) is used instead of
+    the static COM projection. Returns (margin (..., T), com (..., T, 3), point (..., T, 2))
+    """
+    joints = robot_joints(k, angles, rot)
+    com = center_of_mass(joints, rot, masses, body_com)
+    feet = joints[..., 3, :]  # (..., T, 4, 3)
+    point = com[..., :2]
+    if dt is not None:
+        acc = np.gradient(np.gradient(point, dt, axis=-2), dt, axis=-2)
+        c = np.asarray(contacts, dtype=float)
+        ground = (feet[..., 2] * c).sum(axis=-1) / np.maximum(c.sum(axis=-1), 1)
+        point = point - ((com[..., 2] - ground) / G)[..., None] * acc
+    return support_margin(point, feet[..., :2], contacts, polygon_order(k)), com, point
+
+
+def trot_trajectories(strides, heights, z_bases, samples=SAMPLES_PER_CYCLE):
+    """
+    TrotGait foot targets for P parameter sets over one cycle, vectorized
+
+    Returns feet (P, T, 4, 3) per leg ID (relative to the leg origins) and contacts (P, T, 4)
+    """
+    stride = np.asarray(strides, dtype=float)[:, None]
+    height = np.asarray(heights, dtype=float)[:, None]
+    z_base = np.asarray(z_bases, dtype=float)[:, None]
+    phase = np.arange(samples) / samples
+
+    def foot(ph):
+        swing = ph < 0.5
+        p = np.where(swing, ph * 2.0, (ph - 0.5) * 2.0)
+        x = np.where(swing, -stride + 2.0 * stride * p, stride - 2.0 * stride * p)
+        z = z_base + np.where(swing, np.sin(p * np.pi) * height, 0.0)
+        return np.stack([x, np.zeros_like(x), z], axis=-1), ~swing
+
+    a, contact_a = foot(phase)
+    b, contact_b = foot((phase + 0.5) % 1.0)
+    # Leg IDs as in TrotGait.feet_at_phase: [a, b, b, a]
+    feet = np.stack([a, b, b, a], axis=-2)
+    contacts = np.stack([contact_a, contact_b, contact_b, contact_a], axis=-1)
+    return feet, np.broadcast_to(contacts, feet.shape[:-1])
+
+
+def screen_trot(k, strides, heights, z_bases, body_coms, period=GAIT_PERIOD, samples=SAMPLES_PER_CYCLE):
+    """Worst ZMP margin over a cycle for each parameter set, and which sets pass"""
+    feet, contacts = trot_trajectories(strides, heights, z_bases, samples)
+    angles, reachable = k.leg_IK_batch(feet, np.arange(4))
+    body_com = np.asarray(body_coms, dtype=float)[:, None, :]  # Broadcasts over the samples
+    margin = trajectory_margin(k, angles, contacts, period / samples, body_com=body_com)[0]
+    worst = margin.min(axis=-1)
+    three_plus = contacts.sum(axis=-1) >= 3
+    ok = np.where(three_plus, margin >= MIN_MARGIN, margin >= -TWO_LEG_TOLERANCE).all(axis=-1)
+    return worst, ok & reachable.all(axis=(-2, -1))
+
+
+def check(n=200, seed=0):
+    """robot_joints against the scalar base_pose / leg_pose, polygon margins on known shapes"""
+    k = kinematics()
+    rng = np.random.default_rng(seed)
+    ok = True
+
+    # Whole-body FK against the scalar plotting path, random poses and center offsets
+    err = 0.0
+    for _ in range(n):
+        xyz = np.stack([rng.uniform(-0.05, 0.05, 4), rng.uniform(-0.02, 0.02, 4), rng.uniform(-0.2, -0.1, 4)], axis=1)
+        rot = rng.uniform(-0.2, 0.2, 3)
+        c = rng.uniform(-0.03, 0.03, 3)
+        angles = k.leg_IK_batch(xyz, np.arange(4), rot=rot, center_offset=c)[0]
+        joints = robot_joints(k, angles, rot, c)
+        base = np.asarray(k.base_pose(list(rot), True, list(c)))
+        for leg in range(4):
+            ref = np.asarray(k.leg_pose(list(xyz[leg]), list(rot), leg, True, list(c))) + base[k.origin_rows[leg]]
+            err = max(err, np.abs(joints[leg] - ref).max())
+    ok &= err < 1e-12
+    print(f"robot_joints vs base_pose + leg_pose: {err:.1e} m")
+
+    # Feet on a 0.2 m square around the origin
+    order = polygon_order(k)
+    feet = k.leg_ID_origins[:, :2] / np.abs(k.leg_ID_origins[:, :2]) * 0.1
+    all_down = np.ones(4, bool)
+    m = support_margin(np.array([[0.0, 0.0], [0.05, 0.0], [0.15, 0.0]]), feet, all_down, order)
+    ok &= np.allclose(m, [0.1, 0.05, -0.05])
+    diagonal = np.array([True, False, False, True])  # Left front and right back
+    m2 = support_margin(np.array([[0.0, 0.0], [0.0, 0.05]]), feet, diagonal, order)
+    ok &= np.allclose(m2, [0.0, -0.05 / np.sqrt(2)])
+    three = np.array([True, True, True, False])  # Right back lifted
+    m3 = support_margin(np.array([0.05, 0.0]), feet, three, order)
+    ok &= np.isclose(m3, 0.05 / np.sqrt(2)) and support_margin(np.zeros(2), feet, np.eye(4, dtype=bool)[0], order) == -np.inf
+    print(f"square margins {np.round(m, 3)}, two legs {np.round(m2, 4)}, three legs {m3:.4f}")
+
+    # Symmetric stance: COM on the body center line, below the body with the legs down
+    angles = k.leg_IK_batch([0.0, 0.0, Z_BASE], np.arange(4))[0]
+    com = center_of_mass(robot_joints(k, angles))
+    ok &= abs(com[1]) < 1e-12 and com[2] < 0
+    print(f"standing COM {np.round(com * 1000, 2)} mm")
+    print("stability check:", "OK" if ok else "FAILED")
+    return bool(ok)
+
+
+def benchmark():
+    k = kinematics()
+    strides = np.linspace(0.0, 0.06, 7)
+    heights = np.linspace(0.0, 0.06, 7)
+    z_bases = np.linspace(-0.22, -0.10, 7)
+    com_x = np.linspace(-0.04, 0.04, 9)
+    grid = np.array(list(product(strides, heights, z_bases, com_x)))
+    body_coms = np.stack([grid[:, 3], np.zeros(len(grid)), np.zeros(len(grid))], axis=1)
+    start = time.perf_counter()
+    worst, ok = screen_trot(k, grid[:, 0], grid[:, 1], grid[:, 2], body_coms)
+    dt = time.perf_counter() - start
+    n = len(grid) * SAMPLES_PER_CYCLE
+    print(f"{len(grid)} trot parameter sets x {SAMPLES_PER_CYCLE} samples: {dt * 1000:.0f} ms "
+          f"({n * 4 / dt / 1e6:.2f} M leg IK + FK per second), {ok.sum()} pass")
+    for x in com_x:
+        pick = grid[:, 3] == x
+        print(f"  body COM x {x * 1000:+5.1f} mm: {ok[pick].mean():6.1%} pass, "
+              f"median worst margin {np.median(worst[pick]) * 1000:+.1f} mm")
+    worst, ok = screen_trot(k, [GAIT_X], [STEP_HEIGHT], [Z_BASE], [BODY_COM])
+    print(f"current TrotGait (stride {GAIT_X}, step height {STEP_HEIGHT}, z {Z_BASE}): "
+          f"worst margin {worst[0] * 1000:+.1f} mm, {'pass' if ok[0] else 'FAIL'}")
+
+
+# --- Main Application Loop ---
+def main():
+    parser = argparse.ArgumentParser(description="FK / COM / support polygon checks and bulk gait screening")
+    parser.add_argument("--benchmark", action="store_true")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark()
+    else:
+        check()
+
+
+if __name__ == "__main__":
+    main()
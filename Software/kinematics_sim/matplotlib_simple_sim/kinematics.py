@@ -34,6 +34,11 @@ class kinematics():
                           [-self.length/2, -self.width/2, 0],
                           [self.length/2, -self.width/2, 0],
                           [self.length/2, self.width/2, 0]])
+
+        # the rows above are in drawing order, so right_front/right_back are rows 3 and 2.
+        # row of leg_origins for each leg ID, and the origins as an array indexed by leg ID
+        self.origin_rows = [0, 1, 3, 2]
+        self.leg_ID_origins = np.asarray(self.leg_origins)[self.origin_rows]
         
     # this method adjust inputs to the IK calculator by adding rotation and 
     # offset of that rotation from the center of the robot
@@ -44,11 +49,11 @@ class kinematics():
         
         # add offset of each leg from the axis of rotation
         XYZ = asarray((inv(RotMatrix3D(rot,is_radians)) * \
-            ((array(xyz) + self.leg_origins[legID,:] - array(center_offset)).transpose())).transpose())
+            ((array(xyz) + self.leg_origins[self.origin_rows[legID],:] - array(center_offset)).transpose())).transpose())
         
         # subtract the offset between the leg and the center of rotation 
         # so that the resultant coordiante is relative to the origin (j1) of the leg
-        xyz_ = asarray(XYZ - self.leg_origins[legID,:] + array(center_offset)).flatten()
+        xyz_ = asarray(XYZ - self.leg_origins[self.origin_rows[legID],:] + array(center_offset)).flatten()
 
         # calculate the angles and coordinates of the leg relative to the origin of the leg
         return self.leg_IK_calc(xyz_, is_right)
@@ -86,7 +91,7 @@ class kinematics():
         j4_2_vec_ = rot_mtx * (np.reshape(j4_2_vec,[3,1]))
         
         # xyz in the rotated coordinate system + offset due to link_1 removed
-        x_, y_, z_ = j4_2_vec_[0], j4_2_vec_[1], j4_2_vec_[2]
+        x_, y_, z_ = j4_2_vec_[0, 0], j4_2_vec_[1, 0], j4_2_vec_[2, 0]
         
         len_B = norm([x_, z_]) # norm(j4-j2)
         
@@ -124,6 +129,127 @@ class kinematics():
         return [angles[0], angles[1], angles[2], j1, j2, j3, j4]
     
     
+    # batched leg_IK: xyz (..., 3) foot targets and legID (...) leg IDs (broadcast against each other)
+    # returns (angles (..., 3), reachable (...)), same angles as leg_IK for reachable targets.
+    # out-of-reach targets are clamped like leg_IK_calc does, but without printing
+    def leg_IK_batch(self, xyz, legID, rot=[0,0,0], is_radians=True, center_offset=[0,0,0]):
+        xyz = np.asarray(xyz, dtype=float)
+        legID = np.asarray(legID)
+        xyz, legID = np.broadcast_arrays(xyz, legID[..., None])
+        legID = legID[..., 0]
+        origins = self.leg_ID_origins[legID]
+        c = np.asarray(center_offset, dtype=float)
+
+        # same as leg_IK: rotate about the center of rotation, back to the leg origin.
+        # inv(R) * v for column vectors is v * R for row vectors
+        R = np.asarray(RotMatrix3D(rot, is_radians))
+        xyz_ = (xyz + origins - c) @ R - origins + c
+        return self.leg_IK_calc_batch(xyz_, np.isin(legID, self.right_legs))
+
+    # batched leg_IK_calc, xyz (..., 3) relative to j1 and is_right (...) booleans
+    def leg_IK_calc_batch(self, xyz, is_right):
+        xyz = np.asarray(xyz, dtype=float)
+        is_right = np.asarray(is_right, dtype=bool)
+        x, y, z = xyz[..., 0], xyz[..., 1], xyz[..., 2]
+        l1, l2, l3 = self.link_1, self.link_2, self.link_3
+
+        # safe_atan2(p1, p2) is atan2(p2, p1) in 0 - 2pi
+        len_A = np.hypot(y, z)
+        a_1 = np.mod(np.arctan2(z, y), 2*pi)
+        a_2 = np.arcsin(np.clip(sin(self.phi)*l1/np.maximum(len_A, 1e-12), -1, 1))
+        a_3 = pi - a_2 - self.phi
+        theta_1 = np.where(is_right, a_1 - a_3, a_1 + a_3)
+        theta_1 = np.where(~is_right & (theta_1 >= 2*pi), theta_1 - 2*pi, theta_1)
+
+        # j4 - j2, rotated into the leg plane (RotMatrix3D([-R,0,0]) written out)
+        R = np.where(is_right, theta_1 - self.phi - pi/2, theta_1 + self.phi - pi/2)
+        vy = y - l1*np.cos(theta_1)
+        vz = z - l1*np.sin(theta_1)
+        x_ = x
+        z_ = -np.sin(R)*vy + np.cos(R)*vz
+
+        len_B = np.hypot(x_, z_)
+        reachable = (len_A > l1) & (len_B < l2 + l3) & (len_B > abs(l2 - l3))
+        len_B = np.clip(len_B, abs(l2 - l3) + 1e-9, (l2 + l3) * 0.99999)
+
+        b_1 = np.mod(np.arctan2(z_, x_), 2*pi)
+        b_2 = np.arccos(np.clip((l2**2 + len_B**2 - l3**2) / (2*l2*len_B), -1, 1))
+        b_3 = np.arccos(np.clip((l2**2 + l3**2 - len_B**2) / (2*l2*l3), -1, 1))
+        theta_2 = b_1 - b_2
+        theta_3 = pi - b_3
+
+        # angle_corrector, vectorized
+        theta_2 = theta_2 - 1.5*pi
+        angles = np.stack([
+            np.where(is_right, theta_1 - pi, np.where(theta_1 > pi, theta_1 - 2*pi, theta_1)),
+            np.where(is_right, theta_2 + 45*pi/180, -theta_2 - 45*pi/180),
+            -theta_3 + 45*pi/180], axis=-1)
+        return angles, reachable
+
+    # batched leg_FK_calc, robot joint angles (..., 3) -> foot (..., 3) relative to j1
+    def leg_FK_batch(self, angles, is_right):
+        return self._leg_FK_terms(angles, is_right, jacobian=False)[0][..., 3, :]
+
+    # batched joint coordinates j1, j2, j3, j4 (..., 4, 3) relative to j1, as leg_IK_calc returns them
+    def leg_joints_batch(self, angles, is_right):
+        return self._leg_FK_terms(angles, is_right, jacobian=False)[0]
+
+    # analytic Jacobian d foot / d angles (..., 3, 3) of leg_FK_batch, robot joint angles
+    def leg_jacobian_batch(self, angles, is_right):
+        return self._leg_FK_terms(angles, is_right)[1]
+
+    def _leg_FK_terms(self, angles, is_right, jacobian=True):
+        angles = np.asarray(angles, dtype=float)
+        is_right = np.asarray(is_right, dtype=bool)
+        l1, l2, l3 = self.link_1, self.link_2, self.link_3
+
+        # angle_uncorrector, vectorized. sign_2 is d theta_2 / d angles[1] (+1 right, -1 left)
+        sign_2 = np.where(is_right, 1.0, -1.0)
+        theta_1 = angles[..., 0] + np.where(is_right, pi, 0.0)
+        theta_2 = sign_2*angles[..., 1] - 45*pi/180 + 1.5*pi
+        theta_3 = -angles[..., 2] + 45*pi/180
+        R = np.where(is_right, theta_1 - self.phi - pi/2, theta_1 + self.phi - pi/2)
+
+        # foot in the leg's XZ_ plane, rotated back by RotMatrix3D([R,0,0]) and offset by j2
+        c_1, s_1 = np.cos(theta_1), np.sin(theta_1)
+        c_R, s_R = np.cos(R), np.sin(R)
+        c_23, s_23 = np.cos(theta_2 + theta_3), np.sin(theta_2 + theta_3)
+        c_2, s_2 = np.cos(theta_2), np.sin(theta_2)
+        u = l2*c_2 + l3*c_23
+        w = l2*s_2 + l3*s_23
+        j2 = np.stack([np.zeros_like(u), l1*c_1, l1*s_1], axis=-1)
+        j3 = j2 + np.stack([l2*c_2, -s_R*l2*s_2, c_R*l2*s_2], axis=-1)
+        foot = np.stack([u, l1*c_1 - s_R*w, l1*s_1 + c_R*w], axis=-1)
+        joints = np.stack([np.zeros_like(j2), j2, j3, foot], axis=-2)
+        if not jacobian:
+            return joints, None
+
+        # columns d foot / d theta_i (R moves with theta_1), then the chain rule to robot angles
+        d_1 = np.stack([np.zeros_like(u), -l1*s_1 - c_R*w, l1*c_1 - s_R*w], axis=-1)
+        d_2 = np.stack([-w, -s_R*u, c_R*u], axis=-1)
+        d_3 = np.stack([-l3*s_23, -s_R*l3*c_23, c_R*l3*c_23], axis=-1)
+        J = np.stack([d_1, sign_2[..., None]*d_2, -d_3], axis=-1)
+        return joints, J
+
+    # damped least squares joint velocities for foot velocities (..., 3), robot joint angles.
+    # the damping fades in as |det J| drops below det_threshold (no branches), so joint speeds
+    # stay bounded at a stretched or folded leg instead of blowing up like inv(J)
+    def leg_velocity_IK_batch(self, angles, foot_vel, is_right, damping=0.02, det_threshold=1e-3):
+        J = self.leg_jacobian_batch(angles, is_right)
+        lam_sq = damping**2 * (1 - np.clip(np.abs(np.linalg.det(J)) / det_threshold, 0, 1))**2
+        A = J @ np.swapaxes(J, -1, -2) + lam_sq[..., None, None]*np.eye(3)
+        return (np.swapaxes(J, -1, -2) @ np.linalg.solve(A, np.asarray(foot_vel, dtype=float)[..., None]))[..., 0]
+
+    # position IK by damped least squares from a warm start (e.g. the previous angles),
+    # a few iterations converge when the target moved a few mm, as between streamed samples
+    def leg_IK_dls_batch(self, angles, xyz, is_right, iterations=2, damping=0.02, det_threshold=1e-3):
+        angles = np.array(angles, dtype=float)
+        xyz = np.asarray(xyz, dtype=float)
+        for _ in range(iterations):
+            error = xyz - self.leg_FK_batch(angles, is_right)
+            angles += self.leg_velocity_IK_batch(angles, error, is_right, damping, det_threshold)
+        return angles
+
     def base_pose(self, rot=[0,0,0], is_radians=True, center_offset=[0,0,0]):
         
         # offset due to non-centered axes of rotation
@@ -157,7 +283,7 @@ class kinematics():
     def plot_leg(self, ax, xyz, rot=[0,0,0], legID=0, is_radians=True, center_offset=[0,0,0]):
         # get coordinates
         p = ((self.leg_pose(xyz, rot, legID, is_radians, center_offset) \
-                + self.base_pose(rot,is_radians,center_offset)[legID]).transpose())
+                + self.base_pose(rot,is_radians,center_offset)[self.origin_rows[legID]]).transpose())
         # plot coordinates
         ax.plot3D(asarray(p[0,:]).flatten(), asarray(p[1,:]).flatten(), asarray(p[2,:]).flatten(), 'b')
         return
@@ -193,7 +319,36 @@ class kinematics():
         
         theta_3 = -angles[2] + 45*pi/180
         return [theta_1, theta_2, theta_3]
-        
+
+    # inverse of angle_corrector, robot joint angles back to the IK angles
+    # (theta_1 only up to a multiple of 2pi, which FK does not care about)
+    def angle_uncorrector(self, angles=[0,0,0], is_right=True):
+        if is_right:
+            theta_1 = angles[0] + pi
+            theta_2 = angles[1] - 45*pi/180
+        else:
+            theta_1 = angles[0]
+            theta_2 = -angles[1] - 45*pi/180
+
+        theta_2 += 1.5*pi
+        theta_3 = -angles[2] + 45*pi/180
+        return [theta_1, theta_2, theta_3]
+
+    # FK calculator, inverse of leg_IK_calc: robot joint angles -> foot (j4) relative to j1
+    def leg_FK_calc(self, angles, is_right=False):
+        theta_1, theta_2, theta_3 = self.angle_uncorrector(angles, is_right)
+
+        j2 = array([0,self.link_1*cos(theta_1),self.link_1*sin(theta_1)])
+
+        if is_right: R = theta_1 - self.phi - pi/2
+        else: R = theta_1 + self.phi - pi/2
+        rot_mtx = RotMatrix3D([-R,0,0],is_radians=True)
+
+        # foot in the leg's XZ_ plane, same as the joint 4 visualization in leg_IK_calc
+        j4_ = np.reshape(np.array([self.link_2*cos(theta_2) + self.link_3*cos(theta_2+theta_3), 0,
+                                   self.link_2*sin(theta_2) + self.link_3*sin(theta_2+theta_3)]), [3,1])
+        return np.asarray(j2 + np.reshape(np.linalg.inv(rot_mtx)*j4_, [1,3])).flatten()
+
     # set view  
     @staticmethod
     def ax_view(limit):